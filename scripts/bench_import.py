@@ -0,0 +1,53 @@
+"""
+Compare ETL import time in serving mode vs bulk-load mode (tolltariff.db.bulk_session).
+
+Each mode imports into a fresh SQLite file under a temp dir. Usage, from repo root:
+
+    python scripts/bench_import.py [--duty path/to/tollavgiftssats.json]
+"""
+from __future__ import annotations
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+STRUCTURE = REPO_ROOT / "data" / "raw" / "customstariffstructure.json"
+
+
+def run(args: list[str], data_dir: Path) -> float:
+    env = dict(os.environ)
+    env["TOLLTARIFF_DATA_DIR"] = str(data_dir)
+    env.pop("DATABASE_URL", None)
+    env["PYTHONPATH"] = str(REPO_ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "tolltariff.cli", *args], env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+
+def bench(bulk: bool, structure: Path, duty: Path | None) -> dict[str, float]:
+    flag = ["--bulk"] if bulk else []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp)
+        out = {"structure": run(["import-structure", "--file", str(structure), *flag], data_dir)}
+        if duty:
+            out["duty"] = run(["import-duty-rates", "--file", str(duty), *flag], data_dir)
+        return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--structure", type=Path, default=STRUCTURE)
+    ap.add_argument("--duty", type=Path, default=None)
+    args = ap.parse_args()
+    for bulk in (False, True):
+        res = bench(bulk, args.structure, args.duty)
+        label = "bulk   " if bulk else "serving"
+        print(label, "  ".join(f"{k}={v:.2f}s" for k, v in res.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare API read throughput with the regular read-write (WAL) engine, the read-only
+immutable serving mode (TOLLTARIFF_IMMUTABLE=1) and the in-memory read model
+(TOLLTARIFF_READ_MODEL=1, built before timing starts).
+
+Each worker process imports the API with the mode's environment and calls endpoint
+functions with a fresh session per request (as get_db does) for a fixed time, over
+the HTC codes of the database. Usage, from repo root:
+
+    python scripts/bench_serving.py [--procs 1 2 4] [--seconds 5]
+"""
+from __future__ import annotations
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+# Environment of each serving mode
+MODES = {
+    "read-write": {"TOLLTARIFF_IMMUTABLE": "0", "TOLLTARIFF_READ_MODEL": "0"},
+    "immutable": {"TOLLTARIFF_IMMUTABLE": "1", "TOLLTARIFF_READ_MODEL": "0"},
+    "read-model": {"TOLLTARIFF_IMMUTABLE": "0", "TOLLTARIFF_READ_MODEL": "1"},
+}
+
+
+def worker(mode: str, seconds: float, out: mp.Queue) -> None:
+    os.environ.update(MODES[mode])
+    sys.path.insert(0, str(REPO_ROOT))
+    from tolltariff.api import read_model
+    from tolltariff.api.main import best_origin, get_htc
+    from tolltariff.db import SessionLocal
+    from tolltariff.models import HTC
+
+    db = SessionLocal()
+    codes = [c for (c,) in db.query(HTC.code).order_by(HTC.code)][::7]
+    read_model.current(db)
+    db.close()
+    n, lat = 0, []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        code = codes[n % len(codes)]
+        t0 = time.perf_counter()
+        db = SessionLocal()
+        try:
+            get_htc(code, None, db)
+            best_origin(code, None, None, None, False, None, db)
+        finally:
+            db.close()
+        lat.append(time.perf_counter() - t0)
+        n += 1
+    out.put((n, sorted(lat)))
+
+
+def bench(mode: str, procs: int, seconds: float) -> tuple[float, float, float]:
+    ctx = mp.get_context("spawn")
+    out = ctx.Queue()
+    ps = [ctx.Process(target=worker, args=(mode, seconds, out)) for _ in range(procs)]
+    for p in ps:
+        p.start()
+    results = [out.get() for _ in ps]
+    for p in ps:
+        p.join()
+    total = sum(n for n, _ in results)
+    lat = sorted(x for _, ls in results for x in ls)
+    return total / seconds, lat[len(lat) // 2] * 1000, lat[int(len(lat) * 0.99)] * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+    print(f"cpus={os.cpu_count()}")
+    for procs in args.procs:
+        for mode in MODES:
+            rps, p50, p99 = bench(mode, procs, args.seconds)
+            print(f"procs={procs} {mode:<10} {rps:8.0f} req/s  p50 {p50:.2f} ms  p99 {p99:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
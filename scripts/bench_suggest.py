@@ -0,0 +1,115 @@
+"""
+Throughput of the /htc/suggest typeahead.
+
+Replays typing sessions (every prefix of a set of queries: "h", "ho", "hor", ...) built
+from the names and codes in the database:
+
+- in-process: calls the endpoint function with a fresh session per request (as get_db does);
+- with --url: sends the same requests to a running API with --clients concurrent clients
+  (e.g. one `uvicorn tolltariff.api.main:app --workers 1` per worker to measure).
+
+Usage, from repo root:
+
+    python scripts/bench_suggest.py [--seconds 5] [--url http://127.0.0.1:8000 --clients 8]
+"""
+from __future__ import annotations
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+
+def keystrokes(n: int = 200) -> list[str]:
+    from tolltariff.db import SessionLocal
+    from tolltariff.models import HTC
+
+    db = SessionLocal()
+    try:
+        rows = db.query(HTC.code, HTC.name).all()
+    finally:
+        db.close()
+    random.seed(0)
+    queries = []
+    for code, name in random.sample(rows, min(n, len(rows))):
+        words = (name or "").split()
+        queries.append(code[:6] if random.random() < 0.3 or not words else " ".join(words[:2]))
+    return [q[:i] for q in queries for i in range(1, len(q) + 1) if q[:i].strip()]
+
+
+def report(label: str, lat: list[float], seconds: float) -> None:
+    lat.sort()
+    print(
+        f"{label:<10} {len(lat) / seconds:9.0f} req/s  p50 {lat[len(lat) // 2] * 1000:.3f} ms  "
+        f"p99 {lat[int(len(lat) * 0.99)] * 1000:.3f} ms  ({len(lat)} requests)"
+    )
+
+
+def in_process(requests: list[str], seconds: float) -> None:
+    from tolltariff.api.main import suggest_htc
+    from tolltariff.db import SessionLocal
+
+    db = SessionLocal()
+    suggest_htc("warm", 10, db)
+    db.close()
+    lat, n = [], 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        t0 = time.perf_counter()
+        db = SessionLocal()
+        try:
+            suggest_htc(requests[n % len(requests)], 10, db)
+        finally:
+            db.close()
+        lat.append(time.perf_counter() - t0)
+        n += 1
+    report("in-process", lat, seconds)
+
+
+def over_http(requests: list[str], seconds: float, url: str, clients: int) -> None:
+    import httpx
+
+    lat: list[float] = []
+    lock = threading.Lock()
+    end = time.perf_counter() + seconds
+
+    def client(offset: int) -> None:
+        mine = []
+        with httpx.Client(base_url=url) as c:
+            n = offset
+            while time.perf_counter() < end:
+                t0 = time.perf_counter()
+                c.get("/htc/suggest", params={"q": requests[n % len(requests)]}).raise_for_status()
+                mine.append(time.perf_counter() - t0)
+                n += 1
+        with lock:
+            lat.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(i * 97,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    report("http", lat, seconds)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--url", help="Base URL of a running API")
+    ap.add_argument("--clients", type=int, default=8)
+    args = ap.parse_args()
+    requests = keystrokes()
+    print(f"{len(requests)} keystroke requests")
+    if args.url:
+        over_http(requests, args.seconds, args.url, args.clients)
+    else:
+        in_process(requests, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
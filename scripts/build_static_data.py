@@ -5,44 +5,26 @@ split large files by chapter for on-demand load. Run from repo root.
 from __future__ import annotations
 import json
 import shutil
+import sys
 from pathlib import Path
 
 REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from tolltariff.etl.hs_tree import iter_commodities  # noqa: E402  (no third-party imports)
+
 DATA_RAW = REPO_ROOT / "data" / "raw"
 DATA = REPO_ROOT / "data"
 OUT = REPO_ROOT / "frontend" / "data"
 
 
-def walk_commodities(nodes) -> list[tuple[str, str]]:
-    if not isinstance(nodes, list):
-        nodes = [nodes] if nodes else []
-    out = []
-    for n in nodes:
-        if not isinstance(n, dict):
-            continue
-        if n.get("type") == "commodity":
-            code = str(n.get("id") or n.get("hsNumber") or "").strip()
-            name = (n.get("item") or "").strip()
-            if code:
-                out.append((code, name))
-        for key in ("sections", "chapters", "divisions", "headings", "subchapters"):
-            if key not in n:
-                continue
-            child = n[key]
-            if isinstance(child, list):
-                out.extend(walk_commodities(child))
-            elif child is not None:
-                out.extend(walk_commodities([child]))
-    return out
-
-
 def build_htc_index():
     path = DATA_RAW / "customstariffstructure.json"
     if not path.exists():
         print("Missing data/raw/customstariffstructure.json")
         return
     data = json.loads(path.read_text(encoding="utf-8"))
-    commodities = walk_commodities(data.get("sections", []))
+    commodities = iter_commodities(data.get("sections", []))
     seen = set()
     index = []
     for code, name in commodities:
@@ -77,6 +59,14 @@ def split_by_chapter(file_path: Path, out_subdir: str, key_in_file: str | None =
     print(f"Wrote {out_subdir}/ with {len(by_chapter)} chapters.")
 
 
+def fresh(out_dir: Path, source: Path) -> bool:
+    """Chapter files in `out_dir` at least as new as `source` (e.g. exported directly)."""
+    files = list(out_dir.glob("[0-9][0-9].json"))
+    if not files or not source.exists():
+        return bool(files)
+    return min(f.stat().st_mtime for f in files) >= source.stat().st_mtime
+
+
 def copy_json(name: str):
     src = DATA / name
     if not src.exists():
@@ -90,7 +80,10 @@ def copy_json(name: str):
 def main():
     OUT.mkdir(parents=True, exist_ok=True)
     build_htc_index()
-    split_by_chapter(DATA / "best_zero_countries.json", "best_zero")
+    if fresh(OUT / "best_zero", DATA / "best_zero_countries.json"):
+        print("best_zero/ already written by export-best-zero --chapters-dir")
+    else:
+        split_by_chapter(DATA / "best_zero_countries.json", "best_zero")
     split_by_chapter(DATA / "ratetradeagreements_index.json", "ratetradeagreements")
     copy_json("country_names.json")
     copy_json("landgroups_map.json")
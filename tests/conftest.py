@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+import pytest
+
+# Point settings at a throwaway data dir/DB before any tolltariff module is imported.
+_TMP = tempfile.mkdtemp(prefix="tolltariff-test-")
+os.environ["TOLLTARIFF_DATA_DIR"] = _TMP
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+
+
+def make_rate(htc, value, rate_type=None, agreement=None, valid_from=None, valid_to=None):
+    """A '*' rate of `htc` (per kg in NOK unless `rate_type` says otherwise)."""
+    from decimal import Decimal
+
+    from tolltariff.models import Rate, RateType
+
+    return Rate(
+        htc=htc, country_iso="*", rate_type=rate_type or RateType.PER_KG, value=Decimal(value), agreement=agreement,
+        currency="NOK", unit="kg", valid_from=valid_from, valid_to=valid_to,
+    )
+
+
+@pytest.fixture()
+def db():
+    from sqlalchemy import text
+
+    from tolltariff.db import Base, SessionLocal, engine, init_db
+    from tolltariff.etl.derived import forget_compact
+    from tolltariff.etl.search import forget_search
+
+    Base.metadata.drop_all(bind=engine)
+    with engine.begin() as conn:
+        # Not in the metadata (created by init_db)
+        conn.execute(text("DROP TABLE IF EXISTS htc_search"))
+    init_db()
+    forget_compact()
+    forget_search()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
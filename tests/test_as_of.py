@@ -0,0 +1,94 @@
+from datetime import date
+from decimal import Decimal
+
+from tolltariff.api.main import best_origin, get_agreements, get_htc, get_zero_duty_agreements
+from tolltariff.data import landgroups
+from tolltariff.models import HTC
+
+from conftest import make_rate
+
+
+def test_rates_in_force_on_date(db):
+    beef = HTC(code="02011000")
+    db.add_all([
+        make_rate(beef, "30", valid_from=date(2023, 1, 1), valid_to=date(2023, 12, 31)),
+        make_rate(beef, "25", valid_from=date(2024, 1, 1)),
+        make_rate(beef, "0", agreement="EUE", valid_from=date(2024, 7, 1)),
+        make_rate(beef, "5", agreement="EUE", valid_to=date(2024, 6, 30)),
+    ])
+    db.commit()
+
+    assert len(get_htc("02011000", None, db).rates) == 4
+    assert [r.value for r in get_htc("02011000", None, db, date(2023, 6, 1)).rates] == [Decimal("30"), Decimal("5")]
+    assert [r.value for r in get_htc("02011000", None, db, date(2024, 12, 31)).rates] == [Decimal("25"), Decimal("0")]
+
+    assert get_zero_duty_agreements("02011000", db, date(2024, 3, 1))["zero_duty"] == []
+    assert len(get_zero_duty_agreements("02011000", db, date(2024, 7, 1))["zero_duty"]) == 1
+    rates = get_agreements("02011000", db, date(2024, 3, 1))["agreements"][0]["rates"]
+    assert [r["value"] for r in rates] == ["5.000000"]
+
+    costs = {
+        r["agreement"]: r["cost_nok"]
+        for r in best_origin("02011000", 10.0, None, None, False, None, db, date(2023, 6, 1))["recommendations"]
+    }
+    assert costs == {"EUE": 50.0, None: 300.0}
+    # Only the open-started EUE rate was in force in 2022
+    early = best_origin("02011000", 10.0, None, None, False, None, db, date(2022, 1, 1))["recommendations"]
+    assert [(r["agreement"], r["cost_nok"]) for r in early] == [("EUE", 50.0)]
+
+
+def test_group_members_on_date(monkeypatch):
+    monkeypatch.setitem(landgroups._DYNAMIC_GROUPS, "TXX", {
+        "name": "Test group",
+        "countries": ["GB", "NO", "SE"],
+        "memberships": [
+            {"iso": "GB", "from": "1995-01-01", "to": "2020-12-31"},
+            {"iso": "SE", "from": "1995-01-01", "to": None},
+        ],
+    })
+
+    def members(as_of=None):
+        return [c["iso"] for c in landgroups.get_landgroup_countries("TXX", as_of)]
+
+    assert members() == ["GB", "NO", "SE"]
+    # NO has no recorded interval: a member throughout
+    assert members(date(2019, 1, 1)) == ["GB", "NO", "SE"]
+    assert members(date(2021, 1, 1)) == ["NO", "SE"]
+    assert members(date(1990, 1, 1)) == ["NO"]
+
+
+def test_import_landgroups_keeps_memberships_out_of_map(tmp_path, monkeypatch):
+    import json
+
+    from tolltariff.etl import landgroups_import
+
+    raw = {
+        "landgruppe.json": {"landgrupper": [{"landgruppekode": "TXX", "landgruppenavn": "Test group"}]},
+        "medlemsland.json": {"medlemsland": [
+            {"landkode": "GB", "landgrupper": [{"landgruppekode": "TXX", "fomdato": "1995-01-01", "tomdato": "2020-12-31"}]},
+            {"landkode": "SE", "landgrupper": [{"landgruppekode": "TXX", "fomdato": "1995-01-01", "tomdato": ""}]},
+        ]},
+    }
+    for name, doc in raw.items():
+        (tmp_path / name).write_text(json.dumps(doc), encoding="utf-8")
+    files = {"members": tmp_path / "medlemsland.json", "fta": tmp_path / "missing.json"}
+    monkeypatch.setattr(landgroups_import, "local_or_fetch", files.__getitem__)
+    for module, attr, path in [
+        (landgroups_import, "MAP_PATH", tmp_path / "map.json"),
+        (landgroups_import, "MEMBERSHIPS_PATH", tmp_path / "memberships.json"),
+        (landgroups, "_MAP_JSON", tmp_path / "map.json"),
+        (landgroups, "_MEMBERSHIPS_JSON", tmp_path / "memberships.json"),
+    ]:
+        monkeypatch.setattr(module, attr, path)
+
+    landgroups_import.import_landgroups_json(tmp_path / "landgruppe.json")
+    assert json.loads((tmp_path / "map.json").read_text(encoding="utf-8")) == {
+        "groups": {"TXX": {"name": "Test group", "countries": ["GB", "SE"]}},
+    }
+    try:
+        landgroups.reload_dynamic_groups()
+        members = [c["iso"] for c in landgroups.get_landgroup_countries("TXX", date(2021, 1, 1))]
+        assert members == ["SE"]
+    finally:
+        monkeypatch.undo()
+        landgroups.reload_dynamic_groups()
@@ -0,0 +1,54 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from tolltariff.etl.columnar import export_columnar
+from tolltariff.models import HTC, Rate, RateType
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.ipc as pa_ipc  # noqa: E402
+import pyarrow.parquet as pq  # noqa: E402
+
+
+def _seed(db):
+    horses = HTC(code="01012100", name="Horses")
+    db.add_all([
+        Rate(htc=horses, country_iso="*", rate_type=RateType.PER_KG, value=Decimal("12.5"), currency="NOK", unit="kg"),
+        Rate(htc=horses, country_iso="*", rate_type=RateType.PER_KG, value=Decimal("0"), agreement="EUE",
+             currency="NOK", unit="kg", valid_from=date(2024, 1, 1)),
+        Rate(htc=HTC(code="01013000"), country_iso="*", rate_type=RateType.PERCENT, value=Decimal("3"),
+             agreement="EUE"),
+    ])
+    db.commit()
+
+
+def test_arrow_export_is_batched_and_dictionary_encoded(db, tmp_path):
+    _seed(db)
+    counts = export_columnar(db, tmp_path, "arrow", batch_rows=2)
+    assert counts["htc"] == 2 and counts["rate"] == 3
+    assert counts["agreement_countries"] > 0
+
+    with pa.memory_map(str(tmp_path / "rate.arrow")) as source:
+        reader = pa_ipc.open_file(source)
+        assert reader.num_record_batches == 2
+        table = reader.read_all()
+    assert pa.types.is_dictionary(table.schema.field("agreement").type)
+    rows = table.to_pylist()
+    assert [r["agreement"] for r in rows] == [None, "EUE", "EUE"]
+    assert rows[1]["value"] == Decimal("0") and rows[1]["valid_from"] == date(2024, 1, 1)
+    assert [r["rate_type"] for r in rows] == ["per_kg", "per_kg", "percent"]
+
+    with pa.memory_map(str(tmp_path / "agreement_countries.arrow")) as source:
+        mapping = pa_ipc.open_file(source).read_all().to_pylist()
+    assert {"agreement": "EUE", "country_iso": "DE"} in [
+        {"agreement": m["agreement"], "country_iso": m["country_iso"]} for m in mapping
+    ]
+
+
+def test_parquet_export(db, tmp_path):
+    _seed(db)
+    export_columnar(db, tmp_path, "parquet", batch_rows=2)
+    f = pq.ParquetFile(tmp_path / "rate.parquet")
+    assert f.metadata.num_rows == 3 and f.metadata.num_row_groups == 2
+    assert pq.read_table(tmp_path / "htc.parquet").column("code").to_pylist() == ["01012100", "01013000"]
@@ -0,0 +1,193 @@
+from datetime import date
+
+from tolltariff.api.main import best_origin
+from tolltariff.config import settings
+from tolltariff.etl.derived import key_date, refresh_derived
+from tolltariff.models import HTC, RATE_TYPES_BY_CODE, VALUE_SCALE, Agreement, Rate, RateCompact, RateType
+
+from conftest import make_rate
+
+
+def test_compact_rates_mirror_rate_table(db, monkeypatch):
+    monkeypatch.setattr(settings, "compact_rates", True)
+    horses, asses = HTC(code="01012100"), HTC(code="01013000")
+    db.add_all([
+        make_rate(horses, "12.5", valid_from=date(2024, 1, 1)),
+        make_rate(horses, "0", agreement="EUE", valid_from=date(2024, 1, 1), valid_to=date(2024, 12, 31)),
+        make_rate(horses, "3.123456", rate_type=RateType.PERCENT, agreement="TIN"),
+        make_rate(asses, "7", agreement="EUE"),
+    ])
+    db.flush()
+    refresh_derived(db, {horses.id})
+    db.commit()
+
+    # First refresh builds the whole table, not just the requested HTCs
+    assert db.query(RateCompact).count() == 4
+    agreements = dict(db.query(Agreement.id, Agreement.code).all())
+    rows = {
+        (agreements.get(r.agreement_id), RATE_TYPES_BY_CODE[r.rate_type], r.value, key_date(r.valid_from), key_date(r.valid_to))
+        for r in db.query(RateCompact).filter(RateCompact.htc_id == horses.id)
+    }
+    assert rows == {
+        (None, RateType.PER_KG, 12_500_000, date(2024, 1, 1), None),
+        ("EUE", RateType.PER_KG, 0, date(2024, 1, 1), date(2024, 12, 31)),
+        ("TIN", RateType.PERCENT, round(3.123456 * VALUE_SCALE), None, None),
+    }
+
+    db.query(Rate).filter(Rate.htc_id == horses.id, Rate.agreement == "EUE").delete()
+    db.flush()
+    refresh_derived(db, {horses.id})
+    db.commit()
+    assert db.query(RateCompact).count() == 3
+
+    with_compact = best_origin("01012100", 10.0, None, 1000.0, False, None, db)
+    monkeypatch.setattr(settings, "compact_rates", False)
+    db.expire_all()
+    assert best_origin("01012100", 10.0, None, 1000.0, False, None, db) == with_compact
+    assert [r["agreement"] for r in with_compact["recommendations"]] == ["TIN", None]
+
+
+def test_compact_reports_values_equal_at_value_scale(db, monkeypatch, caplog):
+    from tolltariff.etl.derived import refresh_compact
+
+    monkeypatch.setattr(settings, "compact_rates", True)
+    horses = HTC(code="01012100")
+    # Distinct in `rate`, one compact key once scaled to millionths
+    db.add_all([make_rate(horses, "1.0000001"), make_rate(horses, "1.0000002"), make_rate(horses, "2")])
+    db.flush()
+    with caplog.at_level("WARNING", logger="tolltariff.etl.derived"):
+        assert refresh_compact(db, {horses.id}) == 2
+    assert "1 of 3 rates collapsed" in caplog.text
+
+
+def test_rate_best_endpoints_match_full_scan(db, monkeypatch):
+    from tolltariff.api.main import get_agreements, get_zero_duty_agreements
+    from tolltariff.models import RateBest
+
+    monkeypatch.setattr(settings, "compact_rates", True)
+    htc = HTC(code="02011000")
+    db.add_all([
+        make_rate(htc, "9.5", agreement="TALL"),
+        make_rate(htc, "4", valid_from=date(2024, 1, 1)),
+        make_rate(htc, "0", agreement="EUE", valid_from=date(2024, 1, 1)),
+        make_rate(htc, "2", agreement="EUE", valid_from=date(2023, 1, 1)),
+        make_rate(htc, "0", agreement="TUK"),
+        make_rate(htc, "1.5", rate_type=RateType.PER_ITEM, agreement="TUK"),
+        make_rate(htc, "0", rate_type=RateType.PERCENT, agreement="TIN"),
+    ])
+    db.flush()
+    refresh_derived(db)
+    db.commit()
+
+    best = {
+        (r.agreement_id, RATE_TYPES_BY_CODE[r.rate_type]): (r.min_value, r.is_zero, r.is_ordinary)
+        for r in db.query(RateBest).filter(RateBest.htc_id == htc.id)
+    }
+    ids = {code: i for i, code in db.query(Agreement.id, Agreement.code)}
+    assert best[(0, RateType.PER_KG)] == (4_000_000, False, True)
+    assert best[(ids["TALL"], RateType.PER_KG)] == (9_500_000, False, True)
+    assert best[(ids["EUE"], RateType.PER_KG)] == (0, True, False)
+    assert len(best) == 6
+
+    calls = [
+        lambda: best_origin("02011000", None, None, None, False, None, db),
+        lambda: best_origin("02011000", 10.0, 2, 100.0, False, None, db),
+        lambda: best_origin("02011000", None, 2, None, True, 2, db),
+        lambda: get_zero_duty_agreements("02011000", db),
+        lambda: get_agreements("02011000", db),
+    ]
+    materialised = [call() for call in calls]
+    monkeypatch.setattr(settings, "compact_rates", False)
+    for call, expected in zip(calls, materialised):
+        db.expire_all()
+        assert call() == expected
+
+
+def test_zero_duty_same_rows_with_and_without_compact(db, monkeypatch):
+    from tolltariff.api.main import get_zero_duty_agreements
+    from tolltariff.etl.derived import forget_compact
+
+    beef = HTC(code="02011000", name="Beef")
+    db.add_all([
+        make_rate(beef, "25"),
+        make_rate(beef, "0", agreement="EUE", valid_from=date(2024, 1, 1)),
+        make_rate(beef, "0", agreement="EUE", valid_from=date(2024, 7, 1)),
+        make_rate(beef, "0", agreement="GSP"),
+        make_rate(beef, "0", rate_type=RateType.PERCENT, agreement="TIN"),
+    ])
+    db.commit()
+
+    monkeypatch.setattr(settings, "compact_rates", False)
+    orm = get_zero_duty_agreements("02011000", db)
+    # Baseline output: one row per zero duty rate, VAT excluded
+    assert [z["agreement"] for z in orm["zero_duty"]] == ["EUE", "EUE", "GSP"]
+    assert get_zero_duty_agreements("02011000", db, date(2030, 1, 1)) == orm
+
+    monkeypatch.setattr(settings, "compact_rates", True)
+    refresh_derived(db)
+    db.commit()
+    forget_compact()
+    try:
+        assert get_zero_duty_agreements("02011000", db) == orm
+    finally:
+        forget_compact()
+
+
+def test_agreement_counts_follow_imports(db, monkeypatch):
+    from tolltariff.api.main import agreements_catalog
+    from tolltariff.models import AgreementCount
+
+    monkeypatch.setattr(settings, "compact_rates", True)
+    horses, beef = HTC(code="01012100"), HTC(code="02011000")
+    db.add_all([
+        make_rate(horses, "1", agreement="EUE"),
+        make_rate(horses, "0", agreement="EUE", valid_from=date(2024, 1, 1)),
+        make_rate(horses, "2"),
+        make_rate(beef, "0", agreement="EUE"),
+        make_rate(beef, "3", agreement="TUK"),
+    ])
+    db.flush()
+    refresh_derived(db)
+    db.commit()
+
+    catalog = agreements_catalog(True, db)["agreements"]
+    assert [(a["code"], a["count"], a["chapters"]) for a in catalog] == [
+        ("EUE", 3, {"01": 2, "02": 1}),
+        ("TUK", 1, {"02": 1}),
+    ]
+
+    db.add(make_rate(beef, "1", agreement="TUK", valid_from=date(2025, 1, 1)))
+    db.query(Rate).filter(Rate.htc_id == horses.id, Rate.agreement == "EUE").delete()
+    db.flush()
+    refresh_derived(db, {horses.id, beef.id})
+    db.commit()
+
+    maintained = agreements_catalog(False, db)
+    assert maintained == {"agreements": [
+        {"code": "EUE", "name": maintained["agreements"][0]["name"], "count": 1},
+        {"code": "TUK", "name": maintained["agreements"][1]["name"], "count": 2},
+    ]}
+    assert db.query(AgreementCount).count() == 2
+    monkeypatch.setattr(settings, "compact_rates", False)
+    assert agreements_catalog(False, db) == maintained
+
+
+def test_agreement_counts_include_rows_missing_from_rate_compact(db, monkeypatch):
+    from sqlalchemy import text
+
+    from tolltariff.etl.derived import agreement_counts, forget_compact
+
+    # Legacy database: uq_rate_natural could not be created over duplicate rows
+    db.execute(text("DROP INDEX uq_rate_natural"))
+    horses = HTC(code="01012100")
+    db.add_all([make_rate(horses, "0", agreement="EUE"), make_rate(horses, "0", agreement="EUE")])
+    db.flush()
+    monkeypatch.setattr(settings, "compact_rates", True)
+    refresh_derived(db)
+    db.commit()
+    forget_compact()
+
+    assert db.query(RateCompact).count() == 1
+    assert agreement_counts(db) == {"EUE": {"01": 2}}
+    monkeypatch.setattr(settings, "compact_rates", False)
+    assert agreement_counts(db) == {"EUE": {"01": 2}}
@@ -0,0 +1,31 @@
+import json
+from decimal import Decimal
+
+from tolltariff.etl.export import export_best_zero
+from tolltariff.models import HTC, Rate, RateType
+
+
+def test_best_zero_streams_single_file_and_chapters(db, tmp_path):
+    horses, beef = HTC(code="01012100"), HTC(code="02011000")
+    db.add_all([
+        Rate(htc=horses, country_iso="*", rate_type=RateType.PER_KG, value=Decimal("0"), agreement="EUE"),
+        Rate(htc=horses, country_iso="*", rate_type=RateType.PER_ITEM, value=Decimal("0"), agreement="EUE"),
+        Rate(htc=horses, country_iso="*", rate_type=RateType.PERCENT, value=Decimal("0"), agreement="TIN"),
+        Rate(htc=beef, country_iso="*", rate_type=RateType.PER_KG, value=Decimal("5"), agreement="EUE"),
+    ])
+    db.commit()
+    chapters = tmp_path / "best_zero"
+    chapters.mkdir()
+    (chapters / "02.json").write_text("{}", encoding="utf-8")
+
+    n = export_best_zero(db, tmp_path / "best_zero.json", chapters)
+
+    assert n == 1
+    data = json.loads((tmp_path / "best_zero.json").read_text(encoding="utf-8"))
+    assert list(data) == ["01012100"]
+    isos = [c["iso"] for c in data["01012100"]["countries"]]
+    assert "DE" in isos and len(isos) == len(set(isos))
+    # Chapter files hold the same entries; stale chapters are removed
+    assert sorted(p.name for p in chapters.iterdir()) == ["01.json"]
+    assert json.loads((chapters / "01.json").read_text(encoding="utf-8")) == data
+    assert "\n" not in (tmp_path / "best_zero.json").read_text(encoding="utf-8")
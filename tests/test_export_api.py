@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+
+from tolltariff.api.main import app, list_htc
+from tolltariff.models import HTC, Rate, RateType
+
+
+def _seed(db):
+    htcs = [HTC(code=f"0101{i:04d}", name=f"Horse {i}") for i in range(5)]
+    db.add_all(htcs)
+    db.add_all([
+        Rate(htc=htcs[0], country_iso="*", rate_type=RateType.PER_KG, value=Decimal("12.5"), currency="NOK", unit="kg"),
+        Rate(htc=htcs[0], country_iso="*", rate_type=RateType.PER_KG, value=Decimal("0"), agreement="EUE",
+             currency="NOK", unit="kg", valid_from=date(2024, 1, 1)),
+        Rate(htc=htcs[3], country_iso="*", rate_type=RateType.PERCENT, value=Decimal("25"), is_exemption=True),
+    ])
+    db.commit()
+
+
+def test_htc_keyset_pagination(db):
+    _seed(db)
+    codes, after = [], None
+    while True:
+        page = list_htc(None, 2, db, after)
+        codes += [h.code for h in page]
+        if len(page) < 2:
+            break
+        after = page[-1].code
+    assert codes == [f"0101{i:04d}" for i in range(5)]
+
+    r = TestClient(app).get("/htc", params={"limit": 2, "after": "01010001"})
+    assert [h["code"] for h in r.json()] == ["01010002", "01010003"]
+    assert r.headers["X-Next-Cursor"] == "01010003"
+
+
+def test_streaming_exports(db):
+    _seed(db)
+    client = TestClient(app)
+
+    r = client.get("/export/rates", params={"prefix": "0101"})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [(x["code"], x["value"], x["agreement"]) for x in rows] == [
+        ("01010000", "12.500000", None), ("01010000", "0.000000", "EUE"), ("01010003", "25.000000", None),
+    ]
+    assert rows[1]["valid_from"] == "2024-01-01" and rows[1]["agreement_name"]
+    assert rows[2]["rate_type"] == "percent" and rows[2]["is_exemption"] is True
+    assert len(client.get("/export/rates", params={"as_of": "2023-06-01"}).text.splitlines()) == 2
+
+    r = client.get("/export/htc", params={"format": "csv", "after": "01010002"})
+    assert list(csv.reader(io.StringIO(r.text))) == [
+        ["code", "name", "description"], ["01010003", "Horse 3", ""], ["01010004", "Horse 4", ""],
+    ]
+    assert client.get("/export/htc", params={"format": "xml"}).status_code == 400
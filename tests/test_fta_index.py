@@ -0,0 +1,32 @@
+import json
+import os
+
+from tolltariff.api.main import get_fta
+from tolltariff.data import fta_index, landgroups
+
+
+def test_fta_index_interns_profiles_and_reloads(tmp_path, monkeypatch):
+    path = tmp_path / "ratetradeagreements_index.json"
+    shared = {"FREE": ["EU", "GB"], "NA": ["CA"]}
+    path.write_text(json.dumps({"01012100": shared, "01012900": shared, "02011000": {"FREE": ["EU"]}}), encoding="utf-8")
+    monkeypatch.setattr(fta_index, "INDEX_PATH", path)
+    monkeypatch.setattr(fta_index, "_index", None)
+
+    index = fta_index.current_index()
+    assert len(index.profiles) == 2
+    assert index.by_code["01012100"] == index.by_code["01012900"]
+
+    out = get_fta("01012100")
+    assert [a["classifier"] for a in out["agreements"]] == ["FREE", "NA"]
+    eu = out["agreements"][0]["groups"][0]
+    assert eu["code"] == "EU" and eu["countries"] == landgroups.get_landgroup_countries("EU")
+    # Shared profiles share their prebuilt response
+    assert get_fta("01012900")["agreements"] is out["agreements"]
+    assert get_fta("99999999") == {"code": "99999999", "agreements": []}
+
+    # A rewritten file is picked up on the next request
+    path.write_text(json.dumps({"01012100": {"FREE": ["IN"]}}), encoding="utf-8")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert [g["code"] for g in get_fta("01012100")["agreements"][0]["groups"]] == ["IN"]
+    assert fta_index.current_index() is not index
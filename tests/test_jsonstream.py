@@ -0,0 +1,38 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from tolltariff.etl.jsonstream import iter_json_array
+
+RAW = Path(__file__).resolve().parent.parent / "data" / "raw"
+
+
+def _stream(text, keys=None, meta=None):
+    # Tiny chunks force elements, strings and numbers to straddle buffer refills
+    return list(iter_json_array(io.StringIO(text), keys, meta, chunk_size=7))
+
+
+def test_streams_selected_array_and_collects_scalars():
+    doc = {"versjon": "1.2", "other": [1, 2, {"x": [3]}], "varer": [{"id": "0101", "v": 12.345}, 7, "a,]}", None], "n": 10}
+    meta = {}
+    assert _stream(json.dumps(doc), ("varer",), meta) == doc["varer"]
+    assert meta == {"versjon": "1.2", "n": 10}
+
+
+def test_first_array_when_no_keys_and_top_level_array():
+    assert _stream('{"a": 1, "b": [ ], "c": [2]}') == []
+    assert _stream("[1, 22, 333]") == [1, 22, 333]
+    assert _stream('{"a": [1]}', ("missing",)) == []
+
+
+def test_malformed_input_raises():
+    with pytest.raises(ValueError):
+        _stream('{"varer": [1, 2', ("varer",))
+
+
+@pytest.mark.parametrize("name,key", [("ratetradeagreements.json", "commodities"), ("medlemsland.json", "medlemsland")])
+def test_matches_json_load_on_raw_files(name, key):
+    path = RAW / name
+    assert list(iter_json_array(path, (key,))) == json.loads(path.read_text(encoding="utf-8"))[key]
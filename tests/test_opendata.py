@@ -0,0 +1,115 @@
+import os
+import threading
+from email.utils import formatdate
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from tolltariff.etl import opendata
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    """Static file server that also answers If-None-Match with an mtime-based ETag."""
+
+    requests: list = []
+
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return super().send_head()
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.requests.append((self.path, 304))
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return None
+        self.requests.append((self.path, 200))
+        f = open(path, "rb")
+        self.send_response(200)
+        self.send_header("Content-Length", str(st.st_size))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(st.st_mtime, usegmt=True))
+        self.end_headers()
+        return f
+
+
+@pytest.fixture()
+def server(tmp_path):
+    root = tmp_path / "remote"
+    root.mkdir()
+    _Handler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(_Handler, directory=str(root)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield root, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_revalidates_with_etag(server, tmp_path):
+    root, base = server
+    (root / "a.json").write_text('{"v": 1}', encoding="utf-8")
+    dest = tmp_path / "raw" / "a.json"
+
+    opendata.download(f"{base}/a.json", dest, offline=False)
+    assert dest.read_text(encoding="utf-8") == '{"v": 1}'
+    assert opendata.read_meta(dest)["etag"]
+
+    opendata.download(f"{base}/a.json", dest, offline=False)
+    assert [status for _, status in _Handler.requests] == [200, 304]
+
+    (root / "a.json").write_text('{"v": 22}', encoding="utf-8")
+    opendata.download(f"{base}/a.json", dest, offline=False)
+    assert dest.read_text(encoding="utf-8") == '{"v": 22}'
+    assert not list(dest.parent.glob("*.part"))
+
+
+def test_fetch_all_concurrent_and_offline(server, tmp_path):
+    root, base = server
+    resources = {}
+    for name in ("structure", "members", "fta"):
+        (root / f"{name}.json").write_text(f'["{name}"]', encoding="utf-8")
+        resources[name] = (f"{base}/{name}.json", tmp_path / "raw" / f"{name}.json")
+
+    paths = opendata.fetch_all(resources, offline=False)
+    assert {n: p.read_text(encoding="utf-8") for n, p in paths.items()} == {
+        n: f'["{n}"]' for n in resources
+    }
+
+    _Handler.requests.clear()
+    assert opendata.fetch_all(resources, offline=True) == paths
+    assert _Handler.requests == []
+
+    resources["missing"] = (f"{base}/missing.json", tmp_path / "raw" / "missing.json")
+    with pytest.raises(opendata.OfflineError):
+        opendata.fetch_all(resources, offline=True)
+
+
+def test_local_or_fetch_revalidates_local_copy(server, tmp_path, monkeypatch):
+    root, base = server
+    (root / "fta.json").write_text('["v1"]', encoding="utf-8")
+    monkeypatch.setattr(opendata, "RAW_DIR", tmp_path / "raw")
+    monkeypatch.setitem(opendata.RESOURCES, "fta", (f"{base}/fta.json", "fta.json"))
+
+    path = opendata.local_or_fetch("fta", offline=False)
+    assert opendata.local_or_fetch("fta", offline=False) == path
+    (root / "fta.json").write_text('["v22"]', encoding="utf-8")
+    assert opendata.local_or_fetch("fta", offline=False).read_text(encoding="utf-8") == '["v22"]'
+    assert [status for _, status in _Handler.requests] == [200, 304, 200]
+
+    # Unreachable server: the local copy is used; offline: no request at all
+    monkeypatch.setitem(opendata.RESOURCES, "fta", ("http://127.0.0.1:1/fta.json", "fta.json"))
+    assert opendata.local_or_fetch("fta", offline=False).read_text(encoding="utf-8") == '["v22"]'
+    _Handler.requests.clear()
+    assert opendata.local_or_fetch("fta", offline=True) == path
+    assert _Handler.requests == []
+    monkeypatch.setitem(opendata.RESOURCES, "fta", ("http://127.0.0.1:1/fta.json", "missing.json"))
+    with pytest.raises(httpx.HTTPError):
+        opendata.local_or_fetch("fta", offline=False)
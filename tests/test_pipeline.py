@@ -0,0 +1,59 @@
+import threading
+
+from tolltariff.etl.pipeline import SkipStage, Stage, run_stages
+
+
+def test_run_stages_dependency_graph():
+    seen = {}
+    active = []
+    overlap = []
+    lock = threading.Lock()
+
+    def stage(name, changed=True, fail=False, skip=False, db=False):
+        def run(upstream_changed):
+            with lock:
+                if db and active:
+                    overlap.append((name, list(active)))
+                if db:
+                    active.append(name)
+            try:
+                seen[name] = upstream_changed
+                if fail:
+                    raise RuntimeError("boom")
+                if skip:
+                    raise SkipStage("nothing to do")
+                return changed
+            finally:
+                with lock:
+                    if db:
+                        active.remove(name)
+
+        return run
+
+    stages = [
+        Stage("fetch-a", stage("fetch-a", changed=False)),
+        Stage("fetch-b", stage("fetch-b")),
+        Stage("fetch-c", stage("fetch-c", fail=True)),
+        Stage("import-a", stage("import-a", db=True), ("fetch-a",), uses_db=True),
+        Stage("import-b", stage("import-b", db=True), ("fetch-b",), uses_db=True),
+        Stage("import-c", stage("import-c"), ("fetch-c",)),
+        Stage("skip", stage("skip", skip=True), ("import-a",)),
+        Stage("export", stage("export"), ("import-a", "import-c")),
+    ]
+    results = run_stages(stages, workers=4)
+
+    assert [r.name for r in results] == [s.name for s in stages]
+    status = {r.name: r.status for r in results}
+    assert status == {
+        "fetch-a": "unchanged",
+        "fetch-b": "changed",
+        "fetch-c": "failed",
+        "import-a": "changed",
+        "import-b": "changed",
+        "import-c": "blocked",
+        "skip": "skipped",
+        "export": "blocked",
+    }
+    assert seen["import-a"] is False and seen["import-b"] is True
+    assert "import-c" not in seen and "export" not in seen
+    assert overlap == []
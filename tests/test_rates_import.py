@@ -0,0 +1,301 @@
+import json
+
+from tolltariff.etl.rates_import import import_customs_duty_from_toll, import_default_rates_from_fees
+from tolltariff.models import HTC, Rate
+
+
+def _write_toll(path, varer):
+    path.write_text(json.dumps({"versjon": "1.0", "varer": varer}), encoding="utf-8")
+    return path
+
+
+def _varer(code="01012100"):
+    return {
+        "id": code,
+        "avtalesatser": [
+            {"landgruppe": "TAL", "sats": [{"satsVerdi": "12,50", "satsEnhet": "K", "fomdato": "2024-01-01", "tomdato": ""}]},
+            {"landgruppe": "EUE", "sats": [
+                {"satsVerdi": "0,00", "satsEnhet": "K", "fomdato": "2024-01-01", "tomdato": ""},
+                {"satsVerdi": "0,00", "satsEnhet": "K", "fomdato": "2024-01-01", "tomdato": ""},
+            ]},
+            {"landgruppe": "TIN", "sats": [{"satsVerdi": "999999,99", "satsEnhet": "K"}]},
+        ],
+    }
+
+
+def test_duty_import_is_idempotent(db, tmp_path):
+    db.add_all([HTC(code="01012100", name="Horses")])
+    db.commit()
+    path = _write_toll(tmp_path / "toll.json", [_varer(), _varer("99999999")])
+
+    from tolltariff.api.read_model import data_version
+
+    assert data_version(db) is None
+    assert import_customs_duty_from_toll(db, path) == 2
+    first = data_version(db)
+    assert import_customs_duty_from_toll(db, path) == 0
+    # Every committed import is a new data version, with or without a tracker
+    assert first is not None and data_version(db) > first
+    rates = db.query(Rate).order_by(Rate.priority).all()
+    assert [(r.agreement, float(r.value)) for r in rates] == [(None, 12.5), ("EUE", 0.0)]
+
+
+def test_duty_import_normalises_grouped_ordinary(db, tmp_path):
+    from datetime import date
+    from decimal import Decimal
+    from tolltariff.models import RateType
+
+    h = HTC(code="01012100")
+    db.add(h)
+    db.flush()
+    db.add(Rate(htc_id=h.id, country_iso="*", rate_type=RateType.PER_KG, value=Decimal("12.5"),
+                agreement="TAL", valid_from=date(2024, 1, 1), priority=10))
+    db.commit()
+    path = _write_toll(tmp_path / "toll.json", [_varer()])
+
+    assert import_customs_duty_from_toll(db, path) == 1
+    ordinary = db.query(Rate).filter(Rate.priority == 0).one()
+    assert ordinary.agreement is None
+
+
+def test_bulk_insert_counts_only_inserted_rows(db):
+    from tolltariff.etl.bulk import bulk_insert
+    from tolltariff.models import RateType
+
+    h = HTC(code="01012100")
+    db.add(h)
+    db.commit()
+    row = {"htc_id": h.id, "country_iso": "*", "rate_type": RateType.PERCENT, "value": 5, "is_exemption": False}
+    assert bulk_insert(db, Rate.__table__, [row, {**row, "value": 0}]) == 2
+    assert bulk_insert(db, Rate.__table__, [row, {**row, "value": 7}], size=1) == 1
+    assert db.query(Rate).count() == 3
+
+
+def test_init_db_dedupes_legacy_rates_for_natural_key(db, caplog):
+    from sqlalchemy import text
+    from tolltariff.db import engine, init_db
+    from tolltariff.models import RateType
+
+    h = HTC(code="01012100")
+    db.add(h)
+    db.commit()
+    db.execute(text("DROP INDEX uq_rate_natural"))
+    for value in (5, 5, 5, 7):
+        db.add(Rate(htc_id=h.id, country_iso="*", rate_type=RateType.PERCENT, value=value))
+    db.commit()
+    first, *_ = [r.id for r in db.query(Rate).order_by(Rate.id)]
+
+    with caplog.at_level("WARNING", logger="tolltariff.db"):
+        init_db(engine)
+
+    assert [(r.id, float(r.value)) for r in db.query(Rate).order_by(Rate.id)] == [(first, 5.0), (first + 3, 7.0)]
+    assert db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'uq_rate_natural'")).scalar() == 1
+    assert "Removed 2 duplicate rate rows" in caplog.text
+
+
+def _fees(code, sats, fom="2024-01-01"):
+    group = {"enhet": "P", "sats": sats, "fomdato": fom, "tomdato": ""}
+    return {"id": code, "avgiftsatser": [
+        {"landgruppe": "ALLE", "avgiftstyper": [{"avgiftstype": "MV", "avgiftsgrupper": [group]}]},
+    ]}
+
+
+def test_default_rate_update_skips_existing_natural_key(db, tmp_path):
+    db.add(HTC(code="01012100"))
+    db.commit()
+    duty = {"id": "01012100", "avtalesatser": [
+        {"landgruppe": "TAL", "sats": [{"satsVerdi": "12,50", "satsEnhet": "P", "fomdato": "2020-01-01", "tomdato": ""}]},
+        {"landgruppe": "TALL", "sats": [{"satsVerdi": "25,00", "satsEnhet": "P", "fomdato": "2020-01-01", "tomdato": ""}]},
+    ]}
+    import_customs_duty_from_toll(db, _write_toll(tmp_path / "toll.json", [duty]))
+
+    # Rewriting the 12.50 row to 25.00 would duplicate the other row's natural key
+    path = _write_toll(tmp_path / "fees.json", [_fees("01012100", "25,00", "2020-01-01")])
+    assert import_default_rates_from_fees(db, path) == 0
+    assert sorted(float(r.value) for r in db.query(Rate)) == [12.5, 25.0]
+
+
+def test_duty_import_skips_unchanged_commodities(db, tmp_path):
+    from tolltariff.etl.delta import DeltaTracker
+
+    db.add_all([HTC(code="01012100"), HTC(code="01012900")])
+    db.commit()
+    second = _varer("01012900")
+    path = _write_toll(tmp_path / "toll.json", [_varer(), second])
+
+    tracker = DeltaTracker(db, "duty", path)
+    assert import_customs_duty_from_toll(db, path, tracker=tracker) == 4
+    assert tracker.counts == (2, 0, 0)
+
+    assert DeltaTracker(db, "duty", path).file_unchanged
+
+    second["avtalesatser"][0]["sats"][0]["satsVerdi"] = "3,00"
+    path = _write_toll(tmp_path / "toll.json", [_varer(), second])
+    tracker = DeltaTracker(db, "duty", path)
+    assert import_customs_duty_from_toll(db, path, tracker=tracker) == 1
+    assert tracker.counts == (0, 1, 1)
+
+
+def test_duty_import_output_independent_of_workers(db, tmp_path):
+    codes = ["01012100", "01012900", "02011000", "03011100"]
+    db.add_all([HTC(code=c) for c in codes])
+    db.commit()
+    path = _write_toll(tmp_path / "toll.json", [_varer(c) for c in codes])
+
+    def snapshot():
+        return [
+            (r.id, r.htc_id, r.agreement, r.rate_type, r.value, r.valid_from)
+            for r in db.query(Rate).order_by(Rate.id)
+        ]
+
+    import_customs_duty_from_toll(db, path, workers=1)
+    single = snapshot()
+    db.query(Rate).delete()
+    db.commit()
+    import_customs_duty_from_toll(db, path, workers=3)
+    assert [row[1:] for row in snapshot()] == [row[1:] for row in single]
+
+
+def test_delta_import_reprocesses_code_repeated_in_file(db, tmp_path):
+    from tolltariff.etl.delta import DeltaTracker
+
+    db.add(HTC(code="01012100"))
+    db.commit()
+    path = _write_toll(tmp_path / "toll.json", [_varer()])
+    import_customs_duty_from_toll(db, path, tracker=DeltaTracker(db, "duty", path))
+
+    # Same code twice: first changed, then equal to the stored digest again
+    changed = _varer()
+    changed["avtalesatser"][0]["sats"][0]["satsVerdi"] = "3,00"
+    for workers in (1, 2):
+        # Trailing code-less elements only vary the file digest between the two runs
+        path = _write_toll(tmp_path / "toll.json", [changed, _varer()] + [{"id": ""}] * workers)
+        tracker = DeltaTracker(db, "duty", path)
+        import_customs_duty_from_toll(db, path, tracker=tracker, workers=workers)
+    values = sorted(float(r.value) for r in db.query(Rate).filter(Rate.agreement.is_(None)))
+    assert values == [3.0, 12.5]
+
+
+def _fees(code, sats, fom="2024-01-01"):
+    group = {"enhet": "P", "sats": sats, "fomdato": fom, "tomdato": ""}
+    return {"id": code, "avgiftsatser": [
+        {"landgruppe": "ALLE", "avgiftstyper": [{"avgiftstype": "MV", "avgiftsgrupper": [group]}]},
+    ]}
+
+
+def test_default_rates_insert_then_update(db, tmp_path):
+    from datetime import date
+
+    db.add_all([HTC(code="01012100"), HTC(code="01012900")])
+    db.commit()
+    path = _write_toll(tmp_path / "fees.json", [_fees("01012100", "25,00"), _fees("01012900", "15,00"), _fees("99999999", "1,00")])
+    assert import_default_rates_from_fees(db, path, source_url="v1") == 2
+    assert import_default_rates_from_fees(db, path, source_url="v1") == 0
+
+    path = _write_toll(tmp_path / "fees.json", [_fees("01012100", "25,00"), _fees("01012900", "12,00", "2025-01-01")])
+    assert import_default_rates_from_fees(db, path, source_url="v2", commit_every=1) == 0
+    rates = {r.htc.code: r for r in db.query(Rate)}
+    assert len(rates) == 2 and db.query(Rate).count() == 2
+    assert (float(rates["01012900"].value), rates["01012900"].valid_from) == (12.0, date(2025, 1, 1))
+    assert {r.source_url for r in rates.values()} == {"v2"}
+
+
+def test_default_rates_insert_then_update(db, tmp_path):
+    from datetime import date
+
+    db.add_all([HTC(code="01012100"), HTC(code="01012900")])
+    db.commit()
+    path = _write_toll(tmp_path / "fees.json", [_fees("01012100", "25,00"), _fees("01012900", "15,00"), _fees("99999999", "1,00")])
+    assert import_default_rates_from_fees(db, path, source_url="v1") == 2
+    assert import_default_rates_from_fees(db, path, source_url="v1") == 0
+
+    path = _write_toll(tmp_path / "fees.json", [_fees("01012100", "25,00"), _fees("01012900", "12,00", "2025-01-01")])
+    assert import_default_rates_from_fees(db, path, source_url="v2", commit_every=1) == 0
+    rates = {r.htc.code: r for r in db.query(Rate)}
+    assert len(rates) == 2 and db.query(Rate).count() == 2
+    assert (float(rates["01012900"].value), rates["01012900"].valid_from) == (12.0, date(2025, 1, 1))
+    assert {r.source_url for r in rates.values()} == {"v2"}
+
+
+def test_duty_import_resumes_from_checkpoint(db, tmp_path, monkeypatch):
+    import pytest
+    from tolltariff.etl import rates_import
+    from tolltariff.models import ImportCheckpoint
+
+    codes = ["01012100", "01012900", "02011000", "03011100"]
+    db.add_all([HTC(code=c) for c in codes])
+    db.commit()
+    path = _write_toll(tmp_path / "toll.json", [_varer(c) for c in codes])
+
+    write = rates_import._write_duty_rows
+    calls = []
+
+    def crash_on_second_chunk(session, rows, **kw):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError("evicted")
+        return write(session, rows, **kw)
+
+    monkeypatch.setattr(rates_import, "_write_duty_rows", crash_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        import_customs_duty_from_toll(db, path, commit_every=2)
+    db.rollback()
+    assert db.get(ImportCheckpoint, "duty").position == 2
+    assert db.query(Rate).count() == 4
+
+    monkeypatch.setattr(rates_import, "_write_duty_rows", write)
+    assert import_customs_duty_from_toll(db, path, resume=True, commit_every=2) == 4
+    assert db.query(Rate).count() == 8
+    assert db.get(ImportCheckpoint, "duty") is None
+
+
+def test_checkpoint_position_counts_elements_without_code(db, tmp_path, monkeypatch):
+    import pytest
+    from tolltariff.etl import rates_import
+    from tolltariff.models import ImportCheckpoint
+
+    db.add(HTC(code="01012100"))
+    db.commit()
+    path = _write_toll(tmp_path / "toll.json", [{"id": ""}, {"avtalesatser": []}, _varer()])
+
+    write = rates_import._write_duty_rows
+    calls = []
+
+    def crash_on_second_chunk(session, rows, **kw):
+        calls.append(rows)
+        if len(calls) == 2:
+            raise RuntimeError("evicted")
+        return write(session, rows, **kw)
+
+    monkeypatch.setattr(rates_import, "_write_duty_rows", crash_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        import_customs_duty_from_toll(db, path, commit_every=2)
+    db.rollback()
+    assert db.get(ImportCheckpoint, "duty").position == 2
+
+    monkeypatch.setattr(rates_import, "_write_duty_rows", write)
+    assert import_customs_duty_from_toll(db, path, resume=True, commit_every=2) == 2
+
+
+def test_duty_import_reports_telemetry(db, tmp_path):
+    import io
+
+    from tolltariff.etl.telemetry import PHASES, Telemetry, jsonl_sink
+
+    codes = ["01012100", "01012900", "02011000"]
+    db.add_all([HTC(code=c) for c in codes])
+    db.commit()
+    path = _write_toll(tmp_path / "toll.json", [_varer(c) for c in codes])
+
+    out = io.StringIO()
+    tel = Telemetry("duty", jsonl_sink(out), interval=0)
+    assert import_customs_duty_from_toll(db, path, commit_every=2, telemetry=tel) == 6
+    tel.finish()
+
+    events = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [e["event"] for e in events] == ["progress", "progress", "summary"]
+    assert [e["items"] for e in events] == [2, 3, 3]
+    summary = events[-1]
+    assert summary["rows"] == 9
+    assert set(PHASES) <= set(summary["phases"])
+    assert sum(summary["phases"].values()) <= summary["elapsed_s"] + 1e-3
@@ -0,0 +1,108 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from tolltariff.api import read_model
+from tolltariff.api.main import best_origin, get_agreements, get_htc, get_zero_duty_agreements
+from tolltariff.config import settings
+from tolltariff.db import engine
+from tolltariff.etl.delta import record_import
+from tolltariff.models import HTC, Rate, RateType
+
+from conftest import make_rate
+
+
+def _answers(db, code, as_of=None):
+    return (
+        get_htc(code, None, db, as_of).model_dump(),
+        get_htc(code, "EUE", db, as_of).model_dump(),
+        get_zero_duty_agreements(code, db, as_of),
+        get_agreements(code, db, as_of),
+        best_origin(code, 10.0, None, 1000.0, False, None, db, as_of),
+        best_origin(code, None, None, None, True, 2, db, as_of),
+    )
+
+
+def test_read_model_matches_database_and_follows_imports(db, monkeypatch):
+    beef = HTC(code="02011000", name="Beef")
+    db.add_all([
+        make_rate(beef, "25"),
+        make_rate(beef, "0", agreement="EUE", valid_from=date(2024, 7, 1)),
+        make_rate(beef, "12.5", rate_type=RateType.PERCENT, agreement="TIN"),
+    ])
+    db.commit()
+    read_model.forget()
+    expected = [_answers(db, "02011000"), _answers(db, "02011000", date(2024, 1, 1))]
+
+    monkeypatch.setattr(settings, "read_model", True)
+    monkeypatch.setattr(settings, "read_model_check_s", 3600)
+    try:
+        assert read_model.current(db).rate_count == 3
+        statements = []
+        listener = lambda *args: statements.append(args[2])  # noqa: E731
+        event.listen(engine, "before_cursor_execute", listener)
+        try:
+            got = [_answers(db, "02011000"), _answers(db, "02011000", date(2024, 1, 1))]
+        finally:
+            event.remove(engine, "before_cursor_execute", listener)
+        assert got == expected
+        assert statements == []
+
+        # Chunk commits of a running import are not picked up; its final commit is
+        monkeypatch.setattr(settings, "read_model_check_s", 0)
+        db.add(make_rate(db.query(HTC).one(), "3", agreement="GSP"))
+        db.commit()
+        assert [a["agreement"] for a in get_agreements("02011000", db)["agreements"]] == ["EUE"]
+        record_import(db, "duty")
+        db.commit()
+        assert [a["agreement"] for a in get_agreements("02011000", db)["agreements"]] == ["EUE", "GSP"]
+
+        # So are in-place updates (renames, new values) that add no rows
+        db.query(HTC).one().name = "Bovine meat"
+        db.query(Rate).filter(Rate.agreement == "GSP").one().value = Decimal("2")
+        record_import(db, "structure")
+        db.commit()
+        assert get_htc("02011000", None, db).name == "Bovine meat"
+        assert 2.0 in [float(r.value) for r in read_model.current(db).htcs["02011000"].rates]
+        assert read_model.current(db).memory_bytes() > 0
+    finally:
+        read_model.forget()
+
+
+def test_zero_duty_same_rows_in_every_serving_mode(db, monkeypatch):
+    from tolltariff.etl.derived import forget_compact, refresh_derived
+
+    beef = HTC(code="02011000", name="Beef")
+    db.add_all([
+        make_rate(beef, "25"),
+        make_rate(beef, "0", agreement="EUE", valid_from=date(2024, 1, 1)),
+        make_rate(beef, "0", agreement="EUE", valid_from=date(2024, 7, 1)),
+        make_rate(beef, "0", agreement="GSP"),
+        make_rate(beef, "0", rate_type=RateType.PERCENT, agreement="TIN"),
+    ])
+    db.commit()
+
+    def zero(as_of=None):
+        return get_zero_duty_agreements("02011000", db, as_of)
+
+    monkeypatch.setattr(settings, "compact_rates", False)
+    orm = zero()
+    # Baseline output: one row per zero duty rate, VAT excluded
+    assert [z["agreement"] for z in orm["zero_duty"]] == ["EUE", "EUE", "GSP"]
+    assert zero(date(2030, 1, 1)) == orm
+
+    monkeypatch.setattr(settings, "compact_rates", True)
+    refresh_derived(db)
+    db.commit()
+    forget_compact()
+    assert zero() == orm
+
+    monkeypatch.setattr(settings, "read_model", True)
+    try:
+        read_model.forget()
+        assert zero() == orm
+        assert zero(date(2030, 1, 1)) == orm
+    finally:
+        read_model.forget()
+        forget_compact()
@@ -0,0 +1,109 @@
+import sqlite3
+
+import pytest
+
+from tolltariff.config import settings
+from tolltariff.db import ShadowValidationError, _sqlite_path, shadow_session
+from tolltariff.models import HTC
+
+
+def test_shadow_import_swaps_in_without_disturbing_readers(db):
+    db.add(HTC(code="01012100"))
+    db.commit()
+    live = _sqlite_path(settings.database_url)
+
+    # A request in flight: its read transaction keeps the old snapshot across the swap
+    reader = sqlite3.connect(live, isolation_level=None)
+    reader.execute("BEGIN")
+    assert reader.execute("SELECT count(*) FROM htc").fetchone() == (1,)
+
+    with shadow_session() as shadow:
+        shadow.add(HTC(code="01012900"))
+        shadow.commit()
+        assert db.query(HTC).count() == 1
+
+    assert reader.execute("SELECT count(*) FROM htc").fetchone() == (1,)
+    reader.execute("COMMIT")
+    assert reader.execute("SELECT count(*) FROM htc").fetchone() == (2,)
+    reader.close()
+    db.rollback()
+    assert db.query(HTC).count() == 2
+    assert not live.with_name(live.name + ".shadow").exists()
+
+
+def test_failed_shadow_import_leaves_live_database(db):
+    db.add(HTC(code="01012100"))
+    db.commit()
+    live = _sqlite_path(settings.database_url)
+
+    with pytest.raises(RuntimeError):
+        with shadow_session() as shadow:
+            shadow.add(HTC(code="01012900"))
+            shadow.commit()
+            raise RuntimeError("parse error")
+
+    with pytest.raises(ShadowValidationError):
+        with shadow_session() as shadow:
+            shadow.query(HTC).delete()
+
+    db.rollback()
+    assert [h.code for h in db.query(HTC)] == ["01012100"]
+    assert not live.with_name(live.name + ".shadow").exists()
+
+
+def test_admin_reload_checks_token(monkeypatch):
+    from fastapi import HTTPException
+
+    from tolltariff.api.main import admin_reload
+
+    monkeypatch.setattr(settings, "admin_token", "s3cret")
+    for token in (None, "", "s3cre", "s3cret!"):
+        with pytest.raises(HTTPException) as exc:
+            admin_reload(token)
+        assert exc.value.status_code == 403
+    assert admin_reload("s3cret") == {"status": "reloaded"}
+
+
+def test_admin_reload_disabled_without_token(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from tolltariff.api.main import app
+
+    monkeypatch.setattr(settings, "admin_token", None)
+    client = TestClient(app)
+    assert client.post("/admin/reload").status_code == 404
+    assert client.post("/admin/reload", headers={"X-Admin-Token": ""}).status_code == 404
+
+
+def test_immutable_serving_sees_renamed_swap_after_reload(db, monkeypatch):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+
+    from tolltariff.db import SessionLocal, engine, reload_engine, use_read_only_engine
+
+    db.add(HTC(code="01012100"))
+    db.commit()
+    db.close()
+    engine.dispose()
+    monkeypatch.setattr(settings, "immutable", True)
+    use_read_only_engine()
+    try:
+        served = SessionLocal()
+        assert served.query(HTC).count() == 1
+        with pytest.raises(OperationalError):
+            served.execute(text("DELETE FROM htc"))
+        served.close()
+
+        with shadow_session() as shadow:
+            shadow.add(HTC(code="01012900"))
+        served = SessionLocal()
+        # Pooled connections still read the old file until the reload
+        assert served.query(HTC).count() == 1
+        served.close()
+        reload_engine()
+        served = SessionLocal()
+        assert served.query(HTC).count() == 2
+        served.close()
+    finally:
+        reload_engine()
+        SessionLocal.configure(bind=engine)
@@ -0,0 +1,263 @@
+import json
+
+from tolltariff.etl.structure_import import import_structure_json
+from tolltariff.models import HTC
+
+
+def _structure(tmp_path, items):
+    commodities = [{"type": "commodity", "id": code, "hsNumber": code[:6], "item": name} for code, name in items]
+    doc = {"version": "1.5", "sections": [{"type": "section", "id": "01", "chapters": [
+        {"type": "chapter", "id": "01", "divisions": [{"type": "heading", "id": "0101", "divisions": commodities}]}
+    ]}]}
+    path = tmp_path / "structure.json"
+    path.write_text(json.dumps(doc), encoding="utf-8")
+    return path
+
+
+def test_structure_upsert_counts(db, tmp_path):
+    path = _structure(tmp_path, [("01012100", " Pure-bred "), ("01012900", "Other"), ("01012100", "dup")])
+    assert tuple(import_structure_json(db, path)) == (2, 0, 0)
+
+    path = _structure(tmp_path, [("01012100", "Pure-bred breeding"), ("01012900", "Other"), ("01013000", "Asses")])
+    assert tuple(import_structure_json(db, path)) == (1, 1, 1)
+    assert db.query(HTC).filter(HTC.code == "01012100").one().name == "Pure-bred breeding"
+    assert db.query(HTC).count() == 3
+
+
+def test_structure_import_in_bulk_session(db, tmp_path):
+    from sqlalchemy import text
+
+    from tolltariff.db import BULK_DROP_INDEXES, bulk_session, engine
+
+    def index_names(conn):
+        return set(conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'")).scalars())
+
+    db.close()
+    path = _structure(tmp_path, [("01012100", "Pure-bred"), ("01012900", "Other")])
+    with bulk_session() as bulk:
+        assert not index_names(bulk.connection()) & set(BULK_DROP_INDEXES)
+        assert tuple(import_structure_json(bulk, path)) == (2, 0, 0)
+        bulk.commit()
+
+    with engine.connect() as conn:
+        assert set(BULK_DROP_INDEXES) <= index_names(conn)
+    assert db.query(HTC).count() == 2
+
+
+def test_bulk_session_reraises_load_error(db, caplog, monkeypatch):
+    import pytest
+    from sqlalchemy import text
+
+    from tolltariff import db as db_module
+    from tolltariff.db import BULK_DROP_INDEXES, bulk_session, engine
+
+    db.close()
+    with pytest.raises(ValueError, match="bad row"):
+        with bulk_session():
+            raise ValueError("bad row")
+    with engine.connect() as conn:
+        names = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'")).scalars())
+    assert set(BULK_DROP_INDEXES) <= names
+
+    def broken_rebuild(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(db_module, "_rebuild_indexes", broken_rebuild)
+    with caplog.at_level("ERROR", logger="tolltariff.db"), pytest.raises(ValueError, match="bad row"):
+        with bulk_session():
+            raise ValueError("bad row")
+    assert "disk full" in caplog.text
+
+
+def test_structure_import_commodity_set(db, tmp_path):
+    from tolltariff.etl.hs_tree import iter_commodities
+    from tolltariff.models import HSNode
+
+    doc = {"version": "1.5", "sections": [{"type": "section", "id": "01", "chapters": [
+        {"type": "chapter", "id": "01", "divisions": [{"type": "heading", "id": "0101", "divisions": [
+            {"type": "commodity", "id": "01012100", "item": " Pure-bred "},
+            {"type": "commodity", "id": "01012900", "description": "Other"},
+        ], "subsubheadings": [
+            {"type": "subsubheading", "hsNumber": "01013", "divisions": [
+                {"type": "commodity", "id": "01013000", "item": "Asses"},
+            ]},
+        ]}]},
+    ]}]}
+    path = tmp_path / "structure.json"
+    path.write_text(json.dumps(doc), encoding="utf-8")
+
+    assert tuple(import_structure_json(db, path)) == (3, 0, 0)
+    # One commodity definition (etl.hs_tree.iter_commodities) for the import, the hierarchy
+    # and the other callers: subsubheadings are walked, a missing item falls back to the description
+    expected = [("01012100", "Pure-bred"), ("01012900", "Other"), ("01013000", "Asses")]
+    assert [(h.code, h.name) for h in db.query(HTC).order_by(HTC.code)] == expected
+    commodities = db.query(HSNode).filter(HSNode.kind == "commodity").order_by(HSNode.position)
+    assert [(n.code, n.description) for n in commodities] == expected
+    assert list(iter_commodities(doc["sections"])) == expected
+
+
+def test_hierarchy_paths_and_subtree_queries(db, tmp_path):
+    from tolltariff.api.main import hs_subtree, hs_summary
+    from tolltariff.models import HSNode, Rate, RateType
+
+    def commodity(code, item):
+        return {"type": "commodity", "id": code, "hsNumber": code[:6], "item": item}
+
+    doc = {"version": "1.5", "sections": [
+        {"type": "section", "id": "01", "description": "Live animals", "chapters": [
+            {"type": "chapter", "id": "01", "description": "Live animals", "divisions": [
+                {"type": "heading", "id": "0101", "description": "Horses", "divisions": [
+                    {"type": "subsubheading", "hsNumber": "01012", "description": "Horses :", "divisions": [
+                        commodity("01012100", " Pure-bred "),
+                    ]},
+                    commodity("01013000", "Asses"),
+                ]},
+            ]},
+        ]},
+        {"type": "section", "id": "02", "description": "Vegetables", "chapters": [
+            {"type": "chapter", "id": "07", "description": "Vegetables", "divisions": [
+                {"type": "heading", "id": "0707", "description": "Cucumbers", "divisions": [
+                    # Same hsNumber twice, then none: paths stay unique
+                    {"type": "subsubheading", "hsNumber": "070700", "description": "Snake", "divisions": [
+                        commodity("07070010", "Spring"),
+                    ]},
+                    {"type": "subsubheading", "hsNumber": "070700", "description": "Other", "divisions": [
+                        commodity("07070092", "Summer"),
+                    ]},
+                    {"type": "subsubheading", "description": "Misc", "divisions": []},
+                ]},
+            ]},
+        ]},
+    ]}
+    path = tmp_path / "structure.json"
+    path.write_text(json.dumps(doc), encoding="utf-8")
+    assert import_structure_json(db, path).inserted == 4
+
+    paths = [p for (p,) in db.query(HSNode.path).order_by(HSNode.position)]
+    assert paths == [
+        "01", "01/01", "01/01/0101", "01/01/0101/01012", "01/01/0101/01012/01012100", "01/01/0101/01013000",
+        "02", "02/07", "02/07/0707", "02/07/0707/070700", "02/07/0707/070700/07070010",
+        "02/07/0707/070700#1", "02/07/0707/070700#1/07070092", "02/07/0707/#2",
+    ]
+
+    sub = hs_subtree("0101", None, db)
+    assert sub["node"]["kind"] == "heading"
+    assert [n["code"] for n in sub["nodes"]] == ["01012", "01012100", "01013000"]
+    assert sub["nodes"][1]["description"] == "Pure-bred"
+    assert [n["code"] for n in hs_subtree("01", 1, db)["nodes"]] == ["0101"]
+
+    horses = db.query(HTC).filter(HTC.code == "01012100").one()
+    db.add_all([Rate(htc=horses, country_iso="*", rate_type=RateType.PER_KG, value=v) for v in (1, 2)])
+    db.commit()
+    assert hs_summary("01", db)["groups"] == [
+        {"code": "0101", "description": "Horses", "commodities": 2, "rates": 2},
+    ]
+    assert hs_summary("070700", db)["groups"][0]["commodities"] == 1
+
+
+def test_search_index_follows_imports(db, tmp_path):
+    from tolltariff.api.main import list_htc
+    from tolltariff.etl.delta import DeltaTracker
+
+    def import_(items):
+        path = _structure(tmp_path, items)
+        import_structure_json(db, path, tracker=DeltaTracker(db, "structure", path))
+
+    def codes(q, mode="match"):
+        return [h.code for h in list_htc(q, 20, db, None, None, mode)]
+
+    import_([("01012100", "Pure-bred breeding horses"), ("01012900", "Other horses"), ("01013000", "Asses")])
+    assert codes("hors") == ["01012100", "01012900"]
+    assert codes("0101.2") == ["01012100", "01012900"]
+    assert codes("breed hor") == ["01012100"]
+    assert codes("other horses", "rank")[0] == "01012900"
+    # LIKE, the default, matches inside words; full-text matching is opt-in
+    assert codes("sses", "like") == ["01013000"]
+    assert [h.code for h in list_htc("sses", 20, db)] == ["01013000"]
+    assert codes("sses") == []
+
+    # A rename is re-indexed by the next (delta) import
+    import_([("01012100", "Pure-bred breeding horses"), ("01012900", "Other horses"), ("01013000", "Mules")])
+    assert codes("asses") == [] and codes("mule") == ["01013000"]
+
+
+def test_match_finds_dotted_codes(db, tmp_path):
+    from tolltariff.api.main import list_htc
+    from tolltariff.etl.search import match_expression
+
+    assert match_expression("0101.21") == '"010121"* OR "0101.21"*'
+    assert match_expression("010121") == '"010121"*' and match_expression(" . ") is None
+    # Dotted codes (as seed-demo stores them) next to plain ones
+    import_structure_json(db, _structure(tmp_path, [("0101.21", "Horses"), ("01012100", "Pure-bred"), ("0101.29", "Other")]))
+
+    def codes(q):
+        return [h.code for h in list_htc(q, 20, db, None, None, "match")]
+
+    assert codes("0101.21") == ["0101.21", "01012100"]
+    assert codes("0101.2") == ["0101.21", "0101.29", "01012100"]
+    assert codes("0101 29") == ["0101.29"]
+
+
+def test_fuzzy_search_tolerates_typos(db, tmp_path):
+    from tolltariff.api.main import list_htc
+    from tolltariff.etl.delta import DeltaTracker
+    from tolltariff.etl.search import fuzzy_search, trigrams
+
+    def import_(items):
+        path = _structure(tmp_path, items)
+        import_structure_json(db, path, tracker=DeltaTracker(db, "structure", path))
+
+    def codes(q):
+        return [h.code for h in list_htc(q, 20, db, None, None, "fuzzy")]
+
+    assert trigrams(" Pure-bred ") == trigrams("PURE bréd") == {"  p", " pu", "pur", "ure", "re ", "  b", " br", "bre", "red", "ed "}
+    import_([
+        ("01012100", " Pure-bred  breeding animals "),
+        ("01012900", "Other horses"),
+        ("02011000", "Kjøtt av storfe, hele og halve skrotter"),
+    ])
+    assert codes("breding") == ["01012100"]
+    assert codes("purebred anmals") == ["01012100"]
+    assert codes("horsse")[0] == "01012900"
+    assert codes("kjott storfee") == codes("KJØTT") == ["02011000"]
+    assert codes("xyzzy") == [] and codes("?!") == []
+    assert fuzzy_search(db, "other horses", 5)[0][3] == 1.0
+
+    # A rename is re-indexed by the next (delta) import
+    import_([
+        ("01012100", " Pure-bred  breeding animals "),
+        ("01012900", "Mules"),
+        ("02011000", "Kjøtt av storfe, hele og halve skrotter"),
+    ])
+    assert codes("horsse") == [] and codes("mulse") == ["01012900"]
+
+
+def test_fuzzy_falls_back_to_like_without_trigram_index(db, tmp_path):
+    from tolltariff.api.main import list_htc
+    from tolltariff.models import HTCTrigram, TrigramFrequency
+
+    import_structure_json(db, _structure(tmp_path, [("01012100", "Pure-bred horses"), ("01012900", "Other horses")]))
+    # A database built before the trigram tables existed
+    db.query(HTCTrigram).delete()
+    db.query(TrigramFrequency).delete()
+    db.commit()
+
+    assert [h.code for h in list_htc("horses", 20, db, None, None, "fuzzy")] == ["01012100", "01012900"]
+    assert list_htc("horsse", 20, db, None, None, "fuzzy") == []
+
+
+def test_fuzzy_search_scores_beyond_first_candidates(db, tmp_path, monkeypatch):
+    from tolltariff.etl import search
+
+    # Frequent "mules" trigrams: candidates are found by the rare "horses" ones, which the
+    # decoys hold more of than the best match
+    items = [(f"0101{i:04d}", "Mules") for i in range(6)]
+    items += [("01020001", "Horses, muzzles"), ("01020002", "Horses, muzzles"), ("01030000", "Mules horse")]
+    import_structure_json(db, _structure(tmp_path, items))
+    monkeypatch.setattr(search, "FUZZY_MAX_POSTINGS", 0)
+    monkeypatch.setattr(search, "FUZZY_BATCH", 1)
+
+    found = search.fuzzy_search(db, "horses mules", 1)
+    assert [code for code, *_ in found] == ["01030000"]
+    found = search.fuzzy_search(db, "horses mules", 3)
+    assert [code for code, *_ in found] == ["01030000", "01020001", "01020002"]
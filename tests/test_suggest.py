@@ -0,0 +1,45 @@
+from fastapi.testclient import TestClient
+
+from tolltariff.api import suggest
+from tolltariff.api.main import app, suggest_htc
+from tolltariff.config import settings
+from tolltariff.etl.delta import record_import
+from tolltariff.etl.search import normalize
+from tolltariff.models import HTC
+
+
+def test_normalize():
+    assert normalize("Kjøtt av STORFE, fårekjøtt; Æbler, crème") == "kjott av storfe, farekjott; aebler, creme"
+
+
+def test_suggest_prefixes(db, monkeypatch):
+    db.add_all([
+        HTC(code="01012100", name="Pure-bred breeding horses"),
+        HTC(code="01012900", name="Other horses"),
+        HTC(code="01013000", name="Asses"),
+        HTC(code="02011000", name="Kjøtt av storfe, hele og halve skrotter"),
+    ])
+    db.commit()
+    monkeypatch.setattr(settings, "read_model_check_s", 0)
+    suggest.forget()
+
+    def codes(q, limit=10):
+        return [s["code"] for s in suggest_htc(q, limit, db)["suggestions"]]
+
+    assert codes("0101") == ["01012100", "01012900", "01013000"]
+    assert codes("0101.2", 1) == ["01012100"]
+    assert codes("ho") == ["01012100", "01012900"]
+    assert codes("oth hor") == ["01012900"]
+    assert codes("0101 as") == ["01013000"]
+    assert codes("02 as") == []
+    assert codes("kjott") == codes("KJØTT") == ["02011000"]
+    assert codes("?!") == []
+
+    # New HTCs are picked up once their import is recorded
+    db.add(HTC(code="01019000", name="Other horses, mules"))
+    record_import(db, "structure")
+    db.commit()
+    assert codes("mul") == ["01019000"]
+    r = TestClient(app).get("/htc/suggest", params={"q": "mules"})
+    assert r.json() == {"q": "mules", "suggestions": [{"code": "01019000", "name": "Other horses, mules"}]}
+    suggest.forget()
@@ -0,0 +1,51 @@
+import pytest
+
+from tolltariff.etl.telemetry import Telemetry
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def test_nested_phases_are_exclusive():
+    clock = FakeClock()
+    tel = Telemetry("t", clock=clock)
+
+    def slow_items():
+        for i in range(3):
+            clock.sleep(0.05)
+            yield i
+
+    with tel.phase("parse"):
+        clock.sleep(0.01)
+        assert list(tel.timed(slow_items(), "read")) == [0, 1, 2]
+        clock.sleep(0.02)
+    clock.sleep(1.0)
+
+    # Time spent pulling items is charged to "read" only, not to the enclosing "parse";
+    # time outside any phase is charged to none
+    assert tel.phases["read"] == pytest.approx(0.15)
+    assert tel.phases["parse"] == pytest.approx(0.03)
+    assert tel.summary()["elapsed_s"] == pytest.approx(1.18)
+
+
+def test_progress_is_throttled():
+    clock = FakeClock()
+    events = []
+    tel = Telemetry("t", sink=events.append, interval=5.0, clock=clock)
+    tel.add(items=1, rows=10)
+    clock.sleep(4.0)
+    tel.progress()
+    clock.sleep(1.0)
+    tel.progress()
+    tel.progress()
+    tel.progress(force=True)
+    assert [e["elapsed_s"] for e in events] == [5.0, 5.0]
+    assert events[0]["rows_per_s"] == 2.0
@@ -1,19 +1,70 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import csv
+import hmac
+import io
+import signal
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..db import Base, engine, get_db
+from datetime import date
+from typing import Any, Iterator, NamedTuple
+
+from sqlalchemy import bindparam, distinct, func, or_, select
+from sqlalchemy.orm import aliased
+
+from ..db import Base, SessionLocal, engine, get_db, init_db, reload_engine, use_read_only_engine
 from .. import models, schemas
+from . import read_model, suggest
+from ..etl.hs_tree import PATH_SEP, PATH_SEP_NEXT, subtree_bounds
+from ..etl.derived import agreement_counts, compact_available, forget_compact, format_value
+from ..etl.search import forget_search, fuzzy_available, fuzzy_search, search_available, search_htc
 from ..data.landgroups import get_landgroup_name, get_landgroup_countries, LANDGROUPS
+from ..data.fta_index import current_index as current_fta_index
 import json
 from pathlib import Path
 from ..config import settings
 
-app = FastAPI(title="Advanced Tolltariff API")
 
-# Create tables on startup (dev only). In production, use migrations.
-Base.metadata.create_all(bind=engine)
+def reload_database() -> None:
+    """Reopen the database after an import swapped in a new one (db.shadow_session).
+
+    Drops idle pooled connections and the caches derived from database contents;
+    in-flight requests finish on the connections they hold.
+    """
+    reload_engine()
+    forget_compact()
+    forget_search()
+    read_model.forget()
+    suggest.forget()
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # `kill -HUP <pid>` reloads, like POST /admin/reload
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_database)
+    except (AttributeError, NotImplementedError, RuntimeError, ValueError):
+        # No SIGHUP (Windows) or not running in the main thread
+        pass
+    if settings.read_model:
+        # Load it before the first request
+        with SessionLocal() as db:
+            read_model.current(db)
+    yield
+
+
+app = FastAPI(title="Advanced Tolltariff API", lifespan=_lifespan)
+
+if settings.immutable:
+    # Serving mode: read-only immutable connections, no DDL
+    use_read_only_engine()
+else:
+    # Create tables on startup (dev only). In production, use migrations.
+    init_db()
 
 # Serve a simple UI (prefer per-user data dir, fallback to bundled frontend)
 frontend_candidates = [settings.data_dir / "frontend", Path("frontend")]  # second for dev
@@ -33,6 +84,19 @@ def root():
 def health():
     return {"status": "ok"}
 
+@app.post("/admin/reload")
+def admin_reload(x_admin_token: str | None = Header(None)):
+    """Reopen the database engine, e.g. after `--shadow` imports.
+
+    Only available when TOLLTARIFF_ADMIN_TOKEN is set (404 otherwise); `kill -HUP` always works.
+    """
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    reload_database()
+    return {"status": "reloaded"}
+
 @app.get("/debug/info")
 def debug_info(db: Session = Depends(get_db)):
     try:
@@ -48,27 +112,247 @@ def debug_info(db: Session = Depends(get_db)):
         "data_dir": str(settings.data_dir),
         "data_dir_exists": settings.data_dir.exists(),
         "frontend_dir_exists": (settings.data_dir / "frontend").exists() or Path("frontend").exists(),
+        "read_model": read_model.current(db).stats() if settings.read_model else None,
     }
 
+HTC_PAGE_MAX = 200
+
+
+HTC_SEARCH_MODES = ("like", "match", "rank", "fuzzy")
+
+
 @app.get("/htc", response_model=list[schemas.HTCSummary])
-def list_htc(q: str | None = None, limit: int = 20, db: Session = Depends(get_db)):
+def list_htc(
+    q: str | None = None,
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    after: str | None = None,
+    response: Response = None,
+    mode: str = "like",
+):
+    """HTCs by code, a page at a time, optionally filtered by the search text `q`.
+
+    Keyset pagination: pass the last code of a page as `after` to get the next one. When
+    the page is full, the `X-Next-Cursor` header holds that code.
+
+    Search modes: `like` (the default: substring match on code and name, scanning the
+    table), `match` (full-text prefix match on code, name and description, by code),
+    `rank` (the same, best BM25 match first; no `after`) and `fuzzy` (typo-tolerant
+    trigram match on the name, most similar first; no `after`). `match` and `rank` fall
+    back to `like` where the full-text index does not exist (it needs SQLite with FTS5),
+    `fuzzy` where the trigram index is empty (a database not re-indexed since it was added).
+    """
+    if mode not in HTC_SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {mode} (like, match, rank or fuzzy)")
+    limit = max(1, min(limit, HTC_PAGE_MAX))
+    if q and mode == "fuzzy" and after:
+        raise HTTPException(status_code=400, detail="after is not supported with mode=fuzzy")
+    if q and mode == "fuzzy" and fuzzy_available(db):
+        return [
+            schemas.HTCSummary(code=c, name=n, description=d)
+            for c, n, d, _ in fuzzy_search(db, q, limit)
+        ]
+    if q and mode in ("match", "rank") and search_available(db):
+        if mode == "rank" and after:
+            raise HTTPException(status_code=400, detail="after is not supported with mode=rank")
+        found = search_htc(db, q, limit, ranked=mode == "rank", after=after)
+        rows = [schemas.HTCSummary(code=c, name=n, description=d) for c, n, d in found]
+        if response is not None and len(rows) == limit and mode != "rank":
+            response.headers["X-Next-Cursor"] = rows[-1].code
+        return rows
     query = db.query(models.HTC)
     if q:
         like = f"%{q}%"
         query = query.filter((models.HTC.code.like(like)) | (models.HTC.name.ilike(like)))
-    rows = query.order_by(models.HTC.code).limit(max(1, min(limit, 200))).all()
+    if after:
+        query = query.filter(models.HTC.code > after)
+    rows = query.order_by(models.HTC.code).limit(limit).all()
+    if response is not None and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = rows[-1].code
     return [schemas.HTCSummary(code=r.code, name=r.name, description=r.description) for r in rows]
 
-@app.get("/htc/{code}", response_model=schemas.HTC)
-def get_htc(code: str, origin_group: str | None = None, db: Session = Depends(get_db)):
-    htc = db.query(models.HTC).filter(models.HTC.code == code).first()
+
+SUGGEST_MAX = 50
+
+
+@app.get("/htc/suggest")
+def suggest_htc(q: str, limit: int = 10, db: Session = Depends(get_db)):
+    """Typeahead: up to `limit` HTCs (by code) whose code starts with the numeric words of `q`
+    and whose name has a word starting with each other word ("0101 hors").
+
+    Served from in-process sorted arrays (api.suggest); the database is only asked for
+    its data version, at most every few seconds.
+    """
+    limit = max(1, min(limit, SUGGEST_MAX))
+    return {"q": q, "suggestions": suggest.current(db).suggest(q, limit)}
+
+
+# Streaming exports: media type per format, rows fetched (and sent) per chunk
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+EXPORT_CHUNK_ROWS = 2000
+
+HTC_EXPORT_COLUMNS = ("code", "name", "description")
+RATE_EXPORT_COLUMNS = (
+    "code", "country_iso", "rate_type", "value", "currency", "unit", "is_exemption",
+    "agreement", "agreement_name", "conditions", "valid_from", "valid_to",
+)
+
+
+def _export_value(v: Any) -> Any:
+    if v is None or isinstance(v, (str, bool, int)):
+        return v
+    if isinstance(v, models.RateType):
+        return v.value
+    if isinstance(v, date):
+        return v.isoformat()
+    # Decimal, as its Numeric(18, 6) string
+    return str(v)
+
+
+def _stream_export(stmt, columns: tuple[str, ...], fmt: str, row_values) -> Iterator[str]:
+    """Serialise the rows of `stmt` chunk by chunk, on a session owned by the stream.
+
+    The rows come through a server-side cursor (yield_per), so memory stays bounded by
+    one chunk whatever the result size. The CSV header goes out before the query runs.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    if fmt == "csv":
+        writer.writerow(columns)
+        yield buf.getvalue()
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        for rows in result.partitions():
+            buf.seek(0)
+            buf.truncate()
+            for row in rows:
+                values = [_export_value(v) for v in row_values(row)]
+                if fmt == "csv":
+                    writer.writerow(values)
+                else:
+                    buf.write(json.dumps(dict(zip(columns, values)), ensure_ascii=False, separators=(",", ":")))
+                    buf.write("\n")
+            yield buf.getvalue()
+    finally:
+        db.close()
+
+
+def _export_response(stmt, columns: tuple[str, ...], fmt: str, name: str, row_values) -> StreamingResponse:
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {fmt} (ndjson or csv)")
+    return StreamingResponse(
+        _stream_export(stmt, columns, fmt, row_values),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
+
+
+@app.get("/export/htc")
+def export_htc(format: str = "ndjson", prefix: str | None = None, after: str | None = None):
+    """All HTCs (optionally those whose code starts with `prefix`, after code `after`), streamed."""
+    H = models.HTC
+    stmt = select(H.code, H.name, H.description).order_by(H.code)
+    if prefix:
+        stmt = stmt.where(H.code.startswith(prefix, autoescape=True))
+    if after:
+        stmt = stmt.where(H.code > after)
+    return _export_response(stmt, HTC_EXPORT_COLUMNS, format, "htc", tuple)
+
+
+@app.get("/export/rates")
+def export_rates(
+    format: str = "ndjson",
+    prefix: str | None = None,
+    agreement: str | None = None,
+    after: str | None = None,
+    as_of: date | None = None,
+):
+    """Rates with their HTC code, by code, streamed.
+
+    Filters: HTC code `prefix` (e.g. a chapter), `agreement`, HTC codes after `after` (to
+    resume an interrupted export) and `as_of` (rates in force on that date).
+    """
+    H, R = models.HTC, models.Rate
+    stmt = (
+        select(
+            H.code, R.country_iso, R.rate_type, R.value, R.currency, R.unit, R.is_exemption,
+            R.agreement, R.conditions, R.valid_from, R.valid_to,
+        )
+        .join(R, R.htc_id == H.id)
+        .order_by(H.code, R.id)
+    )
+    if prefix:
+        stmt = stmt.where(H.code.startswith(prefix, autoescape=True))
+    if agreement:
+        stmt = stmt.where(R.agreement == agreement)
+    if after:
+        stmt = stmt.where(H.code > after)
+    if as_of is not None:
+        stmt = stmt.where(
+            or_(R.valid_from.is_(None), R.valid_from <= as_of),
+            or_(R.valid_to.is_(None), R.valid_to >= as_of),
+        )
+
+    def row_values(row) -> tuple:
+        # agreement_name right after agreement
+        return (*row[:8], get_landgroup_name(row[7]), *row[8:])
+
+    return _export_response(stmt, RATE_EXPORT_COLUMNS, format, "rates", row_values)
+
+
+def _find_htc(db: Session, code: str) -> models.HTC | read_model.HtcRecord:
+    """The HTC `code` from the read model when enabled, else from the database; 404 if unknown."""
+    model = read_model.current(db)
+    if model is not None:
+        htc = model.htcs.get(code)
+    else:
+        htc = db.query(models.HTC).filter(models.HTC.code == code).first()
     if not htc:
         raise HTTPException(status_code=404, detail="HTC not found")
+    return htc
+
+
+def _use_compact(db: Session, htc: models.HTC | read_model.HtcRecord, as_of: date | None) -> bool:
+    # The read model already holds the rates; rate_compact/rate_best have no validity filter
+    return as_of is None and isinstance(htc, models.HTC) and compact_available(db)
+
+
+def _rates_in_force(
+    db: Session, htc: models.HTC | read_model.HtcRecord, as_of: date | None
+) -> list[models.Rate] | list[read_model.RateRecord]:
+    """Rates of `htc` valid on `as_of` (all of HTC.rates without a date), in HTC.rates order.
+
+    Open ends (NULL valid_from/valid_to) are unbounded; the dates are checked inside
+    ix_rate_htc_validity, so only the rows in force are read from the table.
+    """
+    if isinstance(htc, read_model.HtcRecord):
+        return htc.rates_on(as_of)
+    if as_of is None:
+        return list(htc.rates)
+    R = models.Rate
+    rows = db.query(R).filter(
+        R.htc_id == htc.id,
+        or_(R.valid_from.is_(None), R.valid_from <= as_of),
+        or_(R.valid_to.is_(None), R.valid_to >= as_of),
+    )
+    # Sorted here: an ORDER BY id would make SQLite prefer ix_rate_htc_id and read every row
+    return sorted(rows, key=lambda r: r.id)
+
+
+@app.get("/htc/{code}", response_model=schemas.HTC)
+def get_htc(
+    code: str,
+    origin_group: str | None = None,
+    db: Session = Depends(get_db),
+    as_of: date | None = None,
+):
+    """An HTC with its rates; with `as_of`, only the rates in force on that date."""
+    htc = _find_htc(db, code)
 
     # Optionally filter/prioritize by origin_group (landgruppe code). Prefer agreement==origin_group, else ordinary.
-    rates_sa = list(htc.rates)
+    rates_sa = _rates_in_force(db, htc, as_of)
     if origin_group:
-        ordinary_groups = {"TAL", "TALL", "ALLE"}
         # Preferential: matching agreement and excluding VAT
         preferred = [
             r for r in rates_sa
@@ -77,7 +361,7 @@ def get_htc(code: str, origin_group: str | None = None, db: Session = Depends(ge
         # Fallback to ordinary duty (exclude VAT), accounting for ordinary groups
         ordinary = [
             r for r in rates_sa
-            if (r.agreement is None or r.agreement in ordinary_groups) and r.rate_type != models.RateType.PERCENT
+            if (r.agreement is None or r.agreement in models.ORDINARY_GROUPS) and r.rate_type != models.RateType.PERCENT
         ]
         rates_sa = preferred or ordinary or rates_sa
 
@@ -105,13 +389,28 @@ def get_htc(code: str, origin_group: str | None = None, db: Session = Depends(ge
     )
 
 @app.get("/htc/{code}/zero-duty")
-def get_zero_duty_agreements(code: str, db: Session = Depends(get_db)):
-    """List agreements that provide zero customs duty for the given HTC (excludes VAT)."""
-    htc = db.query(models.HTC).filter(models.HTC.code == code).first()
-    if not htc:
-        raise HTTPException(status_code=404, detail="HTC not found")
+def get_zero_duty_agreements(code: str, db: Session = Depends(get_db), as_of: date | None = None):
+    """List agreements that provide zero customs duty for the given HTC (excludes VAT).
+
+    With `as_of`, only rates in force and group members on that date are considered.
+    """
+    htc = _find_htc(db, code)
     out = []
-    for r in htc.rates:
+    if _use_compact(db, htc, as_of):
+        # One row per zero rate, in HTC.rates order (rate_compact mirrors `rate` row for row)
+        for agreement, rate_type, value, unit, currency in db.execute(_RATE_ROWS, {"htc_id": htc.id}):
+            if value != 0 or rate_type == _PERCENT:
+                continue
+            out.append({
+                "agreement": agreement,
+                "agreement_name": get_landgroup_name(agreement),
+                "countries": get_landgroup_countries(agreement),
+                "type": models.RATE_TYPES_BY_CODE[rate_type].value,
+                "unit": unit,
+                "currency": currency,
+            })
+        return {"code": htc.code, "zero_duty": out}
+    for r in _rates_in_force(db, htc, as_of):
         if r.rate_type == models.RateType.PERCENT:
             continue
         try:
@@ -119,7 +418,7 @@ def get_zero_duty_agreements(code: str, db: Session = Depends(get_db)):
                 out.append({
                     "agreement": r.agreement,
                     "agreement_name": get_landgroup_name(r.agreement),
-                    "countries": get_landgroup_countries(r.agreement),
+                    "countries": get_landgroup_countries(r.agreement, as_of),
                     "type": r.rate_type.value,
                     "unit": r.unit,
                     "currency": r.currency,
@@ -130,7 +429,7 @@ def get_zero_duty_agreements(code: str, db: Session = Depends(get_db)):
                 out.append({
                     "agreement": r.agreement,
                     "agreement_name": get_landgroup_name(r.agreement),
-                    "countries": get_landgroup_countries(r.agreement),
+                    "countries": get_landgroup_countries(r.agreement, as_of),
                     "type": r.rate_type.value,
                     "unit": r.unit,
                     "currency": r.currency,
@@ -138,26 +437,43 @@ def get_zero_duty_agreements(code: str, db: Session = Depends(get_db)):
     return {"code": htc.code, "zero_duty": out}
 
 @app.get("/htc/{code}/agreements")
-def get_agreements(code: str, db: Session = Depends(get_db)):
+def get_agreements(code: str, db: Session = Depends(get_db), as_of: date | None = None):
     """List all agreements (preferential groups) present for the HTC, with country lists.
 
     Excludes VAT percent rates and ordinary baseline (agreement null / TAL/TALL/ALLE).
+    With `as_of`, only rates in force and group members on that date are listed.
     """
-    htc = db.query(models.HTC).filter(models.HTC.code == code).first()
-    if not htc:
-        raise HTTPException(status_code=404, detail="HTC not found")
+    htc = _find_htc(db, code)
     seen: dict[str, dict] = {}
-    ordinary_groups = {"TAL", "TALL", "ALLE"}
-    for r in htc.rates:
+    if _use_compact(db, htc, as_of):
+        # All rates of the HTC from rate_compact, in HTC.rates order
+        for agreement, rate_type, value, unit, currency in db.execute(_RATE_ROWS, {"htc_id": htc.id}):
+            if rate_type == _PERCENT or agreement is None or agreement in models.ORDINARY_GROUPS:
+                continue
+            if agreement not in seen:
+                seen[agreement] = {
+                    "agreement": agreement,
+                    "agreement_name": get_landgroup_name(agreement),
+                    "countries": get_landgroup_countries(agreement),
+                    "rates": [],
+                }
+            seen[agreement]["rates"].append({
+                "type": models.RATE_TYPES_BY_CODE[rate_type].value,
+                "value": format_value(value),
+                "unit": unit,
+                "currency": currency,
+            })
+        return {"code": htc.code, "agreements": list(seen.values())}
+    for r in _rates_in_force(db, htc, as_of):
         if r.rate_type == models.RateType.PERCENT:
             continue
-        if r.agreement is None or r.agreement in ordinary_groups:
+        if r.agreement is None or r.agreement in models.ORDINARY_GROUPS:
             continue
         if r.agreement not in seen:
             seen[r.agreement] = {
                 "agreement": r.agreement,
                 "agreement_name": get_landgroup_name(r.agreement),
-                "countries": get_landgroup_countries(r.agreement),
+                "countries": get_landgroup_countries(r.agreement, as_of),
                 "rates": [],
             }
         seen[r.agreement]["rates"].append({
@@ -169,30 +485,115 @@ def get_agreements(code: str, db: Session = Depends(get_db)):
     return {"code": htc.code, "agreements": list(seen.values())}
 
 @app.get("/htc/{code}/fta")
-def get_fta(code: str):
+def get_fta(code: str, as_of: date | None = None):
     """List free trade agreements for the HTC using the ratetradeagreements index, with country lists.
-    Shows classifier groups (e.g., FREE) and participating landCodes.
+    Shows classifier groups (e.g., FREE) and participating landCodes; with `as_of`, the
+    countries that were group members on that date.
     """
-    idx_path = Path("data/ratetradeagreements_index.json")
-    if not idx_path.exists():
+    # Parsed once and reloaded when the file changes; per-profile results are prebuilt
+    index = current_fta_index()
+    if index is None:
         raise HTTPException(status_code=404, detail="FTA index not imported")
-    idx = json.loads(idx_path.read_text(encoding="utf-8"))
-    entry = idx.get(code)
-    if not entry:
-        return {"code": code, "agreements": []}
-    items = []
-    for classifier, landCodes in entry.items():
-        # landCodes may include named groups (EU, EEA, EFTA, GB, IN, GSP+, GSP-LDC, GCC, SACU, etc.)
-        # For known groups, enrich with countries via landgroups; otherwise include landCode as-is.
-        groups = []
-        for lc in landCodes:
-            groups.append({
-                "code": lc,
-                "name": get_landgroup_name(lc),
-                "countries": get_landgroup_countries(lc),
-            })
-        items.append({"classifier": classifier, "groups": groups})
-    return {"code": code, "agreements": items}
+    return {"code": code, "agreements": index.agreements(code, as_of)}
+
+
+_rc = models.RateCompact.__table__
+_rb = models.RateBest.__table__
+_ag = models.Agreement.__table__
+# Core statements built once; executed per request with the HTC id bound (indexed range reads
+# on the clustered primary keys)
+_RATE_ROWS = (
+    select(_ag.c.code, _rc.c.rate_type, _rc.c.value, _rc.c.unit, _rc.c.currency)
+    .select_from(_rc)
+    .outerjoin(_ag, _ag.c.id == _rc.c.agreement_id)
+    .where(_rc.c.htc_id == bindparam("htc_id"))
+    .order_by(_rc.c.rate_id)
+)
+_BEST_ROWS = (
+    select(
+        _ag.c.code,
+        _rb.c.rate_type,
+        _rb.c.min_value,
+        _rb.c.is_zero,
+        _rb.c.is_ordinary,
+        _rb.c.unit,
+        _rb.c.currency,
+        _rb.c.min_rate_id,
+        _rb.c.first_rate_id,
+        _rb.c.zero_rate_id,
+    )
+    .select_from(_rb)
+    .outerjoin(_ag, _ag.c.id == _rb.c.agreement_id)
+    .where(_rb.c.htc_id == bindparam("htc_id"))
+)
+_PERCENT = models.RATE_TYPE_CODES[models.RateType.PERCENT]
+
+
+class _BestRow(NamedTuple):
+    agreement: str | None
+    rate_type: int
+    min_value: int
+    is_zero: bool
+    is_ordinary: bool
+    unit: str | None
+    currency: str | None
+    min_rate_id: int
+    first_rate_id: int
+    zero_rate_id: int | None
+
+
+def _best_rows(db: Session, htc_id: int) -> list[_BestRow]:
+    return [_BestRow(*row) for row in db.execute(_BEST_ROWS, {"htc_id": htc_id})]
+
+
+def _best_per_group_materialised(
+    db: Session, htc_id: int, inputs: dict[models.RateType, float | None]
+) -> dict[str | None, dict]:
+    """best-origin's per-group minimum from rate_best, matching the row-by-row scan of HTC.rates.
+
+    Per (agreement, rate_type) the cheapest rate is the one with the minimum value; rate ids
+    stand in for the scan order so ties and group order come out as in the full scan.
+    """
+    scale = models.VALUE_SCALE
+    # group -> (position of its first computable rate, cost, id of the chosen rate, row)
+    found: dict[str | None, tuple[int, float, int, _BestRow]] = {}
+    for row in _best_rows(db, htc_id):
+        rate_type = models.RATE_TYPES_BY_CODE[row.rate_type]
+        inp = inputs[rate_type]
+        if inp is not None:
+            value = row.min_value / scale
+            cost = 0.0 if row.is_zero else (value / 100.0 if rate_type == models.RateType.PERCENT else value) * float(inp)
+            first, chosen = row.first_rate_id, row.min_rate_id
+        elif row.zero_rate_id is not None:
+            cost, first, chosen = 0.0, row.zero_rate_id, row.zero_rate_id
+        else:
+            continue
+        grp = None if row.is_ordinary else row.agreement
+        cur = found.get(grp)
+        if cur is None:
+            found[grp] = (first, cost, chosen, row)
+            continue
+        first = min(first, cur[0])
+        if (cost, chosen) < (cur[1], cur[2]):
+            found[grp] = (first, cost, chosen, row)
+        else:
+            found[grp] = (first,) + cur[1:]
+
+    best_per_group: dict[str | None, dict] = {}
+    for grp, (_, cost, _, row) in sorted(found.items(), key=lambda kv: kv[1][0]):
+        rate_type = models.RATE_TYPES_BY_CODE[row.rate_type]
+        best_per_group[grp] = {
+            "agreement": row.agreement,
+            "agreement_name": (get_landgroup_name(row.agreement) if row.agreement else "Ordinary (no agreement)"),
+            "countries": get_landgroup_countries(row.agreement) if row.agreement else [],
+            "rate_type": rate_type.value,
+            "rate_value": 0.0 if row.is_zero or inputs[rate_type] is None else row.min_value / scale,
+            "unit": row.unit,
+            "currency": row.currency,
+            "cost_nok": cost,
+            "basis": rate_type.value,
+        }
+    return best_per_group
 
 
 @app.get("/htc/{code}/best-origin")
@@ -204,6 +605,7 @@ def best_origin(
     flatten: bool = False,
     top_n: int | None = None,
     db: Session = Depends(get_db),
+    as_of: date | None = None,
 ):
     """Compute best origin groups (and countries) for minimal customs duty for an HTC.
 
@@ -213,11 +615,22 @@ def best_origin(
       - per_item requires `quantity`
       - percent requires `customs_value_nok`
     - Zero rates are treated as zero regardless of missing inputs.
+    - With `as_of`, only rates in force (and group members) on that date count.
     Returns top recommendations sorted by ascending cost.
     """
-    htc = db.query(models.HTC).filter(models.HTC.code == code).first()
-    if not htc:
-        raise HTTPException(status_code=404, detail="HTC not found")
+    htc = _find_htc(db, code)
+
+    if _use_compact(db, htc, as_of):
+        best_per_group = _best_per_group_materialised(
+            db,
+            htc.id,
+            {
+                models.RateType.PERCENT: customs_value_nok,
+                models.RateType.PER_KG: weight_kg,
+                models.RateType.PER_ITEM: quantity,
+            },
+        )
+        return _rank_best_origin(code, best_per_group, flatten, top_n)
 
     def compute_cost(r: models.Rate) -> tuple[float | None, str | None]:
         # returns (cost_nok or None, basis)
@@ -242,9 +655,8 @@ def best_origin(
 
     # Aggregate best per agreement (including ordinary baseline as None)
     best_per_group: dict[str | None, dict] = {}
-    ordinary_groups = {"TAL", "TALL", "ALLE"}
 
-    for r in htc.rates:
+    for r in _rates_in_force(db, htc, as_of):
         if r.rate_type == models.RateType.PERCENT:
             # skip VAT percent stored separately (country_iso='*' and no agreement name for VAT)
             # We still include customs duty percent if present; we have no way to distinguish VAT vs duty here except currency/unit.
@@ -253,7 +665,7 @@ def best_origin(
             pass
         # Determine group code; normalize ordinary
         grp = r.agreement
-        if grp in ordinary_groups:
+        if grp in models.ORDINARY_GROUPS:
             grp = None
 
         cost, basis = compute_cost(r)
@@ -266,7 +678,7 @@ def best_origin(
             best_per_group[grp] = {
                 "agreement": r.agreement,
                 "agreement_name": (get_landgroup_name(r.agreement) if r.agreement else "Ordinary (no agreement)"),
-                "countries": get_landgroup_countries(r.agreement) if r.agreement else [],
+                "countries": get_landgroup_countries(r.agreement, as_of) if r.agreement else [],
                 "rate_type": r.rate_type.value,
                 "rate_value": float(r.value),
                 "unit": r.unit,
@@ -275,6 +687,10 @@ def best_origin(
                 "basis": basis,
             }
 
+    return _rank_best_origin(code, best_per_group, flatten, top_n)
+
+
+def _rank_best_origin(code: str, best_per_group: dict[str | None, dict], flatten: bool, top_n: int | None):
     # Sort by ascending cost
     ranked = sorted(best_per_group.values(), key=lambda x: x["cost_nok"])
 
@@ -308,17 +724,83 @@ def best_origin(
     return {"code": code, "recommendations": ranked}
 
 @app.get("/agreements/catalog")
-def agreements_catalog(db: Session = Depends(get_db)):
-    """List all agreement codes present across the database with occurrence counts and known names."""
-    rows = db.query(models.Rate.agreement).filter(models.Rate.agreement != None).all()
-    counts: dict[str, int] = {}
-    for (code,) in rows:
-        if not code:
-            continue
-        counts[code] = counts.get(code, 0) + 1
+def agreements_catalog(by_chapter: bool = False, db: Session = Depends(get_db)):
+    """List all agreement codes present across the database with occurrence counts and known names.
+
+    With by_chapter=true each entry also carries its counts per HS chapter.
+    """
+    counts = agreement_counts(db)
+    items = []
+    for code in sorted(counts):
+        chapters = counts[code]
+        item = {"code": code, "name": get_landgroup_name(code), "count": sum(chapters.values())}
+        if by_chapter:
+            item["chapters"] = dict(sorted(chapters.items()))
+        items.append(item)
+    return {"agreements": items}
+
+
+def _hs_node(db: Session, code: str) -> models.HSNode:
+    """The hierarchy node with `code`; a chapter wins over the section with the same number."""
+    node = (
+        db.query(models.HSNode)
+        .filter(models.HSNode.code == code)
+        .order_by((models.HSNode.kind == "section"), models.HSNode.position)
+        .first()
+    )
+    if node is None:
+        raise HTTPException(status_code=404, detail="HS node not found")
+    return node
+
+
+def _hs_dict(n: models.HSNode) -> dict:
+    return {"code": n.code, "kind": n.kind, "description": n.description, "depth": n.depth, "path": n.path}
+
+
+@app.get("/hs/{code}")
+def hs_subtree(code: str, depth: int | None = None, db: Session = Depends(get_db)):
+    """A node of the HS hierarchy (section, chapter, heading, ...) and everything under it.
+
+    One range scan of the hs_node primary key (materialised paths); `depth` limits how
+    many levels below the node are returned.
+    """
+    node = _hs_node(db, code)
+    lo, hi = subtree_bounds(node.path)
+    query = db.query(models.HSNode).filter(models.HSNode.path >= lo, models.HSNode.path < hi)
+    if depth is not None:
+        query = query.filter(models.HSNode.depth <= node.depth + max(0, depth))
+    return {"node": _hs_dict(node), "nodes": [_hs_dict(n) for n in query.order_by(models.HSNode.position)]}
+
+
+@app.get("/hs/{code}/summary")
+def hs_summary(code: str, db: Session = Depends(get_db)):
+    """Per-heading aggregates (commodities, rates) of the headings under a section or chapter.
+
+    For a heading or a deeper node, a single group: the commodities under that node.
+    """
+    node = _hs_node(db, code)
+    h = aliased(models.HSNode)
+    c = aliased(models.HSNode)
+    if node.kind in ("section", "chapter", "subchapter"):
+        lo, hi = subtree_bounds(node.path)
+        groups = (h.path >= lo) & (h.path < hi) & (h.kind == "heading")
+    else:
+        groups = h.path == node.path
+    rows = db.execute(
+        select(h.code, h.description, func.count(distinct(c.code)), func.count(models.Rate.id))
+        .select_from(h)
+        # Commodities under each heading: a range join on the path index
+        .join(c, (c.path > h.path.concat(PATH_SEP)) & (c.path < h.path.concat(PATH_SEP_NEXT)))
+        .join(models.HTC, models.HTC.code == c.code)
+        .outerjoin(models.Rate, models.Rate.htc_id == models.HTC.id)
+        .where(groups, c.kind == "commodity")
+        .group_by(h.path, h.code, h.description, h.position)
+        .order_by(h.position)
+    ).all()
     return {
-        "agreements": [
-            {"code": code, "name": get_landgroup_name(code), "count": count}
-            for code, count in sorted(counts.items(), key=lambda kv: kv[0])
-        ]
+        "node": _hs_dict(node),
+        "groups": [
+            {"code": hc, "description": desc, "commodities": n_codes, "rates": n_rates}
+            for hc, desc, n_codes, n_rates in rows
+        ],
     }
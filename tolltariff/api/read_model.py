@@ -0,0 +1,206 @@
+from __future__ import annotations
+import sys
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Generic, Optional, TypeVar
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import HTC, DatasetVersion, Rate
+
+# Rows fetched per round trip while building
+_YIELD_PER = 10_000
+
+
+class RateRecord:
+    """One rate, with the attributes of models.Rate the /htc/{code} endpoints read."""
+
+    __slots__ = (
+        "id", "country_iso", "rate_type", "value", "currency", "unit", "is_exemption",
+        "agreement", "conditions", "valid_from", "valid_to",
+    )
+
+    def __init__(self, id, country_iso, rate_type, value, currency, unit, is_exemption, agreement, conditions, valid_from, valid_to):
+        self.id = id
+        self.country_iso = country_iso
+        self.rate_type = rate_type
+        self.value = value
+        self.currency = currency
+        self.unit = unit
+        self.is_exemption = is_exemption
+        self.agreement = agreement
+        self.conditions = conditions
+        self.valid_from = valid_from
+        self.valid_to = valid_to
+
+
+class HtcRecord:
+    """An HTC and its rates (in id order, like HTC.rates)."""
+
+    __slots__ = ("code", "name", "description", "rates")
+
+    def __init__(self, code: str, name: Optional[str], description: Optional[str], rates: Any) -> None:
+        self.code = code
+        self.name = name
+        self.description = description
+        self.rates = rates
+
+    def rates_on(self, as_of: Optional[date]) -> list[RateRecord]:
+        """Rates valid on `as_of` (all without a date); open ends are unbounded."""
+        if as_of is None:
+            return list(self.rates)
+        return [
+            r for r in self.rates
+            if (r.valid_from is None or r.valid_from <= as_of) and (r.valid_to is None or r.valid_to >= as_of)
+        ]
+
+
+class ReadModel:
+    """All HTCs and rates, by HTC code, as of one data version."""
+
+    __slots__ = ("version", "htcs", "rate_count", "build_s", "_size")
+
+    def __init__(self, version: Optional[int], htcs: dict[str, HtcRecord], rate_count: int, build_s: float) -> None:
+        self.version = version
+        self.htcs = htcs
+        self.rate_count = rate_count
+        self.build_s = build_s
+        self._size: Optional[int] = None
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the model (each shared object counted once)."""
+        if self._size is None:
+            seen: set[int] = set()
+            total = 0
+            stack: list[Any] = [self.htcs]
+            for code, h in self.htcs.items():
+                stack += (code, h, h.name, h.description, h.rates)
+                for r in h.rates:
+                    stack.append(r)
+                    stack += (getattr(r, f) for f in RateRecord.__slots__)
+            for obj in stack:
+                if id(obj) not in seen:
+                    seen.add(id(obj))
+                    total += sys.getsizeof(obj)
+            self._size = total
+        return self._size
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "version": self.version,
+            "htc_count": len(self.htcs),
+            "rate_count": self.rate_count,
+            "build_s": round(self.build_s, 3),
+            "memory_mb": round(self.memory_bytes() / (1 << 20), 1),
+        }
+
+
+def data_version(db: Session) -> Optional[int]:
+    """Id of the last dataset_version row (None before the first import).
+
+    Every import and refresh adds one with its final commit (etl.delta.record_import),
+    in-place updates included; the chunk commits of a running import do not, so caches
+    are rebuilt once per import, not per chunk.
+    """
+    return db.execute(select(func.max(DatasetVersion.id))).scalar()
+
+
+def build(db: Session, version: Optional[int] = None) -> ReadModel:
+    """Load every HTC and rate into a ReadModel (two sequential scans)."""
+    t0 = time.perf_counter()
+    if version is None:
+        version = data_version(db)
+    htcs: dict[str, HtcRecord] = {}
+    by_id: dict[int, list[RateRecord]] = {}
+    for htc_id, code, name, description in db.execute(select(HTC.id, HTC.code, HTC.name, HTC.description)):
+        by_id[htc_id] = []
+        htcs[code] = HtcRecord(code, name, description, by_id[htc_id])
+
+    # Repeated values (codes, units, Decimals, dates) share one object
+    shared: dict[Any, Any] = {}
+    intern = sys.intern
+    n = 0
+    stmt = select(
+        Rate.htc_id, Rate.id, Rate.country_iso, Rate.rate_type, Rate.value, Rate.currency, Rate.unit,
+        Rate.is_exemption, Rate.agreement, Rate.conditions, Rate.valid_from, Rate.valid_to,
+    ).order_by(Rate.id)
+    for htc_id, rid, iso, rate_type, value, currency, unit, exempt, agreement, conditions, vf, vt in db.execute(
+        stmt.execution_options(yield_per=_YIELD_PER)
+    ):
+        rates = by_id.get(htc_id)
+        if rates is None:
+            continue
+        rates.append(RateRecord(
+            rid,
+            intern(iso),
+            rate_type,
+            shared.setdefault(value, value),
+            intern(currency) if currency else currency,
+            intern(unit) if unit else unit,
+            exempt,
+            intern(agreement) if agreement else agreement,
+            shared.setdefault(conditions, conditions),
+            shared.setdefault(vf, vf),
+            shared.setdefault(vt, vt),
+        ))
+        n += 1
+    for h in htcs.values():
+        h.rates = tuple(h.rates)
+    return ReadModel(version, htcs, n, time.perf_counter() - t0)
+
+
+T = TypeVar("T")
+
+
+class Versioned(Generic[T]):
+    """A value built from the database by `build(db, version)`, rebuilt when data_version() changes.
+
+    The version is compared at most every `read_model_check_s` seconds; in between no SQL
+    is run. While one request rebuilds, others keep answering from the old value.
+    """
+
+    def __init__(self, build: Callable[[Session, Optional[int]], T]) -> None:
+        self._build = build
+        self._lock = threading.Lock()
+        self._value: Optional[T] = None
+        self._version: Optional[int] = None
+        self._checked = 0.0
+
+    def get(self, db: Session) -> T:
+        value = self._value
+        if value is not None and time.monotonic() - self._checked < settings.read_model_check_s:
+            return value
+        if not self._lock.acquire(blocking=value is None):
+            return value
+        try:
+            if self._value is None or time.monotonic() - self._checked >= settings.read_model_check_s:
+                version = data_version(db)
+                if self._value is None or self._version != version:
+                    self._value, self._version = self._build(db, version), version
+                self._checked = time.monotonic()
+            return self._value
+        finally:
+            self._lock.release()
+
+    def forget(self) -> None:
+        """Drop the value; the next get() rebuilds it (e.g. after swapping the database file)."""
+        with self._lock:
+            self._value = None
+
+
+_model: Versioned[ReadModel] = Versioned(build)
+
+
+def current(db: Session) -> Optional[ReadModel]:
+    """The read model when enabled (settings.read_model), else None."""
+    if not settings.read_model:
+        return None
+    return _model.get(db)
+
+
+def forget() -> None:
+    """Drop the model; the next request rebuilds it."""
+    _model.forget()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import re
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..etl.search import words
+from ..models import HTC
+from .read_model import Versioned
+
+# One past the last character a code or token can contain, for bisect range ends
+_MAX = "\U0010ffff"
+# Token prefixes up to this length get their postings merged at build time
+_MERGED_PREFIX_LEN = 2
+
+
+def _is_code(word: str) -> bool:
+    return word.isdigit()
+
+
+class SuggestIndex:
+    """Sorted arrays for prefix lookups over HTC codes and name words.
+
+    `codes`/`names` are parallel and sorted by code, so a code prefix is a bisect range.
+    `tokens` is the sorted list of distinct normalised name words; `postings[i]` holds the
+    (sorted) positions in `codes` of the HTCs whose name contains tokens[i]. Short prefixes
+    (up to _MERGED_PREFIX_LEN characters) have their postings pre-merged in `merged`.
+    """
+
+    __slots__ = ("codes", "names", "tokens", "postings", "merged", "build_s")
+
+    def __init__(self, rows: list[tuple[str, Optional[str]]]) -> None:
+        rows = sorted(rows)
+        self.codes = [code for code, _ in rows]
+        self.names = [name for _, name in rows]
+        by_token: dict[str, list[int]] = {}
+        for i, (_, name) in enumerate(rows):
+            for w in dict.fromkeys(words(name or "")):
+                by_token.setdefault(w, []).append(i)
+        self.tokens = sorted(by_token)
+        self.postings = [array("i", by_token[t]) for t in self.tokens]
+        short: dict[str, set[int]] = {}
+        for t, post in zip(self.tokens, self.postings):
+            for n in range(1, min(len(t), _MERGED_PREFIX_LEN) + 1):
+                short.setdefault(t[:n], set()).update(post)
+        self.merged = {p: array("i", sorted(s)) for p, s in short.items()}
+        self.build_s = 0.0
+
+    def code_range(self, prefix: str) -> tuple[int, int]:
+        return bisect_left(self.codes, prefix), bisect_left(self.codes, prefix + _MAX)
+
+    def word_postings(self, prefix: str) -> array:
+        """Sorted positions of the HTCs with a name word starting with `prefix`."""
+        merged = self.merged.get(prefix)
+        if merged is not None or len(prefix) <= _MERGED_PREFIX_LEN:
+            return merged or array("i")
+        lo, hi = bisect_left(self.tokens, prefix), bisect_left(self.tokens, prefix + _MAX)
+        if hi - lo == 1:
+            return self.postings[lo]
+        hits: set[int] = set()
+        for post in self.postings[lo:hi]:
+            hits.update(post)
+        return array("i", sorted(hits))
+
+    def suggest(self, q: str, limit: int = 10) -> list[dict[str, Any]]:
+        """Up to `limit` HTCs, by code, matching every word of `q` as a prefix.
+
+        Numeric words are code prefixes ("0101.2" is one code, 01012); other words must
+        start a word of the name.
+        """
+        if re.fullmatch(r"[\d.\s]+", q):
+            q = "".join(ch for ch in q if ch.isdigit())
+        terms = words(q)
+        if not terms:
+            return []
+        lo, hi = 0, len(self.codes)
+        lists: list[array] = []
+        for t in terms:
+            if _is_code(t):
+                a, b = self.code_range(t)
+                lo, hi = max(lo, a), min(hi, b)
+            else:
+                lists.append(self.word_postings(t))
+        if lo >= hi:
+            return []
+        out = []
+        for i in self._matches(lo, hi, lists):
+            out.append({"code": self.codes[i], "name": self.names[i]})
+            if len(out) >= limit:
+                break
+        return out
+
+    def _matches(self, lo: int, hi: int, lists: list[array]) -> Iterator[int]:
+        if not lists:
+            yield from range(lo, hi)
+            return
+        # Walk the shortest postings list; check the others by bisect
+        lists = sorted(lists, key=len)
+        first, rest = lists[0], lists[1:]
+        for k in range(bisect_left(first, lo), len(first)):
+            i = first[k]
+            if i >= hi:
+                return
+            if all(_contains(other, i) for other in rest):
+                yield i
+
+
+def _contains(sorted_ints: array, i: int) -> bool:
+    k = bisect_left(sorted_ints, i)
+    return k < len(sorted_ints) and sorted_ints[k] == i
+
+
+def build(db: Session, version: Optional[int] = None) -> SuggestIndex:
+    t0 = time.perf_counter()
+    index = SuggestIndex([tuple(r) for r in db.execute(select(HTC.code, HTC.name))])
+    index.build_s = time.perf_counter() - t0
+    return index
+
+
+_index: Versioned[SuggestIndex] = Versioned(build)
+
+
+def current(db: Session) -> SuggestIndex:
+    """The suggest index, rebuilt when the data version changes (see read_model.Versioned)."""
+    return _index.get(db)
+
+
+def forget() -> None:
+    """Drop the index; the next request rebuilds it."""
+    _index.forget()
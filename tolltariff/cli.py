@@ -1,21 +1,79 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
 from decimal import Decimal
 from datetime import date
 import typer
 from sqlalchemy.orm import Session
 
-from .db import Base, engine, SessionLocal
+from .db import Base, engine, SessionLocal, bulk_session, init_db, shadow_session, ShadowValidationError
 from .models import HTC, Rate, RateType
 from pathlib import Path
-from .etl.opendata import fetch_structure_json, fetch_import_fees_json, RAW_DIR, fetch_landgroups_json, fetch_fta_json
+from .config import settings
+from .etl.opendata import fetch_structure_json, fetch_import_fees_json, RAW_DIR, fetch_landgroups_json, fetch_fta_json, fetch_all
 from .etl.structure_import import import_structure_json
 from .etl.rates_import import import_default_rates_from_fees, import_customs_duty_from_toll
 from .models import Rate
 from .data.landgroups import LANDGROUPS, get_landgroup_countries
 from .etl.landgroups_import import import_landgroups_json
 from .etl.fta_import import import_fta
+from .etl.export import export_best_zero as export_best_zero_json
+from .etl.columnar import BATCH_ROWS, FORMATS as COLUMNAR_FORMATS, export_columnar
+from .etl.delta import DeltaTracker, record_import
+from .etl.derived import agreement_counts, refresh_derived
+from .etl.search import refresh_search
+from .etl.telemetry import SINKS, Telemetry
+from .etl.pipeline import StageResult, refresh_stages, run_stages
 
 app = typer.Typer(help="CLI pentru Advanced Tolltariff")
 
+
+@app.callback()
+def main(
+    offline: bool = typer.Option(False, "--offline", help="Folosește doar fișierele locale din data/raw, fără descărcări"),
+):
+    if offline:
+        settings.offline = True
+
+
+@contextmanager
+def _etl_session(bulk: bool, shadow: bool = False) -> Iterator[Session]:
+    # An immutable database is never written in place
+    if shadow or settings.immutable:
+        try:
+            with shadow_session(drop_indexes=bulk) as db:
+                yield db
+        except ShadowValidationError as e:
+            typer.echo(f"Validare eșuată, baza de date live a rămas neschimbată: {e}", err=True)
+            raise typer.Exit(code=1)
+        return
+    if bulk:
+        with bulk_session() as db:
+            yield db
+        return
+    init_db()
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _telemetry(name: str, fmt: str) -> Telemetry:
+    if fmt == "off":
+        return Telemetry(name)
+    if fmt not in SINKS:
+        raise typer.BadParameter(f"Format necunoscut: {fmt} (text, json sau off)", param_hint="--telemetry")
+    return Telemetry(name, SINKS[fmt]())
+
+
+def _echo_delta(tracker: DeltaTracker) -> None:
+    if tracker.file_unchanged:
+        typer.echo(f"Fișier neschimbat față de ultimul import ({tracker.skipped} coduri sărite).")
+        return
+    c = tracker.counts
+    typer.echo(f"Coduri noi: {c.new}, modificate: {c.changed}, sărite (neschimbate): {c.skipped}.")
+
 @app.command()
 def ingest_sample():
     """Comandă stub pentru ingestie (demo)."""
@@ -25,7 +83,7 @@ def ingest_sample():
 @app.command("seed-demo")
 def seed_demo():
     """Populează DB cu un exemplu minim pentru testare API."""
-    Base.metadata.create_all(bind=engine)
+    init_db()
     db: Session = SessionLocal()
     try:
         code = "0101.21"
@@ -64,6 +122,10 @@ def seed_demo():
                 )
             )
 
+        db.flush()
+        refresh_derived(db)
+        refresh_search(db, [code])
+        record_import(db, "demo")
         db.commit()
         typer.echo("Seed demo complet. Cod: 0101.21 cu rate MFN si exceptie EU.")
     finally:
@@ -83,12 +145,77 @@ def fetch_import_fees():
     path = fetch_import_fees_json()
     typer.echo(f"Am descărcat innfoerselsavgift: {path}")
 
+
+@app.command("fetch-all")
+def fetch_all_cmd():
+    """Descarcă în paralel toate resursele Open Data (doar cele modificate, prin ETag/If-Modified-Since)."""
+    t0 = time.perf_counter()
+    paths = fetch_all()
+    for name, path in paths.items():
+        typer.echo(f"{name}: {path}")
+    typer.echo(f"Descărcare finalizată în {time.perf_counter() - t0:.2f}s.")
+
+
+@app.command("refresh-all")
+def refresh_all(
+    jobs: int = typer.Option(4, "--jobs", min=1, help="Etape independente rulate în paralel"),
+    workers: int = typer.Option(1, "--workers", min=1, help="Procese pentru parsarea pe capitole (un singur writer DB)"),
+    bulk: bool = typer.Option(False, "--bulk", help="Mod bulk-load: pragma-uri de import, indexuri secundare reconstruite la final"),
+    shadow: bool = typer.Option(False, "--shadow", help="Importă într-o copie a DB, validată și comutată atomic la final"),
+):
+    """Descarcă, importă și exportă totul ca un graf de dependențe.
+
+    Etapele independente (descărcări, landgrupper, index FTA, structura) rulează în paralel;
+    etapele ale căror intrări nu s-au schimbat sunt sărite.
+    """
+    t0 = time.perf_counter()
+
+    def report(r: StageResult) -> None:
+        typer.echo(f"[{r.status}] {r.name} ({r.seconds:.2f}s){' - ' + r.detail if r.detail else ''}")
+
+    def summary(results: list[StageResult]) -> None:
+        typer.echo("")
+        typer.echo(f"{'Etapă':<22} {'Stare':<10} {'Timp':>8}")
+        for r in results:
+            typer.echo(f"{r.name:<22} {r.status:<10} {r.seconds:>7.2f}s")
+        typer.echo(f"Total: {time.perf_counter() - t0:.2f}s")
+        if any(r.status in ("failed", "blocked") for r in results):
+            raise typer.Exit(code=1)
+
+    if not (shadow or settings.immutable):
+        summary(run_stages(refresh_stages(lambda: _etl_session(bulk), workers=workers), workers=jobs, on_result=report))
+        return
+    # One copy for the whole graph: DB stages run one at a time and share its session.
+    # A failed stage exits inside the block, so the live database is not swapped.
+    try:
+        with shadow_session(drop_indexes=bulk) as shared:
+
+            @contextmanager
+            def session() -> Iterator[Session]:
+                try:
+                    yield shared
+                except BaseException:
+                    shared.rollback()
+                    raise
+
+            summary(run_stages(refresh_stages(session, workers=workers), workers=jobs, on_result=report))
+    except ShadowValidationError as e:
+        typer.echo(f"Validare eșuată, baza de date live a rămas neschimbată: {e}", err=True)
+        raise typer.Exit(code=1)
+    typer.echo("Baza de date comutată.")
+
+
 @app.command("import-structure")
-def import_structure(file: str | None = typer.Option(None, "--file", help="Calea către customstariffstructure.json")):
+def import_structure(
+    file: str | None = typer.Option(None, "--file", help="Calea către customstariffstructure.json"),
+    full: bool = typer.Option(False, "--full", help="Reprocesează toate codurile, ignorând hash-urile salvate"),
+    workers: int = typer.Option(1, "--workers", min=1, help="Procese pentru parsarea pe capitole (un singur writer DB)"),
+    bulk: bool = typer.Option(False, "--bulk", help="Mod bulk-load: pragma-uri de import, indexuri secundare reconstruite la final"),
+    shadow: bool = typer.Option(False, "--shadow", help="Importă într-o copie a DB, validată și comutată atomic la final"),
+    telemetry: str = typer.Option("text", "--telemetry", help="Telemetrie import pe stderr: text, json (JSON lines) sau off"),
+):
     """Importă structura tarifului (HTC) din JSON în baza de date."""
-    Base.metadata.create_all(bind=engine)
-    db: Session = SessionLocal()
-    try:
+    with _etl_session(bulk, shadow) as db:
         from pathlib import Path
 
         if file:
@@ -100,28 +227,36 @@ def import_structure(file: str | None = typer.Option(None, "--file", help="Calea
         if not path.exists():
             raise typer.Exit(code=1)
 
-        added = import_structure_json(db, path)
-        typer.echo(f"Import structura finalizat. HTC noi adăugate: {added}.")
-    finally:
-        db.close()
+        tel = _telemetry("structure", telemetry)
+        with tel.phase("read"):
+            tracker = DeltaTracker(db, "structure", path, full=full)
+        counts = import_structure_json(db, path, tracker=tracker, workers=workers, telemetry=tel)
+        tel.finish()
+        typer.echo(
+            f"Import structura finalizat. HTC noi: {counts.inserted}, "
+            f"redenumite: {counts.updated}, neschimbate: {counts.unchanged}."
+        )
+        _echo_delta(tracker)
 
 
 @app.command("scan-agreements")
-def scan_agreements(out: str = typer.Option("data/landgroups_catalog.json", help="Output JSON path")):
+def scan_agreements(
+    out: str = typer.Option("data/landgroups_catalog.json", help="Output JSON path"),
+    by_chapter: bool = typer.Option(False, "--by-chapter", help="Include numărul de rate pe capitol HS"),
+):
     """Scanează DB pentru toate codurile de landgruppe (agreements) prezente și produce un catalog JSON.
 
     Include frecvența pe HTCurile afectate și marchează dacă există mapping de nume.
+    Numărătorile vin din tabela agreement_count (menținută la import).
     """
-    Base.metadata.create_all(bind=engine)
+    init_db()
     db: Session = SessionLocal()
     try:
-        rows = db.query(Rate.agreement).filter(Rate.agreement != None).all()
         codes = {}
-        for (code,) in rows:
-            if not code:
-                continue
-            codes.setdefault(code, {"name": LANDGROUPS.get(code), "count": 0})
-            codes[code]["count"] += 1
+        for code, chapters in sorted(agreement_counts(db).items()):
+            codes[code] = {"name": LANDGROUPS.get(code), "count": sum(chapters.values())}
+            if by_chapter:
+                codes[code]["chapters"] = dict(sorted(chapters.items()))
         import json
         from pathlib import Path
         Path(out).write_text(json.dumps({"agreements": codes}, ensure_ascii=False, indent=2), encoding="utf-8")
@@ -144,9 +279,14 @@ def fetch_fta():
 
 
 @app.command("import-landgroups")
-def import_landgroups(file: str | None = typer.Option(None, "--file", help="Calea către landgruppe.json")):
+def import_landgroups(
+    file: str | None = typer.Option(None, "--file", help="Calea către landgruppe.json"),
+    telemetry: str = typer.Option("text", "--telemetry", help="Telemetrie import pe stderr: text, json (JSON lines) sau off"),
+):
     """Importă landgruppe -> countries mapping și salvează în data/landgroups_map.json.
 
+    Intervalele de apartenență (fomdato/tomdato) se scriu separat, în data/landgroup_memberships.json.
+
     API-ul va folosi acest fișier pentru a afișa nume și țări pentru fiecare agreement.
     """
     if file:
@@ -156,11 +296,16 @@ def import_landgroups(file: str | None = typer.Option(None, "--file", help="Cale
     if not path.exists():
         typer.echo(f"Fișierul nu există: {path}. Rulați întâi fetch-landgroups sau furnizați --file.")
         raise typer.Exit(code=1)
-    out = import_landgroups_json(path)
+    tel = _telemetry("landgroups", telemetry)
+    out = import_landgroups_json(path, telemetry=tel)
+    tel.finish()
     typer.echo(f"Import landgrupper finalizat: {out}")
 
 @app.command("import-fta")
-def import_fta_cmd(file: str | None = typer.Option(None, "--file", help="Calea către ratetradeagreements.json")):
+def import_fta_cmd(
+    file: str | None = typer.Option(None, "--file", help="Calea către ratetradeagreements.json"),
+    telemetry: str = typer.Option("text", "--telemetry", help="Telemetrie import pe stderr: text, json (JSON lines) sau off"),
+):
     """Importă free trade agreements per HTC și scrie indexul în data/ratetradeagreements_index.json"""
     from pathlib import Path
     if file:
@@ -170,55 +315,94 @@ def import_fta_cmd(file: str | None = typer.Option(None, "--file", help="Calea c
     if not path.exists():
         typer.echo(f"Fișierul nu există: {path}. Rulați întâi fetch-fta sau furnizați --file.")
         raise typer.Exit(code=1)
-    out = import_fta(path)
+    tel = _telemetry("fta", telemetry)
+    out = import_fta(path, telemetry=tel)
+    tel.finish()
     typer.echo(f"Import FTA finalizat: {out}")
 
 
 @app.command("export-best-zero")
-def export_best_zero(out: str = typer.Option("data/best_zero_countries.json", help="Output JSON path for best zero-duty by HTC")):
+def export_best_zero(
+    out: str = typer.Option("data/best_zero_countries.json", help="Output JSON path for best zero-duty by HTC"),
+    chapters_dir: str | None = typer.Option(
+        None, "--chapters-dir", help="Scrie și câte un fișier pe capitol (01.json…), ex. frontend/data/best_zero"
+    ),
+):
     """Exportă, pentru fiecare HTC, lista de țări potențiale cu taxă vamală zero (excluzând TVA),
     derivată din landgruppe -> countries.
 
     Dacă un landgruppe nu are mapare de țări, nu va contribui la listă.
+    Exportul citește ratele într-o singură interogare ordonată și scrie JSON compact pe măsură ce avansează.
     """
-    Base.metadata.create_all(bind=engine)
+    init_db()
     db: Session = SessionLocal()
     try:
-        import json
-        from collections import defaultdict
-        from pathlib import Path
-        # Build per-HTC zero groups
-        from .models import HTC, Rate, RateType
-        result = {}
-        htcs = db.query(HTC).order_by(HTC.code).all()
-        for h in htcs:
-            zero_groups = set()
-            for r in h.rates:
-                if r.rate_type == RateType.PERCENT:
-                    continue
-                # value is Decimal
-                if float(r.value) == 0.0 and r.agreement:
-                    zero_groups.add(r.agreement)
-            countries = []
-            for g in sorted(zero_groups):
-                for c in get_landgroup_countries(g):
-                    countries.append(c)
-            if countries:
-                result[h.code] = {"countries": countries}
-        Path(out).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
-        typer.echo(f"Best zero countries exportat: {out} (HTC-uri: {len(result)})")
+        n = export_best_zero_json(db, Path(out), Path(chapters_dir) if chapters_dir else None)
+        typer.echo(f"Best zero countries exportat: {out} (HTC-uri: {n})")
+        if chapters_dir:
+            typer.echo(f"Fișiere pe capitole scrise în {chapters_dir}")
+    finally:
+        db.close()
+
+
+@app.command("export-columnar")
+def export_columnar_cmd(
+    out: str = typer.Option("data/columnar", "--out", help="Directorul de ieșire"),
+    fmt: str = typer.Option("arrow", "--format", help="arrow (Arrow IPC, mmap) sau parquet"),
+    batch_rows: int = typer.Option(BATCH_ROWS, "--batch-rows", min=1, help="Rânduri per record batch (limitează memoria)"),
+    telemetry: str = typer.Option("text", "--telemetry", help="Telemetrie export pe stderr: text, json (JSON lines) sau off"),
+):
+    """Exportă htc, rate și maparea agreement -> țări în fișiere Arrow IPC sau Parquet.
+
+    Exportul este în flux (record batch-uri de --batch-rows rânduri); coloanele agreement,
+    rate_type, țară, monedă, unitate și sursă sunt codificate cu dicționar. Necesită pyarrow.
+    """
+    if fmt not in COLUMNAR_FORMATS:
+        raise typer.BadParameter(f"Format necunoscut: {fmt} (arrow sau parquet)", param_hint="--format")
+    init_db()
+    db: Session = SessionLocal()
+    try:
+        tel = _telemetry("columnar", telemetry)
+        counts = export_columnar(db, Path(out), fmt, batch_rows, telemetry=tel)
+        tel.finish()
+    except RuntimeError as e:
+        typer.echo(f"Export eșuat: {e}", err=True)
+        raise typer.Exit(code=1)
     finally:
         db.close()
+    files = ", ".join(f"{name}: {n}" for name, n in counts.items())
+    typer.echo(f"Export columnar ({fmt}) salvat în {out} ({files})")
+
+@app.command("refresh-derived")
+def refresh_derived_cmd(
+    bulk: bool = typer.Option(False, "--bulk", help="Mod bulk-load: pragma-uri de import, indexuri secundare reconstruite la final"),
+    shadow: bool = typer.Option(False, "--shadow", help="Importă într-o copie a DB, validată și comutată atomic la final"),
+):
+    """Reconstruiește tabelele derivate din `rate` (rate_compact, agreement) și indexurile de căutare (htc_search, htc_trigram)."""
+    t0 = time.perf_counter()
+    with _etl_session(bulk, shadow) as db:
+        refresh_derived(db)
+        refresh_search(db)
+        record_import(db, "derived")
+        db.commit()
+    typer.echo(f"Tabele derivate reconstruite în {time.perf_counter() - t0:.2f}s.")
+
 
 @app.command("import-default-rates")
-def import_default_rates(file: str | None = typer.Option(None, "--file", help="Calea către innfoerselsavgift.json")):
+def import_default_rates(
+    file: str | None = typer.Option(None, "--file", help="Calea către innfoerselsavgift.json"),
+    full: bool = typer.Option(False, "--full", help="Reprocesează toate codurile, ignorând hash-urile salvate"),
+    workers: int = typer.Option(1, "--workers", min=1, help="Procese pentru parsarea pe capitole (un singur writer DB)"),
+    resume: bool = typer.Option(False, "--resume", help="Continuă un import întrerupt de la ultimul checkpoint"),
+    bulk: bool = typer.Option(False, "--bulk", help="Mod bulk-load: pragma-uri de import, indexuri secundare reconstruite la final"),
+    shadow: bool = typer.Option(False, "--shadow", help="Importă într-o copie a DB, validată și comutată atomic la final"),
+    telemetry: str = typer.Option("text", "--telemetry", help="Telemetrie import pe stderr: text, json (JSON lines) sau off"),
+):
     """Importă rata implicită (MV % din valoare) pentru fiecare cod din JSON.
 
     Heuristic: landgruppe=ALLE, avgiftstype=MV, enhet=P
     """
-    Base.metadata.create_all(bind=engine)
-    db: Session = SessionLocal()
-    try:
+    with _etl_session(bulk, shadow) as db:
         if file:
             path = Path(file)
         else:
@@ -227,21 +411,32 @@ def import_default_rates(file: str | None = typer.Option(None, "--file", help="C
             path = local if local.exists() else fetch_import_fees_json()
         if not path.exists():
             raise typer.Exit(code=1)
-        added = import_default_rates_from_fees(db, path, source_url=str(path))
+        tel = _telemetry("default", telemetry)
+        with tel.phase("read"):
+            tracker = DeltaTracker(db, "default", path, full=full)
+        added = import_default_rates_from_fees(
+            db, path, source_url=str(path), tracker=tracker, workers=workers, resume=resume, telemetry=tel
+        )
+        tel.finish()
         typer.echo(f"Import rate implicite finalizat. Rate noi adăugate: {added}.")
-    finally:
-        db.close()
+        _echo_delta(tracker)
 
 
 @app.command("import-duty-rates")
-def import_duty_rates(file: str | None = typer.Option(None, "--file", help="Calea către tollavgiftssats.json")):
+def import_duty_rates(
+    file: str | None = typer.Option(None, "--file", help="Calea către tollavgiftssats.json"),
+    full: bool = typer.Option(False, "--full", help="Reprocesează toate codurile, ignorând hash-urile salvate"),
+    workers: int = typer.Option(1, "--workers", min=1, help="Procese pentru parsarea pe capitole (un singur writer DB)"),
+    resume: bool = typer.Option(False, "--resume", help="Continuă un import întrerupt de la ultimul checkpoint"),
+    bulk: bool = typer.Option(False, "--bulk", help="Mod bulk-load: pragma-uri de import, indexuri secundare reconstruite la final"),
+    shadow: bool = typer.Option(False, "--shadow", help="Importă într-o copie a DB, validată și comutată atomic la final"),
+    telemetry: str = typer.Option("text", "--telemetry", help="Telemetrie import pe stderr: text, json (JSON lines) sau off"),
+):
     """Importă taxele vamale (MFN) și ratele preferențiale din tollavgiftssats.json.
 
     Stochează taxa ordinară cu `country_iso='*'` și ratele preferențiale cu `agreement=<landgruppe>`.
     """
-    Base.metadata.create_all(bind=engine)
-    db: Session = SessionLocal()
-    try:
+    with _etl_session(bulk, shadow) as db:
         if file:
             path = Path(file)
         else:
@@ -250,12 +445,21 @@ def import_duty_rates(file: str | None = typer.Option(None, "--file", help="Cale
             typer.echo(f"Fișierul nu există: {path}. Furnizați calea cu --file.")
             raise typer.Exit(code=1)
 
-        added = import_customs_duty_from_toll(db, path, source_url=str(path))
-        typer.echo(f"Import taxe vamale finalizat. Rate noi adăugate: {added}.")
-    finally:
-        db.close()
+        t0 = time.perf_counter()
+        tel = _telemetry("duty", telemetry)
+        with tel.phase("read"):
+            tracker = DeltaTracker(db, "duty", path, full=full)
+        added = import_customs_duty_from_toll(
+            db, path, source_url=str(path), tracker=tracker, workers=workers, resume=resume, telemetry=tel
+        )
+        tel.finish()
+        elapsed = time.perf_counter() - t0
+        typer.echo(
+            f"Import taxe vamale finalizat. Rate noi adăugate: {added} "
+            f"în {elapsed:.2f}s ({added / elapsed if elapsed else 0:.0f} rânduri/s)."
+        )
+        _echo_delta(tracker)
 
-    
 
 if __name__ == "__main__":
     app()
@@ -7,6 +7,12 @@ class Settings:
     database_url: str
     base_url: Optional[str]
     data_dir: Path
+    offline: bool
+    compact_rates: bool
+    admin_token: Optional[str]
+    immutable: bool
+    read_model: bool
+    read_model_check_s: float
 
     def __init__(self) -> None:
         # Determine data directory (overrideable via env)
@@ -26,5 +32,18 @@ class Settings:
         default_sqlite = f"sqlite:///{(self.data_dir / 'data.db').as_posix()}"
         self.database_url = os.getenv("DATABASE_URL", default_sqlite)
         self.base_url = os.getenv("TOLLTARIFF_BASE_URL")
+        # Use local raw files only, never download (CLI: --offline)
+        self.offline = os.getenv("TOLLTARIFF_OFFLINE", "").lower() in ("1", "true", "yes")
+        # Maintain the compact read tables (rate_compact, agreement) next to `rate`
+        self.compact_rates = os.getenv("TOLLTARIFF_COMPACT_RATES", "1").lower() not in ("0", "false", "no")
+        # Required in the X-Admin-Token header of /admin/* endpoints; unset, they are disabled
+        self.admin_token = os.getenv("TOLLTARIFF_ADMIN_TOKEN") or None
+        # The SQLite file is never modified in place: the API opens it read-only/immutable
+        # and imports always build a shadow copy that is renamed over it
+        self.immutable = os.getenv("TOLLTARIFF_IMMUTABLE", "").lower() in ("1", "true", "yes")
+        # Serve /htc/{code}/* from an in-memory copy of htc + rate. It (and the /htc/suggest
+        # index) is rebuilt when the data changes, checked at most every read_model_check_s seconds
+        self.read_model = os.getenv("TOLLTARIFF_READ_MODEL", "").lower() in ("1", "true", "yes")
+        self.read_model_check_s = float(os.getenv("TOLLTARIFF_READ_MODEL_CHECK", "5"))
 
 settings = Settings()
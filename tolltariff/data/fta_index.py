@@ -0,0 +1,112 @@
+from __future__ import annotations
+import json
+import os
+import sys
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Any, Optional
+
+from .landgroups import get_landgroup_countries, get_landgroup_name, groups_generation
+
+# Written by `import-fta`: {"<htc>": {"<classifier>": ["<landCode>", ...]}}
+INDEX_PATH = Path("data/ratetradeagreements_index.json")
+
+# An agreement profile: the classifier -> landCodes lists of an HTC, in file order.
+# Thousands of HTCs share the same profile, so each distinct one is stored once.
+Profile = tuple[tuple[str, tuple[str, ...]], ...]
+
+
+class FtaIndex:
+    """The FTA index as profile ids per HTC code, with each profile's resolved groups cached."""
+
+    __slots__ = ("stamp", "profiles", "by_code", "_resolved", "_generation")
+
+    def __init__(self, stamp: tuple[int, int], profiles: list[Profile], by_code: dict[str, int]) -> None:
+        self.stamp = stamp
+        self.profiles = profiles
+        self.by_code = by_code
+        self._resolved: dict[int, list[dict[str, Any]]] = {}
+        self._generation = groups_generation()
+
+    def agreements(self, code: str, as_of: Optional[date] = None) -> list[dict[str, Any]]:
+        """[{"classifier", "groups": [{"code", "name", "countries"}]}] of `code` ([] if unknown).
+
+        Without `as_of` the result is built once per profile and shared: do not modify it.
+        """
+        pid = self.by_code.get(code)
+        if pid is None:
+            return []
+        if as_of is not None:
+            return _resolve(self.profiles[pid], as_of)
+        if self._generation != groups_generation():
+            # The landgruppe mapping was reloaded; expansions built from it are stale
+            self._resolved = {}
+            self._generation = groups_generation()
+        resolved = self._resolved.get(pid)
+        if resolved is None:
+            resolved = self._resolved[pid] = _resolve(self.profiles[pid], None)
+        return resolved
+
+
+def _resolve(profile: Profile, as_of: Optional[date]) -> list[dict[str, Any]]:
+    # landCodes may be named groups (EU, EEA, EFTA, GSP+, ...), enriched with their
+    # countries, or single countries, which have no mapping and are listed as-is
+    return [
+        {
+            "classifier": classifier,
+            "groups": [
+                {"code": lc, "name": get_landgroup_name(lc), "countries": get_landgroup_countries(lc, as_of)}
+                for lc in land_codes
+            ],
+        }
+        for classifier, land_codes in profile
+    ]
+
+
+def _stamp(path: Path) -> Optional[tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_index(path: Path, stamp: Optional[tuple[int, int]] = None) -> FtaIndex:
+    """Parse the index file once, interning identical profiles."""
+    if stamp is None:
+        stamp = _stamp(path) or (0, 0)
+    raw = json.loads(path.read_text(encoding="utf-8"))
+    intern = sys.intern
+    ids: dict[Profile, int] = {}
+    by_code: dict[str, int] = {}
+    for code, entry in raw.items():
+        if not isinstance(entry, dict):
+            continue
+        profile = tuple(
+            (intern(classifier), tuple(intern(str(lc)) for lc in land_codes))
+            for classifier, land_codes in entry.items()
+            if isinstance(land_codes, list)
+        )
+        by_code[code] = ids.setdefault(profile, len(ids))
+    return FtaIndex(stamp, list(ids), by_code)
+
+
+_lock = threading.Lock()
+_index: Optional[FtaIndex] = None
+
+
+def current_index() -> Optional[FtaIndex]:
+    """The loaded index, reloaded when the file's mtime or size changed; None without a file."""
+    global _index
+    path = INDEX_PATH
+    stamp = _stamp(path)
+    if stamp is None:
+        return None
+    index = _index
+    if index is not None and index.stamp == stamp:
+        return index
+    with _lock:
+        if _index is None or _index.stamp != stamp:
+            _index = load_index(path, stamp)
+        return _index
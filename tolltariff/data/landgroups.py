@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from .countries import get_country_name
 import json
+from datetime import date
 from pathlib import Path
 
 # Best-effort mapping of landgruppe codes to human-friendly names.
@@ -68,13 +69,45 @@ LANDGROUP_COUNTRIES: dict[str, list[str]] = {
 }
 
 _MAP_JSON = Path("data/landgroups_map.json")
+# Membership intervals per group (written by import-landgroups next to the map)
+_MEMBERSHIPS_JSON = Path("data/landgroup_memberships.json")
 _DYNAMIC_GROUPS: dict[str, dict] = {}
-if _MAP_JSON.exists():
-    try:
-        obj = json.loads(_MAP_JSON.read_text(encoding="utf-8"))
-        _DYNAMIC_GROUPS = obj.get("groups") or {}
-    except Exception:
-        _DYNAMIC_GROUPS = {}
+# Bumped on every reload, so caches of resolved groups know when to drop them
+_GENERATION = 0
+
+
+def reload_dynamic_groups() -> None:
+    """(Re)load data/landgroups_map.json, e.g. after import-landgroups rewrote it.
+
+    The membership intervals of data/landgroup_memberships.json are attached to their
+    groups as "memberships".
+    """
+    global _DYNAMIC_GROUPS, _GENERATION
+    groups: dict[str, dict] = {}
+    if _MAP_JSON.exists():
+        try:
+            obj = json.loads(_MAP_JSON.read_text(encoding="utf-8"))
+            groups = obj.get("groups") or {}
+        except Exception:
+            groups = {}
+    if _MEMBERSHIPS_JSON.exists():
+        try:
+            memberships = json.loads(_MEMBERSHIPS_JSON.read_text(encoding="utf-8")).get("memberships") or {}
+        except Exception:
+            memberships = {}
+        for code, ms in memberships.items():
+            if isinstance(groups.get(code), dict):
+                groups[code]["memberships"] = ms
+    _DYNAMIC_GROUPS = groups
+    _GENERATION += 1
+
+
+def groups_generation() -> int:
+    """Changes whenever the landgruppe -> countries mapping is reloaded."""
+    return _GENERATION
+
+
+reload_dynamic_groups()
 
 def get_landgroup_name(code: str | None) -> str | None:
     if not code:
@@ -86,14 +119,57 @@ def get_landgroup_name(code: str | None) -> str | None:
         return dyn["name"]
     return LANDGROUPS.get(code)
 
-def get_landgroup_countries(code: str | None) -> list[dict[str, str]]:
+def _members_on(dyn: dict, as_of: str) -> list[str]:
+    """ISO codes of the group's members on `as_of` (ISO date), from its membership intervals.
+
+    Countries without any recorded interval (e.g. merged in from the FTA dataset) count
+    as members throughout.
+    """
+    dated: dict[str, bool] = {}
+    for m in dyn.get("memberships") or []:
+        iso = m.get("iso")
+        if not iso:
+            continue
+        active = (not m.get("from") or m["from"] <= as_of) and (not m.get("to") or m["to"] >= as_of)
+        dated[iso] = dated.get(iso, False) or active
+    return [str(x) for x in dyn["countries"] if dated.get(str(x), True)]
+
+
+def get_landgroup_countries(code: str | None, as_of: date | None = None) -> list[dict[str, str]]:
+    """Member countries of a landgruppe; with `as_of`, only those members on that date."""
     if not code:
         return []
     code = ALIASES.get(code, code)
     iso_list = []
     dyn = _DYNAMIC_GROUPS.get(code)
     if isinstance(dyn, dict) and isinstance(dyn.get("countries"), list):
-        iso_list = [str(x) for x in dyn["countries"]]
+        if as_of is not None and dyn.get("memberships"):
+            iso_list = _members_on(dyn, as_of.isoformat())
+        else:
+            iso_list = [str(x) for x in dyn["countries"]]
     else:
         iso_list = LANDGROUP_COUNTRIES.get(code, [])
     return [{"iso": iso, "name": get_country_name(iso) or iso} for iso in iso_list]
+
+
+def landgroup_codes() -> list[str]:
+    """Every landgruppe code known to the static tables or the imported map."""
+    return sorted(set(LANDGROUPS) | set(LANDGROUP_COUNTRIES) | set(_DYNAMIC_GROUPS))
+
+
+def get_landgroup_memberships(code: str | None) -> list[dict[str, str | None]]:
+    """Members of a landgruppe with their validity: [{"iso", "from", "to"}] (None = open).
+
+    Countries without a recorded interval are listed once with open dates.
+    """
+    if not code:
+        return []
+    code = ALIASES.get(code, code)
+    dyn = _DYNAMIC_GROUPS.get(code)
+    if not (isinstance(dyn, dict) and isinstance(dyn.get("countries"), list)):
+        return [{"iso": iso, "from": None, "to": None} for iso in LANDGROUP_COUNTRIES.get(code, [])]
+    dated = [m for m in dyn.get("memberships") or [] if m.get("iso")]
+    have = {m["iso"] for m in dated}
+    out = [{"iso": m["iso"], "from": m.get("from"), "to": m.get("to")} for m in dated]
+    out += [{"iso": str(iso), "from": None, "to": None} for iso in dyn["countries"] if str(iso) not in have]
+    return out
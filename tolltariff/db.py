@@ -1,7 +1,21 @@
-from sqlalchemy import create_engine, event
-from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from urllib.parse import quote
+
+from sqlalchemy import create_engine, delete, event, func, make_url, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import QueuePool, StaticPool
+from sqlalchemy.schema import CreateIndex, DropIndex
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 engine = create_engine(settings.database_url, future=True, echo=False)
 
 # SQLite performance pragmas for faster bulk imports (Render/containers)
@@ -27,6 +41,335 @@ if settings.database_url.startswith("sqlite"):
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
 Base = declarative_base()
 
+
+# Unique indexes the importers rely on for ON CONFLICT DO NOTHING: legacy duplicate rows
+# (identical on the index key; the lowest id is kept) are removed so they can be created
+DEDUPE_UNIQUE_INDEXES = ("uq_rate_natural",)
+
+
+def _create_index(bind, index) -> None:
+    try:
+        with bind.begin() as conn:
+            conn.execute(CreateIndex(index, if_not_exists=True))
+        return
+    except IntegrityError as e:
+        if index.name not in DEDUPE_UNIQUE_INDEXES:
+            logger.warning("Index %s not created (duplicate rows): %s", index.name, e.orig)
+            return
+    table = index.table
+    keep = select(func.min(table.c.id)).group_by(*index.expressions)
+    with bind.begin() as conn:
+        removed = conn.execute(delete(table).where(table.c.id.not_in(keep))).rowcount
+        conn.execute(CreateIndex(index, if_not_exists=True))
+    logger.warning("Removed %d duplicate %s rows to create %s", removed, table.name, index.name)
+
+
+def init_db(bind=None) -> None:
+    """Create missing tables and indexes (and on SQLite the htc_search FTS5 table).
+
+    `create_all` skips indexes of tables that already exist, so indexes added after
+    a database was first created are created here individually.
+    """
+    from . import models  # noqa: F401  (register tables on Base.metadata)
+
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            _create_index(bind, index)
+    if bind.dialect.name == "sqlite":
+        try:
+            with bind.begin() as conn:
+                conn.execute(text(models.HTC_SEARCH_DDL))
+        except Exception:
+            # SQLite built without FTS5: /htc keeps its LIKE search
+            pass
+
+
+# Secondary (non-unique) indexes dropped for the duration of a bulk load and rebuilt
+# afterwards. The unique indexes stay: importers rely on them for ON CONFLICT and
+# uq_rate_natural (htc_id, ...) also serves the per-HTC lookups during the load.
+BULK_DROP_INDEXES = (
+    "ix_rate_htc_country",
+    "ix_rate_htc_id",
+    "ix_rate_country_iso",
+    "ix_rate_agreement",
+    "ix_rate_htc_validity",
+)
+
+
+def _set_bulk_pragmas(dbapi_connection, connection_record):
+    cur = dbapi_connection.cursor()
+    # Single writer, no concurrent readers: keep locks for the whole connection
+    cur.execute("PRAGMA locking_mode=EXCLUSIVE;")
+    # The load can be re-run from the source files, so skip fsyncs
+    cur.execute("PRAGMA synchronous=OFF;")
+    cur.execute("PRAGMA temp_store=MEMORY;")
+    # ~256 MiB page cache and 1 GiB mmap for the index rebuilds
+    cur.execute("PRAGMA cache_size=-262144;")
+    cur.execute("PRAGMA mmap_size=1073741824;")
+    cur.close()
+
+
+@contextmanager
+def bulk_session() -> Iterator[Session]:
+    """Session for ETL bulk loads, separate from the serving engine.
+
+    On SQLite it uses its own single-connection engine with import pragmas (exclusive
+    locking, large cache, synchronous=OFF), drops BULK_DROP_INDEXES before the load and
+    rebuilds them afterwards, then runs ANALYZE and PRAGMA optimize. If the load raises,
+    the indexes are still rebuilt (a rebuild failure is logged) and the load's exception
+    propagates. Other databases get a regular session. The serving engine and its pragmas are untouched.
+    """
+    if not settings.database_url.startswith("sqlite"):
+        init_db()
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+
+    from . import models  # noqa: F401
+
+    # Exclusive locking needs the file to ourselves: release this process's pooled
+    # serving connections (they reconnect lazily)
+    engine.dispose()
+    # One connection for the whole load keeps the lock and the warm page cache across commits
+    bulk_engine = create_engine(settings.database_url, future=True, poolclass=StaticPool)
+    event.listen(bulk_engine, "connect", _set_bulk_pragmas)
+    init_db(bulk_engine)
+    dropped = [
+        index
+        for table in Base.metadata.sorted_tables
+        for index in table.indexes
+        if index.name in BULK_DROP_INDEXES
+    ]
+    db = Session(bind=bulk_engine, autoflush=False, future=True)
+    try:
+        conn = db.connection()
+        for index in dropped:
+            conn.execute(DropIndex(index, if_exists=True))
+        db.commit()
+        try:
+            yield db
+        except BaseException:
+            # Chunks committed before the failure stay; put their indexes back, but let
+            # the load's own error be the one raised
+            db.rollback()
+            try:
+                _rebuild_indexes(db, dropped, analyze=False)
+            except Exception:
+                logger.exception("Could not rebuild indexes after the failed bulk load")
+            raise
+        db.rollback()
+        _rebuild_indexes(db, dropped, analyze=True)
+    finally:
+        db.close()
+        bulk_engine.dispose()
+
+
+def _rebuild_indexes(db: Session, indexes, analyze: bool) -> None:
+    conn = db.connection()
+    for index in indexes:
+        conn.execute(CreateIndex(index, if_not_exists=True))
+    if analyze:
+        conn.execute(text("ANALYZE"))
+        conn.execute(text("PRAGMA optimize"))
+    db.commit()
+
+
+class ShadowValidationError(RuntimeError):
+    """The shadow database failed validation; the live database was left untouched."""
+
+
+def _sqlite_path(url: str) -> Path:
+    return Path(make_url(url).database)
+
+
+def validate_database(path: Path, reference: Path | None = None) -> None:
+    """Check a finished database file before it is swapped in.
+
+    Runs PRAGMA quick_check and foreign_key_check, and refuses an empty `htc`/`rate`
+    table when the same table of `reference` (the live database) has rows.
+    """
+    con = sqlite3.connect(path)
+    try:
+        problems = [r[0] for r in con.execute("PRAGMA quick_check") if r[0] != "ok"]
+        if con.execute("PRAGMA foreign_key_check").fetchone() is not None:
+            problems.append("foreign key violations")
+        if reference is not None and reference.exists():
+            ref = sqlite3.connect(f"file:{reference.as_posix()}?mode=ro", uri=True)
+            try:
+                for table in ("htc", "rate"):
+                    try:
+                        had_rows = ref.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+                    except sqlite3.OperationalError:
+                        continue
+                    if had_rows and con.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is None:
+                        problems.append(f"table {table} is empty")
+            finally:
+                ref.close()
+    finally:
+        con.close()
+    if problems:
+        raise ShadowValidationError(f"{path}: " + "; ".join(problems[:5]))
+
+
+def swap_database(shadow: Path, live: Path) -> None:
+    """Replace the contents of `live` with `shadow` in one transaction.
+
+    Renaming a file under open WAL connections would mix the new database with the old
+    one's -wal/-shm files, so the pages are copied with SQLite's online backup instead:
+    a single write transaction on `live`. Readers keep their snapshot until they finish
+    and see the new data on their next transaction. `shadow` is removed afterwards.
+
+    With settings.immutable the file is renamed over `live`: immutable readers take no
+    locks (an in-place copy could tear their reads) and use no -wal/-shm, so they keep
+    reading the old inode until the API reloads its engine.
+    """
+    if settings.immutable or not live.exists():
+        os.replace(shadow, live)
+        return
+    src = sqlite3.connect(shadow)
+    dst = sqlite3.connect(live, timeout=60)
+    try:
+        src.backup(dst)
+        try:
+            # Shrink the WAL the copy went through, without waiting on readers still on the
+            # old snapshot (then the regular auto-checkpoints finish the job)
+            dst.execute("PRAGMA busy_timeout=0")
+            dst.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except sqlite3.Error:
+            pass
+    finally:
+        dst.close()
+        src.close()
+    shadow.unlink(missing_ok=True)
+
+
+@contextmanager
+def shadow_session(drop_indexes: bool = False) -> Iterator[Session]:
+    """Session writing into a copy of the database, swapped in when the block succeeds.
+
+    The copy (`<db>.shadow`) is made with VACUUM INTO, loaded with the bulk pragmas
+    (and without BULK_DROP_INDEXES if `drop_indexes`), committed, validated and then
+    copied over the live file with swap_database(). On error or failed validation the
+    live database is untouched. Writes to the live database made meanwhile are lost, so
+    run one writer at a time. Other databases get a regular session.
+    """
+    if not settings.database_url.startswith("sqlite"):
+        with bulk_session() if drop_indexes else _plain_session() as db:
+            yield db
+        return
+
+    from . import models  # noqa: F401
+
+    live = _sqlite_path(settings.database_url)
+    shadow = live.with_name(live.name + ".shadow")
+    shadow.unlink(missing_ok=True)
+    if live.exists():
+        src = sqlite3.connect(live)
+        try:
+            src.execute("VACUUM INTO ?", (str(shadow),))
+        finally:
+            src.close()
+    # The one connection may be handed between threads (refresh-all stages run one at a time)
+    shadow_engine = create_engine(
+        f"sqlite:///{shadow.as_posix()}",
+        future=True,
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    event.listen(shadow_engine, "connect", _set_bulk_pragmas)
+    dropped = [
+        index
+        for table in Base.metadata.sorted_tables
+        for index in table.indexes
+        if drop_indexes and index.name in BULK_DROP_INDEXES
+    ]
+    try:
+        init_db(shadow_engine)
+        db = Session(bind=shadow_engine, autoflush=False, future=True)
+        try:
+            conn = db.connection()
+            for index in dropped:
+                conn.execute(DropIndex(index, if_exists=True))
+            db.commit()
+            yield db
+            db.commit()
+            conn = db.connection()
+            for index in dropped:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            conn.execute(text("ANALYZE"))
+            conn.execute(text("PRAGMA optimize"))
+            db.commit()
+        finally:
+            db.close()
+            shadow_engine.dispose()
+        validate_database(shadow, live)
+        swap_database(shadow, live)
+    finally:
+        shadow.unlink(missing_ok=True)
+
+
+@contextmanager
+def _plain_session() -> Iterator[Session]:
+    init_db()
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _set_read_only_pragmas(dbapi_connection, connection_record):
+    try:
+        cur = dbapi_connection.cursor()
+        # On top of mode=ro: refuse writes at the SQL level too
+        cur.execute("PRAGMA query_only=ON;")
+        cur.execute("PRAGMA temp_store=MEMORY;")
+        cur.execute("PRAGMA mmap_size=268435456;")
+        cur.execute("PRAGMA cache_size=-20000;")
+        cur.close()
+    except Exception:
+        pass
+
+
+def read_only_engine(url: str | None = None):
+    """Pooled engine opening the SQLite file of `url` as `file:...?mode=ro&immutable=1`.
+
+    Immutable connections skip file locking and change detection entirely, so the file
+    must not be modified while served: imports swap in a new file (see swap_database)
+    and the API reloads its engine.
+    """
+    path = _sqlite_path(url or settings.database_url).resolve()
+    uri = f"file:{quote(path.as_posix())}?mode=ro&immutable=1"
+    ro = create_engine(
+        "sqlite://",
+        future=True,
+        poolclass=QueuePool,
+        creator=lambda: sqlite3.connect(uri, uri=True, check_same_thread=False),
+    )
+    event.listen(ro, "connect", _set_read_only_pragmas)
+    return ro
+
+
+def use_read_only_engine() -> None:
+    """Bind SessionLocal to read_only_engine() (API serving mode, SQLite only)."""
+    if settings.database_url.startswith("sqlite"):
+        SessionLocal.configure(bind=read_only_engine())
+
+
+def reload_engine() -> None:
+    """Drop the serving engine's pooled connections so new requests reopen the file.
+
+    Idle connections are closed; in-flight requests keep their checked-out connections
+    until they finish.
+    """
+    SessionLocal.kw["bind"].dispose()
+
+
 # Dependency
 
 def get_db():
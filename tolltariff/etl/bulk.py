@@ -0,0 +1,56 @@
+from __future__ import annotations
+from itertools import islice
+from typing import Any, Iterable, Iterator, NamedTuple
+
+from sqlalchemy import Table, insert
+from sqlalchemy.orm import Session
+
+# Rows per executemany() round-trip
+BATCH_SIZE = 5000
+
+
+class UpsertCounts(NamedTuple):
+    inserted: int
+    updated: int
+    unchanged: int
+
+
+def chunked(items: Iterable[Any], size: int = BATCH_SIZE) -> Iterator[list[Any]]:
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_ignore(db: Session, table: Table):
+    """INSERT that silently skips rows colliding with a unique index.
+
+    Uses ON CONFLICT DO NOTHING on SQLite/Postgres; other dialects get a plain INSERT
+    and rely on the caller having deduplicated in memory.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        return pg_insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+def bulk_insert(db: Session, table: Table, rows: Iterable[dict[str, Any]], size: int = BATCH_SIZE) -> int:
+    """Insert `rows` in batched executemany() calls, ignoring natural-key conflicts.
+
+    Returns the number of rows actually inserted (conflicting ones are not counted).
+    """
+    stmt = insert_ignore(db, table)
+    n = 0
+    for batch in chunked(rows, size):
+        count = db.execute(stmt, batch).rowcount
+        # Drivers that cannot report it give -1
+        n += count if count >= 0 else len(batch)
+    return n
@@ -0,0 +1,30 @@
+from __future__ import annotations
+from sqlalchemy.orm import Session
+
+from ..models import ImportCheckpoint
+
+# Commodities processed between two commits of a long-running import
+COMMIT_EVERY = 1000
+
+
+class Checkpoint:
+    """Persisted resume position of an import, written in the same transaction as each chunk.
+
+    `start` is the number of leading commodities to skip: the stored position when
+    resuming the same file (same sha256), otherwise 0.
+    """
+
+    def __init__(self, db: Session, source: str, file_sha256: str, resume: bool = False) -> None:
+        self.db = db
+        self.source = source
+        self.file_sha256 = file_sha256
+        row = db.get(ImportCheckpoint, source)
+        self.start = row.position if resume and row is not None and row.file_sha256 == file_sha256 else 0
+
+    def advance(self, position: int) -> None:
+        self.db.merge(ImportCheckpoint(source=self.source, file_sha256=self.file_sha256, position=position))
+
+    def clear(self) -> None:
+        row = self.db.get(ImportCheckpoint, self.source)
+        if row is not None:
+            self.db.delete(row)
@@ -0,0 +1,187 @@
+from __future__ import annotations
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional
+
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+from ..data.countries import get_country_name
+from ..data.landgroups import get_landgroup_memberships, get_landgroup_name, landgroup_codes
+from ..models import HTC, Rate
+from .telemetry import Telemetry, telemetry_or_null
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:  # optional: pip install pyarrow
+    pa = None  # type: ignore[assignment]
+
+FORMATS = ("arrow", "parquet")
+# Rows per record batch: bounds memory to one batch of Python rows plus its Arrow copy
+BATCH_ROWS = 16_384
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("Columnar export needs pyarrow (pip install pyarrow)")
+
+
+class _Dictionary:
+    """A fixed dictionary for one column, shared by every batch of the file.
+
+    Values are known up front (SELECT DISTINCT on the column), so all batches reference
+    the same dictionary: the IPC file carries it once and readers see one dictionary.
+    """
+
+    def __init__(self, values: list[Any], value_type) -> None:
+        self.index = {v: i for i, v in enumerate(values)}
+        self.values = pa.array(values, value_type)
+        self.type = pa.dictionary(pa.int32(), value_type)
+
+    def encode(self, column: tuple[Any, ...]):
+        indices = pa.array([None if v is None else self.index[v] for v in column], pa.int32())
+        return pa.DictionaryArray.from_arrays(indices, self.values)
+
+
+def _distinct(db: Session, col) -> list[Any]:
+    return [v for v in db.execute(select(col).distinct().where(col.is_not(None)).order_by(col)).scalars()]
+
+
+def _column_specs(db: Session) -> dict[str, list[tuple[str, Any, Optional[Callable]]]]:
+    """Per table: (column name, Arrow type, encoder or None) in select order."""
+    dicts = {
+        name: _Dictionary(_distinct(db, getattr(Rate, name)), pa.string())
+        for name in ("country_iso", "currency", "unit", "agreement", "source_url")
+    }
+    rate_types = _Dictionary(sorted({rt.value for rt in _distinct(db, Rate.rate_type)}), pa.string())
+    return {
+        "htc": [
+            ("id", pa.int32(), None),
+            ("code", pa.string(), None),
+            ("name", pa.string(), None),
+            ("description", pa.string(), None),
+        ],
+        "rate": [
+            ("id", pa.int64(), None),
+            ("htc_id", pa.int32(), None),
+            ("country_iso", dicts["country_iso"].type, dicts["country_iso"].encode),
+            ("rate_type", rate_types.type, lambda col: rate_types.encode(tuple(v.value for v in col))),
+            ("value", pa.decimal128(18, 6), None),
+            ("currency", dicts["currency"].type, dicts["currency"].encode),
+            ("unit", dicts["unit"].type, dicts["unit"].encode),
+            ("is_exemption", pa.bool_(), None),
+            ("agreement", dicts["agreement"].type, dicts["agreement"].encode),
+            ("conditions", pa.string(), None),
+            ("valid_from", pa.date32(), None),
+            ("valid_to", pa.date32(), None),
+            ("source_url", dicts["source_url"].type, dicts["source_url"].encode),
+            ("priority", pa.int32(), None),
+        ],
+    }
+
+
+def _batches(db: Session, stmt: Select, specs, schema, batch_rows: int, tel: Telemetry) -> Iterator[Any]:
+    result = db.execute(stmt.execution_options(yield_per=batch_rows))
+    for rows in tel.timed(result.partitions(batch_rows), "read"):
+        with tel.phase("parse"):
+            columns = list(zip(*rows))
+            arrays = [
+                enc(col) if enc is not None else pa.array(col, typ)
+                for (_, typ, enc), col in zip(specs, columns)
+            ]
+            batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        tel.add(rows=len(rows))
+        yield batch
+        tel.progress()
+
+
+def _agreement_rows(db: Session) -> list[dict[str, Any]]:
+    """The resolved agreement -> country mapping, one row per membership."""
+    codes = sorted(set(landgroup_codes()) | set(_distinct(db, Rate.agreement)))
+    rows = []
+    for code in codes:
+        name = get_landgroup_name(code)
+        members = get_landgroup_memberships(code) or [{"iso": None, "from": None, "to": None}]
+        for m in members:
+            rows.append({
+                "agreement": code,
+                "agreement_name": name,
+                "country_iso": m["iso"],
+                "country_name": get_country_name(m["iso"]) if m["iso"] else None,
+                "member_from": date.fromisoformat(m["from"]) if m["from"] else None,
+                "member_to": date.fromisoformat(m["to"]) if m["to"] else None,
+            })
+    return rows
+
+
+def _writer(path: Path, schema, fmt: str):
+    """A writer with write_batch()/close() for `fmt`."""
+    if fmt == "arrow":
+        # IPC file format, uncompressed: readers can pa.memory_map() it without copying
+        return pa_ipc.new_file(str(path), schema)
+    # One row group per batch written
+    return pq.ParquetWriter(str(path), schema)
+
+
+def export_columnar(
+    db: Session,
+    out_dir: Path,
+    fmt: str = "arrow",
+    batch_rows: int = BATCH_ROWS,
+    telemetry: Telemetry | None = None,
+) -> dict[str, int]:
+    """Stream htc, rate and the agreement -> country mapping into Arrow IPC or Parquet files.
+
+    Writes `htc`, `rate` and `agreement_countries` (.arrow or .parquet) under `out_dir`,
+    one record batch (Parquet: row group) per `batch_rows` rows, so memory stays bounded
+    whatever the table size. Low-cardinality text columns of `rate` (agreement,
+    rate_type, country_iso, currency, unit, source_url) are dictionary-encoded.
+    Returns the rows written per file.
+    """
+    _require_pyarrow()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    tel = telemetry_or_null(telemetry, "columnar")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    ext = "arrow" if fmt == "arrow" else "parquet"
+    with tel.phase("lookup"):
+        specs = _column_specs(db)
+    counts: dict[str, int] = {}
+    for name, model in (("htc", HTC), ("rate", Rate)):
+        cols = [getattr(model, col) for col, _, _ in specs[name]]
+        schema = pa.schema([(col, typ) for col, typ, _ in specs[name]])
+        path = out_dir / f"{name}.{ext}"
+        writer = _writer(path, schema, fmt)
+        n = 0
+        try:
+            stmt = select(*cols).order_by(model.id)
+            for batch in _batches(db, stmt, specs[name], schema, batch_rows, tel):
+                with tel.phase("write"):
+                    writer.write_batch(batch)
+                n += batch.num_rows
+        finally:
+            with tel.phase("write"):
+                writer.close()
+        counts[name] = n
+
+    with tel.phase("parse"):
+        mapping = pa.Table.from_pylist(_agreement_rows(db), schema=pa.schema([
+            ("agreement", pa.string()),
+            ("agreement_name", pa.string()),
+            ("country_iso", pa.string()),
+            ("country_name", pa.string()),
+            ("member_from", pa.date32()),
+            ("member_to", pa.date32()),
+        ]))
+    with tel.phase("write"):
+        writer = _writer(out_dir / f"agreement_countries.{ext}", mapping.schema, fmt)
+        try:
+            for batch in mapping.to_batches(batch_rows):
+                writer.write_batch(batch)
+        finally:
+            writer.close()
+    counts["agreement_countries"] = mapping.num_rows
+    tel.add(items=len(counts), rows=mapping.num_rows)
+    return counts
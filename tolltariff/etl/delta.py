@@ -0,0 +1,128 @@
+from __future__ import annotations
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from ..models import ContentHash, DatasetVersion
+from .bulk import bulk_insert, chunked
+
+
+class DeltaCounts(NamedTuple):
+    new: int
+    changed: int
+    skipped: int
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def content_digest(element: Any) -> str:
+    blob = json.dumps(element, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def source_version(meta: dict[str, Any]) -> Optional[str]:
+    """The 'versjon' (Norwegian datasets) or 'version' field collected while streaming a file."""
+    v = meta.get("versjon", meta.get("version"))
+    return None if v is None else str(v)
+
+
+def record_import(db: Session, source: str, file_sha256: str = "", version: Optional[str] = None) -> None:
+    """Add a dataset_version row in the caller's transaction.
+
+    Every import or refresh that commits data changes records one (file_sha256 is empty
+    for runs not driven by a file), once, with its last commit: its id is the data
+    version the API caches are keyed on (api.read_model.data_version).
+    """
+    db.add(DatasetVersion(source=source, file_sha256=file_sha256, version=version))
+
+
+def latest_version(db: Session, source: str) -> Optional[DatasetVersion]:
+    return db.execute(
+        select(DatasetVersion).where(DatasetVersion.source == source).order_by(DatasetVersion.id.desc()).limit(1)
+    ).scalar_one_or_none()
+
+
+class DeltaTracker:
+    """Decide which commodities of a source file need (re)processing.
+
+    Stored digests for `source` are loaded once; `check()` is called per commodity and
+    returns False for content identical to the last import. `save()` persists the new
+    digests and a dataset_version row in the caller's transaction, so hashes only
+    advance together with the rows they describe. With `full=True` every commodity is
+    processed (unchanged ones are then not counted as skipped), and digests are still recorded.
+    `rescan=True` reads a file even if it is identical to the last import, so commodities
+    skipped then (e.g. codes not yet in the structure) get a second chance.
+    """
+
+    def __init__(self, db: Session, source: str, path: Path, full: bool = False, rescan: bool = False) -> None:
+        self.db = db
+        self.source = source
+        self.full = full
+        self.file_sha256 = file_digest(path)
+        last = latest_version(db, source)
+        self.file_unchanged = (
+            not full and not rescan and last is not None and last.file_sha256 == self.file_sha256
+        )
+        self.known: dict[str, str] = dict(
+            db.execute(select(ContentHash.code, ContentHash.digest).where(ContentHash.source == source)).all()
+        )
+        self.pending: dict[str, str] = {}
+        self.new = 0
+        self.changed = 0
+        self.skipped = len(self.known) if self.file_unchanged else 0
+
+    def check(self, code: str, element: Any) -> bool:
+        return self.check_digest(code, content_digest(element))
+
+    def check_digest(self, code: str, digest: str) -> bool:
+        if code in self.pending:
+            # Repeated code within the same file: process again only if the content differs
+            if self.pending[code] == digest:
+                return False
+            self.pending[code] = digest
+            return True
+        old = self.known.get(code)
+        if old == digest:
+            if self.full:
+                return True
+            self.skipped += 1
+            return False
+        if old is None:
+            self.new += 1
+        else:
+            self.changed += 1
+        self.pending[code] = digest
+        return True
+
+    @property
+    def counts(self) -> DeltaCounts:
+        return DeltaCounts(self.new, self.changed, self.skipped)
+
+    def flush(self) -> None:
+        """Persist the digests checked so far (used between chunk commits)."""
+        table = ContentHash.__table__
+        stale = [c for c in self.pending if c in self.known]
+        for batch in chunked(stale):
+            self.db.execute(delete(table).where(table.c.source == self.source, table.c.code.in_(batch)))
+        bulk_insert(
+            self.db,
+            table,
+            ({"source": self.source, "code": c, "digest": d} for c, d in self.pending.items()),
+        )
+        self.known.update(self.pending)
+        self.pending = {}
+
+    def save(self, version: Optional[str] = None) -> None:
+        """Persist remaining digests and record the file as imported."""
+        self.flush()
+        record_import(self.db, self.source, self.file_sha256, version)
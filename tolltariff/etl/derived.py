@@ -0,0 +1,342 @@
+from __future__ import annotations
+import logging
+from datetime import date
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, Optional
+
+from sqlalchemy import Integer, and_, case, cast, delete, func, literal, or_, select
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..models import (
+    HTC,
+    ORDINARY_GROUPS,
+    RATE_TYPE_CODES,
+    VALUE_SCALE,
+    Agreement,
+    AgreementCount,
+    Rate,
+    RateBest,
+    RateCompact,
+)
+from .bulk import bulk_insert, chunked, insert_ignore
+
+# HTC ids per IN (...) list, below SQLite's default bound-parameter limit
+_IDS_PER_QUERY = 900
+
+logger = logging.getLogger(__name__)
+
+
+def date_key(d: Optional[date]) -> int:
+    """yyyymmdd integer of `d`; 0 for an open (NULL) date."""
+    return d.year * 10000 + d.month * 100 + d.day if d else 0
+
+
+def key_date(n: int) -> Optional[date]:
+    return date(n // 10000, n // 100 % 100, n % 100) if n else None
+
+
+def format_value(v: int) -> str:
+    """Fixed-point value as the Numeric(18, 6) string the ORM would give (e.g. '8.720000')."""
+    return format(Decimal(v).scaleb(-6), "f")
+
+
+def agreement_ids(db: Session, codes: Iterable[Optional[str]]) -> dict[str, int]:
+    """Ids of the agreement `codes` in the dimension table, adding missing ones."""
+    wanted = {c for c in codes if c}
+    if not wanted:
+        return {}
+    table = Agreement.__table__
+    ids: dict[str, int] = {}
+    for batch in chunked(sorted(wanted), _IDS_PER_QUERY):
+        ids.update(db.execute(select(table.c.code, table.c.id).where(table.c.code.in_(batch))).all())
+    missing = [{"code": c} for c in sorted(wanted) if c not in ids]
+    if missing:
+        db.execute(insert_ignore(db, table), missing)
+        for batch in chunked([m["code"] for m in missing], _IDS_PER_QUERY):
+            ids.update(db.execute(select(table.c.code, table.c.id).where(table.c.code.in_(batch))).all())
+    return ids
+
+
+def _rate_rows(db: Session, htc_ids: Optional[list[int]]) -> Iterator[tuple]:
+    t = Rate.__table__
+    # Scale in SQL so no Decimal is materialised per row
+    stmt = select(
+        t.c.htc_id,
+        t.c.agreement,
+        t.c.rate_type,
+        t.c.country_iso,
+        t.c.valid_from,
+        t.c.valid_to,
+        cast(func.round(t.c.value * VALUE_SCALE), Integer),
+        t.c.is_exemption,
+        t.c.currency,
+        t.c.unit,
+        t.c.id,
+    )
+    if htc_ids is None:
+        yield from db.execute(stmt.execution_options(yield_per=10000))
+        return
+    for batch in chunked(htc_ids, _IDS_PER_QUERY):
+        yield from db.execute(stmt.where(t.c.htc_id.in_(batch)))
+
+
+def _compact(rows: Iterable[tuple], ids: dict[str, int]) -> Iterator[dict[str, Any]]:
+    for htc_id, agreement, rate_type, country_iso, vf, vt, value, is_exemption, currency, unit, rate_id in rows:
+        yield {
+            "htc_id": htc_id,
+            "agreement_id": ids.get(agreement, 0) if agreement else 0,
+            "rate_type": RATE_TYPE_CODES[rate_type],
+            "country_iso": country_iso,
+            "valid_from": date_key(vf),
+            "valid_to": date_key(vt),
+            "value": value,
+            "is_exemption": bool(is_exemption),
+            "currency": currency,
+            "unit": unit,
+            "rate_id": rate_id,
+        }
+
+
+def _insert_compact_sqlite(db: Session, htc_ids: Optional[list[int]]) -> int:
+    """Set-based INSERT ... SELECT of rate_compact rows; SQLite stores dates as ISO text."""
+    t, a, rc = Rate.__table__, Agreement.__table__, RateCompact.__table__
+
+    def day(col):
+        return func.coalesce(cast(func.replace(col, "-", ""), Integer), 0)
+
+    cols = ["htc_id", "agreement_id", "rate_type", "country_iso", "valid_from", "valid_to", "value",
+            "is_exemption", "currency", "unit", "rate_id"]
+    stmt = (
+        select(
+            t.c.htc_id,
+            func.coalesce(a.c.id, 0),
+            # Enum columns hold the member names
+            case({rt.name: code for rt, code in RATE_TYPE_CODES.items()}, value=t.c.rate_type),
+            t.c.country_iso,
+            day(t.c.valid_from),
+            day(t.c.valid_to),
+            cast(func.round(t.c.value * VALUE_SCALE), Integer),
+            func.coalesce(t.c.is_exemption, literal(False)),
+            t.c.currency,
+            t.c.unit,
+            t.c.id,
+        )
+        .select_from(t)
+        .outerjoin(a, a.c.code == t.c.agreement)
+    )
+    ins = insert_ignore(db, rc)
+    if htc_ids is None:
+        return db.execute(ins.from_select(cols, stmt)).rowcount
+    n = 0
+    for batch in chunked(htc_ids, _IDS_PER_QUERY):
+        n += db.execute(ins.from_select(cols, stmt.where(t.c.htc_id.in_(batch)))).rowcount
+    return n
+
+
+# rate_best is built last, so rows there mean both derived tables are populated
+_COMPACT_PROBE = select(RateBest.__table__.c.htc_id).limit(1)
+# Databases (by URL) on which rate_compact was seen populated; it then stays in sync
+_compact_seen: set[str] = set()
+
+
+def compact_available(db: Session) -> bool:
+    """True once rate_compact has been built (it is then kept in sync by the importers)."""
+    if not settings.compact_rates:
+        return False
+    url = str(db.get_bind().url)
+    if url in _compact_seen:
+        return True
+    if db.execute(_COMPACT_PROBE).first() is None:
+        return False
+    _compact_seen.add(url)
+    return True
+
+
+def forget_compact() -> None:
+    """Drop the cached compact_available() results (e.g. after swapping the database file)."""
+    _compact_seen.clear()
+
+
+def refresh_compact(db: Session, htc_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild the rate_compact rows of `htc_ids` (all HTCs if None) from `rate`.
+
+    Rates equal on the compact key once scaled (values closer than 1 / VALUE_SCALE) get
+    one row (which one is unspecified); a warning reports how many were collapsed.
+    """
+    table = RateCompact.__table__
+    ids_list = None if htc_ids is None else sorted(set(htc_ids))
+    if ids_list is None:
+        db.execute(delete(table))
+    else:
+        for batch in chunked(ids_list, _IDS_PER_QUERY):
+            db.execute(delete(table).where(table.c.htc_id.in_(batch)))
+    # Agreement codes first (small), then stream the rows
+    codes_stmt = select(Rate.agreement).distinct().where(Rate.agreement.is_not(None))
+    if ids_list is None:
+        codes = db.execute(codes_stmt).scalars()
+    else:
+        codes = [
+            c for batch in chunked(ids_list, _IDS_PER_QUERY)
+            for c in db.execute(codes_stmt.where(Rate.htc_id.in_(batch))).scalars()
+        ]
+    ids = agreement_ids(db, codes)
+    if db.get_bind().dialect.name == "sqlite":
+        n = _insert_compact_sqlite(db, ids_list)
+    else:
+        n = bulk_insert(db, table, _compact(_rate_rows(db, ids_list), ids))
+    count = select(func.count()).select_from(Rate)
+    if ids_list is None:
+        rates = db.execute(count).scalar_one()
+    else:
+        rates = sum(
+            db.execute(count.where(Rate.htc_id.in_(batch))).scalar_one() for batch in chunked(ids_list, _IDS_PER_QUERY)
+        )
+    if n < rates:
+        logger.warning("rate_compact: %d of %d rates collapsed onto an equal compact key", rates - n, rates)
+    return n
+
+
+def refresh_best(db: Session, htc_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild rate_best for `htc_ids` (all if None) from rate_compact with one INSERT ... SELECT.
+
+    Window functions pick, per (htc, agreement, rate_type), the lowest value (first by rate id
+    on ties) along with the group's first and first-zero rate ids.
+    """
+    rc, a, rb = RateCompact.__table__, Agreement.__table__, RateBest.__table__
+    ids_list = None if htc_ids is None else sorted(set(htc_ids))
+    if ids_list is None:
+        db.execute(delete(rb))
+    else:
+        for batch in chunked(ids_list, _IDS_PER_QUERY):
+            db.execute(delete(rb).where(rb.c.htc_id.in_(batch)))
+
+    group = (rc.c.htc_id, rc.c.agreement_id, rc.c.rate_type)
+    ranked = select(
+        rc.c.htc_id,
+        rc.c.agreement_id,
+        rc.c.rate_type,
+        rc.c.value,
+        rc.c.unit,
+        rc.c.currency,
+        rc.c.rate_id,
+        func.row_number().over(partition_by=group, order_by=(rc.c.value, rc.c.rate_id)).label("rn"),
+        func.min(rc.c.rate_id).over(partition_by=group).label("first_rate_id"),
+        func.min(case((rc.c.value == 0, rc.c.rate_id))).over(partition_by=group).label("zero_rate_id"),
+    )
+    ordinary_ids = select(a.c.id).where(a.c.code.in_(sorted(ORDINARY_GROUPS)))
+    cols = ["htc_id", "agreement_id", "rate_type", "min_value", "is_zero", "is_ordinary", "unit", "currency",
+            "min_rate_id", "first_rate_id", "zero_rate_id"]
+
+    def insert_for(where) -> int:
+        sub = (ranked.where(where) if where is not None else ranked).subquery()
+        stmt = select(
+            sub.c.htc_id,
+            sub.c.agreement_id,
+            sub.c.rate_type,
+            sub.c.value,
+            sub.c.value == 0,
+            or_(sub.c.agreement_id == 0, sub.c.agreement_id.in_(ordinary_ids)),
+            sub.c.unit,
+            sub.c.currency,
+            sub.c.rate_id,
+            sub.c.first_rate_id,
+            sub.c.zero_rate_id,
+        ).where(sub.c.rn == 1)
+        return db.execute(rb.insert().from_select(cols, stmt)).rowcount
+
+    if ids_list is None:
+        return insert_for(None)
+    return sum(insert_for(rc.c.htc_id.in_(batch)) for batch in chunked(ids_list, _IDS_PER_QUERY))
+
+
+def _chapter(code_col):
+    return func.substr(code_col, 1, 2)
+
+
+def _in_chapters(code_col, chapters: Iterable[str]):
+    # Code ranges rather than _chapter(...) IN (...), so the HTC code index can be used
+    return or_(*(and_(code_col >= ch, code_col < ch + "\uffff") for ch in chapters))
+
+
+def refresh_counts(db: Session, htc_ids: Optional[Iterable[int]] = None) -> int:
+    """Recount agreement_count for the chapters of `htc_ids` (all chapters if None).
+
+    Counts come from `rate` itself (rates without an agreement are not counted), so they
+    match the fallback of agreement_counts() even if rate_compact skipped a row (a legacy
+    duplicate without uq_rate_natural). A chapter is recounted as a whole, which is cheap
+    next to the import that changed it and keeps the counts exact without tracking
+    removed rows.
+    """
+    t, a, h, ac = Rate.__table__, Agreement.__table__, HTC.__table__, AgreementCount.__table__
+    stmt = (
+        select(a.c.id, _chapter(h.c.code).label("chapter"), func.count())
+        .select_from(t)
+        .join(h, h.c.id == t.c.htc_id)
+        .join(a, a.c.code == t.c.agreement)
+        .where(t.c.agreement != "")
+        .group_by(a.c.id, _chapter(h.c.code))
+    )
+    cols = ["agreement_id", "chapter", "count"]
+    if htc_ids is None:
+        db.execute(delete(ac))
+        return db.execute(ac.insert().from_select(cols, stmt)).rowcount
+    chapters: set[str] = set()
+    for batch in chunked(sorted(set(htc_ids)), _IDS_PER_QUERY):
+        chapters.update(db.execute(select(_chapter(h.c.code)).distinct().where(h.c.id.in_(batch))).scalars())
+    n = 0
+    for batch in chunked(sorted(chapters), _IDS_PER_QUERY):
+        db.execute(delete(ac).where(ac.c.chapter.in_(batch)))
+        n += db.execute(ac.insert().from_select(cols, stmt.where(_in_chapters(h.c.code, batch)))).rowcount
+    return n
+
+
+def agreement_counts(db: Session) -> dict[str, dict[str, int]]:
+    """Rate rows per agreement code and chapter: {code: {chapter: count}}.
+
+    Read from agreement_count when the derived tables are available, otherwise
+    aggregated from `rate` (a scan of ix_rate_agreement joined to htc).
+    """
+    out: dict[str, dict[str, int]] = {}
+    if compact_available(db):
+        a, ac = Agreement.__table__, AgreementCount.__table__
+        rows = db.execute(
+            select(a.c.code, ac.c.chapter, ac.c.count).join(a, a.c.id == ac.c.agreement_id)
+        ).all()
+        if rows:
+            for code, chapter, count in rows:
+                out.setdefault(code, {})[chapter] = count
+            return out
+    t, h = Rate.__table__, HTC.__table__
+    rows = db.execute(
+        select(t.c.agreement, _chapter(h.c.code), func.count())
+        .join(h, h.c.id == t.c.htc_id)
+        .where(t.c.agreement.is_not(None), t.c.agreement != "")
+        .group_by(t.c.agreement, _chapter(h.c.code))
+    ).all()
+    for code, chapter, count in rows:
+        out.setdefault(code, {})[chapter] = count
+    return out
+
+
+def refresh_derived(db: Session, htc_ids: Optional[Iterable[int]] = None) -> None:
+    """Bring the tables derived from `rate` up to date for `htc_ids` (all if None).
+
+    Importers call this after writing the rates of a chunk, in the same transaction, so
+    derived rows commit (and checkpoint) together with their source rows. The first call
+    on a database without derived rows does a full build.
+    """
+    if not settings.compact_rates:
+        return
+    if htc_ids is not None:
+        htc_ids = set(htc_ids)
+        if not htc_ids:
+            return
+        if db.execute(_COMPACT_PROBE).first() is None:
+            htc_ids = None
+    refresh_compact(db, htc_ids)
+    refresh_best(db, htc_ids)
+    if htc_ids is not None and db.execute(select(AgreementCount.__table__.c.chapter).limit(1)).first() is None:
+        # Counts never built (database from before agreement_count): count everything once
+        htc_ids = None
+    refresh_counts(db, htc_ids)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+import json
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Iterator, Optional, TextIO
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..data.landgroups import get_landgroup_countries
+from ..models import HTC, Rate, RateType
+
+# Rows fetched per round trip by the streaming export
+YIELD_PER = 10_000
+
+_COMPACT = {"ensure_ascii": False, "separators": (",", ":")}
+
+
+def iter_best_zero(db: Session) -> Iterator[tuple[str, list[dict[str, str]]]]:
+    """(HTC code, countries) for each HTC with a zero (non-percent) agreement rate, by code.
+
+    One ordered query over rate joined to htc, streamed with yield_per; countries of each
+    agreement are resolved once. An HTC's countries are those of its zero-rate agreements
+    in agreement order; agreements without a mapping contribute nothing.
+    """
+    stmt = (
+        select(HTC.code, Rate.agreement)
+        .join(Rate, Rate.htc_id == HTC.id)
+        .where(Rate.rate_type != RateType.PERCENT, Rate.value == 0, Rate.agreement.is_not(None), Rate.agreement != "")
+        .distinct()
+        .order_by(HTC.code, Rate.agreement)
+        .execution_options(yield_per=YIELD_PER)
+    )
+    countries: dict[str, list[dict[str, str]]] = {}
+    for code, rows in groupby(db.execute(stmt), key=lambda r: r[0]):
+        out: list[dict[str, str]] = []
+        for _, agreement in rows:
+            if agreement not in countries:
+                countries[agreement] = get_landgroup_countries(agreement)
+            out.extend(countries[agreement])
+        if out:
+            yield code, out
+
+
+def _write_entry(f: TextIO, first: bool, code: str, countries: list[dict[str, Any]]) -> None:
+    f.write("{" if first else ",")
+    f.write(json.dumps(code))
+    f.write(":")
+    f.write(json.dumps({"countries": countries}, **_COMPACT))
+
+
+class _ChapterFiles:
+    """Writes chapter files (`<out_dir>/01.json` ...) one at a time from entries sorted by code."""
+
+    def __init__(self, out_dir: Path) -> None:
+        self.out_dir = out_dir
+        self.written: set[str] = set()
+        self._chapter: Optional[str] = None
+        self._file: Optional[TextIO] = None
+        self._tmp: Optional[Path] = None
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+    def add(self, code: str, countries: list[dict[str, Any]]) -> None:
+        chapter = code[:2]
+        first = chapter != self._chapter
+        if first:
+            self._close()
+            self._chapter = chapter
+            self._tmp = self.out_dir / f"{chapter}.json.tmp"
+            self._file = self._tmp.open("w", encoding="utf-8")
+        _write_entry(self._file, first, code, countries)
+
+    def _close(self) -> None:
+        if self._file is None:
+            return
+        self._file.write("}")
+        self._file.close()
+        self._tmp.replace(self.out_dir / f"{self._chapter}.json")
+        self.written.add(self._chapter)
+        self._file = None
+
+    def finish(self) -> None:
+        self._close()
+        # Chapters left over from an earlier export no longer have zero-rate HTCs
+        for stale in self.out_dir.glob("[0-9][0-9].json"):
+            if stale.stem not in self.written:
+                stale.unlink()
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._tmp.unlink()
+            self._file = None
+
+
+def export_best_zero(db: Session, out: Optional[Path] = None, chapters_dir: Optional[Path] = None) -> int:
+    """Write, per HTC, the countries with a zero (non-percent) agreement rate.
+
+    `out` gets one JSON object keyed by HTC code; `chapters_dir` gets the frontend layout,
+    one object per chapter (`01.json` ...). Both are written compactly while the rows
+    stream in (see iter_best_zero), in a single pass. Returns the number of HTCs written.
+    """
+    f: Optional[TextIO] = None
+    chapters = _ChapterFiles(chapters_dir) if chapters_dir is not None else None
+    tmp = out.with_name(out.name + ".tmp") if out is not None else None
+    n = 0
+    try:
+        if tmp is not None:
+            f = tmp.open("w", encoding="utf-8")
+        for code, countries in iter_best_zero(db):
+            if f is not None:
+                _write_entry(f, n == 0, code, countries)
+            if chapters is not None:
+                chapters.add(code, countries)
+            n += 1
+        if f is not None:
+            f.write("}" if n else "{}")
+            f.close()
+            tmp.replace(out)
+        if chapters is not None:
+            chapters.finish()
+    except BaseException:
+        if f is not None and not f.closed:
+            f.close()
+            tmp.unlink()
+        if chapters is not None:
+            chapters.abort()
+        raise
+    return n
@@ -3,12 +3,13 @@ import json
 from pathlib import Path
 from typing import Any
 
-from .opendata import fetch_fta_json
+from ..data.fta_index import INDEX_PATH
+from .jsonstream import iter_json_array
+from .opendata import local_or_fetch
+from .telemetry import Telemetry, telemetry_or_null
 
-INDEX_PATH = Path("data/ratetradeagreements_index.json")
 
-
-def import_fta(path: Path | None = None) -> Path:
+def import_fta(path: Path | None = None, telemetry: Telemetry | None = None) -> Path:
     """Import ratetradeagreements.json and write an index per HTC:
     {
       "<htc>": {
@@ -17,24 +18,34 @@ def import_fta(path: Path | None = None) -> Path:
       }
     }
     """
+    tel = telemetry_or_null(telemetry, "fta")
     if path is None:
-        path = fetch_fta_json()
-    data = json.loads(path.read_text(encoding="utf-8"))
-    commodities = data.get("commodities", [])
+        with tel.phase("read"):
+            path = local_or_fetch("fta")
+    commodities = tel.timed(iter_json_array(path, ("commodities",)), "read")
     out: dict[str, dict[str, list[str]]] = {}
-    for row in commodities:
-        code = str(row.get("id") or "").strip()
-        if not code:
-            continue
-        acc: dict[str, list[str]] = out.setdefault(code, {})
-        for r in row.get("rateTradeAgreements", []):
-            classifier = (r.get("customDuty", {}) or {}).get("classifier") or ""
-            landCodes = r.get("landCodes") or []
-            if not classifier or not isinstance(landCodes, list):
+    # Exclusive timing: time spent reading the next element is charged to "read"
+    with tel.phase("parse"):
+        for row in commodities:
+            code = str(row.get("id") or "").strip()
+            if not code:
                 continue
-            acc.setdefault(classifier, [])
-            for lc in landCodes:
-                if lc and lc not in acc[classifier]:
-                    acc[classifier].append(lc)
-    INDEX_PATH.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+            tel.add(items=1)
+            tel.progress()
+            acc: dict[str, list[str]] = out.setdefault(code, {})
+            for r in row.get("rateTradeAgreements", []):
+                classifier = (r.get("customDuty", {}) or {}).get("classifier") or ""
+                landCodes = r.get("landCodes") or []
+                if not classifier or not isinstance(landCodes, list):
+                    continue
+                acc.setdefault(classifier, [])
+                for lc in landCodes:
+                    if lc and lc not in acc[classifier]:
+                        acc[classifier].append(lc)
+                        tel.add(rows=1)
+    with tel.phase("write"):
+        # Renamed into place: the API reloads the index when the file changes
+        tmp = INDEX_PATH.with_name(INDEX_PATH.name + ".tmp")
+        tmp.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(INDEX_PATH)
     return INDEX_PATH
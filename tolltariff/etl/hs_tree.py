@@ -0,0 +1,109 @@
+from __future__ import annotations
+from typing import Any, Iterable, Iterator, NamedTuple
+
+# Keys holding child nodes in customstariffstructure.json (a node uses one of them)
+CHILD_KEYS = ("sections", "chapters", "subchapters", "headings", "divisions", "subsubheadings")
+
+# Separator of the materialised path; "0" is the next character, so a subtree of `p`
+# is the range [p + "/", p + "0") on an index over the path
+PATH_SEP = "/"
+PATH_SEP_NEXT = chr(ord(PATH_SEP) + 1)
+
+
+class HsNode(NamedTuple):
+    path: str  # codes from the section down, e.g. "01/01/0101/01012/01012100"
+    depth: int  # 0 = section
+    kind: str  # section | chapter | subchapter | heading | subsubheading | commodity
+    code: str  # `id`, else `hsNumber`
+    description: str  # `item` for commodities
+
+
+def subtree_bounds(path: str) -> tuple[str, str]:
+    """Half-open range of the paths strictly below `path`."""
+    return path + PATH_SEP, path + PATH_SEP_NEXT
+
+
+def node_code(node: dict[str, Any]) -> str:
+    return str(node.get("id") or node.get("hsNumber") or "").strip()
+
+
+def walk_structure(roots: Any, parent: str = "", depth: int = 0) -> Iterator[HsNode]:
+    """All nodes under `roots` (a node or a list of nodes) in document (pre-)order.
+
+    Iterative, with an explicit stack, so deep or malformed trees cannot exhaust the
+    recursion limit. `parent`/`depth` place the roots in a larger tree (e.g. chapters
+    walked on their own under their section's path). Non-dict entries are ignored.
+    """
+    stack: list[tuple[str, int, Any, str]] = [(parent, depth, roots, "")]
+    while stack:
+        parent, depth, node, segment = stack.pop()
+        if isinstance(node, list):
+            stack.extend(reversed(list(_siblings(parent, depth, node))))
+            continue
+        if not isinstance(node, dict):
+            continue
+        kind = str(node.get("type") or "")
+        code = node_code(node)
+        segment = segment or code or "#0"
+        path = f"{parent}{PATH_SEP}{segment}" if parent else segment
+        description = (node.get("item") if kind == "commodity" else None) or node.get("description") or ""
+        yield HsNode(path, depth, kind, code, description.strip())
+        children = [node[key] for key in CHILD_KEYS if node.get(key) is not None]
+        stack.extend((path, depth + 1, child, "") for child in reversed(children))
+
+
+def _siblings(parent: str, depth: int, nodes: list[Any]) -> Iterator[tuple[str, int, Any, str]]:
+    # Path segments are unique among siblings: subsubheadings without an hsNumber, or
+    # repeating their parent's, get their position appended
+    used: set[str] = set()
+    for i, node in enumerate(nodes):
+        segment = node_code(node) if isinstance(node, dict) else ""
+        if not segment or segment in used:
+            segment = f"{segment}#{i}"
+        used.add(segment)
+        yield parent, depth, node, segment
+
+
+def iter_commodities(roots: Any) -> Iterator[tuple[str, str]]:
+    """(code, name) of the commodities under `roots`, in document order.
+
+    The commodity definition shared by the structure import, etl.structure and
+    scripts/build_static_data.py: every node of type commodity with a code, under any of
+    CHILD_KEYS (including subsubheadings), named by its `item`, else its `description`.
+    """
+    for n in walk_structure(roots):
+        if n.kind == "commodity" and n.code:
+            yield n.code, n.description
+
+
+class Chapter(NamedTuple):
+    node: Any  # the chapter's JSON node
+    section: HsNode | None
+    first: bool  # first chapter of `section`
+
+
+def iter_chapters(sections: Iterable[Any]) -> Iterator[Chapter]:
+    """The chapters of `sections`, so they can be walked separately (in parallel).
+
+    A section without chapters is yielded as its own chapter, with no section node.
+    """
+    for sec in sections:
+        if not isinstance(sec, dict):
+            continue
+        if not sec.get("chapters"):
+            yield Chapter(sec, None, False)
+            continue
+        section = next(walk_structure({k: v for k, v in sec.items() if k not in CHILD_KEYS}))
+        for i, chapter in enumerate(sec["chapters"]):
+            yield Chapter(chapter, section, i == 0)
+
+
+def walk_chapters(chapters: Iterable[Chapter]) -> Iterator[HsNode]:
+    """Nodes of `chapters` under their sections, each section ahead of its first chapter."""
+    for ch in chapters:
+        if ch.section is None:
+            yield from walk_structure(ch.node)
+            continue
+        if ch.first:
+            yield ch.section
+        yield from walk_structure(ch.node, ch.section.path, ch.section.depth + 1)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, TextIO
+
+# Characters read from the file per refill; the buffer never holds much more than
+# one array element plus one chunk.
+CHUNK_SIZE = 1 << 16
+
+_WS = " \t\r\n"
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    def __init__(self, fp: TextIO, chunk_size: int = CHUNK_SIZE) -> None:
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size: int | None = None) -> bool:
+        if self.eof:
+            return False
+        if self.pos:
+            # Drop consumed text so the buffer stays bounded
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.fp.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON stream, got {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self) -> Any:
+        self.peek()
+        grow = self.chunk_size
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill(grow):
+                    raise
+                # Read progressively larger chunks for large elements to avoid re-parsing quadratically
+                grow *= 2
+                continue
+            # A number/literal ending exactly at the buffer edge may be truncated
+            if end == len(self.buf) and not self.eof and self._fill(grow):
+                continue
+            self.pos = end
+            return obj
+
+
+def _iter_array(r: _Reader) -> Iterator[Any]:
+    r.expect("[")
+    if r.peek() == "]":
+        r.pos += 1
+        return
+    while True:
+        yield r.value()
+        if r.expect(",]") == "]":
+            return
+
+
+def iter_json_array(
+    source: Path | TextIO,
+    keys: Optional[Iterable[str]] = None,
+    meta: Optional[dict[str, Any]] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one at a time, in constant memory.
+
+    `keys` selects the member of the top-level object to stream (the first array whose
+    key is in `keys`; any array if None). A top-level array is streamed directly.
+    Scalar top-level members (e.g. "versjon"/"version") are stored in `meta` as they are
+    encountered; other members are parsed and discarded.
+    """
+    if isinstance(source, Path):
+        with source.open("r", encoding="utf-8") as fp:
+            yield from iter_json_array(fp, keys, meta, chunk_size)
+        return
+
+    wanted = set(keys) if keys is not None else None
+    r = _Reader(source, chunk_size)
+    if r.peek() == "[":
+        yield from _iter_array(r)
+        return
+    r.expect("{")
+    if r.peek() == "}":
+        return
+    streamed = False
+    while True:
+        key = r.value()
+        r.expect(":")
+        if not streamed and r.peek() == "[" and (wanted is None or key in wanted):
+            streamed = True
+            yield from _iter_array(r)
+        elif r.peek() == "[":
+            # Skip other arrays element by element rather than materialising them
+            for _ in _iter_array(r):
+                pass
+        else:
+            v = r.value()
+            if meta is not None and not isinstance(v, (dict, list)):
+                meta[key] = v
+        if r.expect(",}") == "}":
+            return
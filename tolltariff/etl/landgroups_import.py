@@ -1,11 +1,15 @@
 from __future__ import annotations
 import json
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
-from .opendata import RAW_DIR, fetch_landgroups_json, fetch_members_json, fetch_fta_json
+from .jsonstream import iter_json_array
+from .opendata import local_or_fetch
+from .telemetry import Telemetry, telemetry_or_null
 
 MAP_PATH = Path("data/landgroups_map.json")
+# Generated membership intervals, kept out of the map (see import_landgroups_json)
+MEMBERSHIPS_PATH = Path("data/landgroup_memberships.json")
 
 
 def _normalize_group_name(name: str | None) -> str | None:
@@ -14,39 +18,44 @@ def _normalize_group_name(name: str | None) -> str | None:
     return name.strip()
 
 
-def import_landgroups_json(path: Path | None = None) -> Path:
+def _date_or_none(value: Any) -> str | None:
+    """ISO date of a fomdato/tomdato field; empty means open-ended."""
+    text = str(value or "").strip()
+    return text[:10] or None
+
+
+def _iter_rows(path: Path, candidates: tuple[str, ...]) -> Iterator[Any]:
+    """Stream the first array under one of `candidates`, else the first array in the file."""
+    found = False
+    for row in iter_json_array(path, candidates):
+        found = True
+        yield row
+    if not found:
+        yield from iter_json_array(path)
+
+
+def import_landgroups_json(path: Path | None = None, telemetry: Telemetry | None = None) -> Path:
     """Import landgruppe -> countries mapping from official JSON and write a local map file.
 
-    Output schema:
+    `countries` lists every member regardless of dates. Output schema:
       {
         "groups": {
-          "<code>": {
-            "name": "<human name>",
-            "countries": ["ISO2", ...]
-          },
+          "<code>": {"name": "<human name>", "countries": ["ISO2", ...]},
           ...
         }
       }
+    The fomdato/tomdato interval of each membership from medlemsland.json (open ends are
+    null), used for as-of-date lookups, goes to MEMBERSHIPS_PATH, one group per line:
+      {"memberships": {"<code>": [{"iso": "ISO2", "from": "YYYY-MM-DD" | null, "to": ... | null}, ...], ...}}
     """
+    tel = telemetry_or_null(telemetry, "landgroups")
     if path is None:
-        path = fetch_landgroups_json()
-    data = json.loads(path.read_text(encoding="utf-8"))
+        with tel.phase("read"):
+            path = local_or_fetch("landgroups")
     # Expected structure: object with key 'landgrupper' or similar
     groups: dict[str, dict[str, Any]] = {}
-    # Probe possible keys
-    candidates = ["landgrupper", "groups", "data"]
-    seq: list[Any] = []
-    for k in candidates:
-        v = data.get(k)
-        if isinstance(v, list):
-            seq = v
-            break
-    if not seq and isinstance(data, dict):
-        # Some datasets may have flat dict with 'grupper'
-        for k, v in data.items():
-            if isinstance(v, list):
-                seq = v
-                break
+    # Probe possible keys; some datasets may have a flat dict with 'grupper'
+    seq = tel.timed(_iter_rows(path, ("landgrupper", "groups", "data")), "read")
     # Parse entries
     for row in seq:
         code = (row.get("landgruppekode") or row.get("kode") or row.get("landgruppe") or row.get("id") or "").strip()
@@ -62,53 +71,51 @@ def import_landgroups_json(path: Path | None = None) -> Path:
         elif isinstance(row.get("countries"), list):
             iso_list = [str(x).strip() for x in row["countries"] if x]
         groups[code] = {"name": name, "countries": iso_list}
+        tel.add(items=1)
 
     # Merge in membership: country -> groups
-    members_path = fetch_members_json()
-    members = json.loads(members_path.read_text(encoding="utf-8"))
+    with tel.phase("read"):
+        members_path = local_or_fetch("members")
     # Expect key 'medlemsland' list with 'landkode' and 'landgrupper'
-    mseq = []
-    for k in ("medlemsland", "countries"):
-        v = members.get(k)
-        if isinstance(v, list):
-            mseq = v
-            break
-    # Build reverse mapping: group -> set of ISO2 codes
-    rev: dict[str, set[str]] = {}
+    mseq = tel.timed(iter_json_array(members_path, ("medlemsland", "countries")), "read")
+    # Build reverse mapping: group -> ISO2 code -> membership intervals
+    rev: dict[str, dict[str, list[tuple[str | None, str | None]]]] = {}
     for row in mseq:
         iso = (row.get("landkode") or row.get("iso") or "").strip()
         if not iso:
             continue
         lg = row.get("landgrupper") or row.get("groups") or []
         # landgrupper may be list of codes or list of objects with 'landgruppekode'
-        codes: list[str] = []
+        codes: list[tuple[str, str | None, str | None]] = []
         if isinstance(lg, list):
             for item in lg:
                 if isinstance(item, str):
-                    codes.append(item.strip())
+                    codes.append((item.strip(), None, None))
                 elif isinstance(item, dict):
                     code = (item.get("landgruppekode") or item.get("kode") or "").strip()
                     if code:
-                        codes.append(code)
-        for code in codes:
-            rev.setdefault(code, set()).add(iso)
+                        codes.append((code, _date_or_none(item.get("fomdato")), _date_or_none(item.get("tomdato"))))
+        for code, start, end in codes:
+            rev.setdefault(code, {}).setdefault(iso, []).append((start, end))
+        tel.add(rows=len(codes))
 
     # Merge rev into groups
+    memberships: dict[str, list[dict[str, str | None]]] = {}
     for code, info in groups.items():
-        iso_list = sorted(rev.get(code, set()))
-        info["countries"] = iso_list
+        members = rev.get(code, {})
+        info["countries"] = sorted(members)
+        memberships[code] = [
+            {"iso": iso, "from": start, "to": end}
+            for iso in sorted(members)
+            for start, end in sorted(members[iso], key=lambda se: se[0] or "")
+        ]
 
     # Also integrate FTA dataset to cover bilateral and GSP categories
     try:
-        fta_path = fetch_fta_json()
-        fta = json.loads(fta_path.read_text(encoding="utf-8"))
+        with tel.phase("read"):
+            fta_path = local_or_fetch("fta")
         # Expect keys: 'agreements' or similar; entries with 'agreementcode', 'countries'
-        fseq = []
-        for k in ("agreements", "freeTradeAgreements", "data"):
-            v = fta.get(k)
-            if isinstance(v, list):
-                fseq = v
-                break
+        fseq = tel.timed(iter_json_array(fta_path, ("agreements", "freeTradeAgreements", "data")), "read")
         for row in fseq:
             code = (row.get("agreementcode") or row.get("kode") or row.get("id") or "").strip()
             if not code:
@@ -137,5 +144,11 @@ def import_landgroups_json(path: Path | None = None) -> Path:
         pass
 
     out = {"groups": groups}
-    MAP_PATH.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+    with tel.phase("write"):
+        MAP_PATH.write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
+        lines = ",\n".join(
+            f"  {json.dumps(code)}: {json.dumps(ms, ensure_ascii=False, separators=(',', ':'))}"
+            for code, ms in sorted(memberships.items())
+        )
+        MEMBERSHIPS_PATH.write_text(f'{{"memberships": {{\n{lines}\n}}}}\n', encoding="utf-8")
     return MAP_PATH
@@ -1,7 +1,11 @@
 from __future__ import annotations
+import asyncio
 import json
+import os
+import tempfile
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
 
 import httpx
 from ..config import settings
@@ -41,14 +45,154 @@ FTA_JSON = (
 )
 
 
-def download(url: str, dest: Path) -> Path:
-    with httpx.Client(timeout=60) as client:
-        r = client.get(url)
+# Short names of the open data resources and where they are stored under RAW_DIR
+RESOURCES: dict[str, tuple[str, str]] = {
+    "structure": (CUSTOMS_TARIFF_STRUCTURE_JSON, "customstariffstructure.json"),
+    "import_fees": (IMPORT_FEES_JSON, "innfoerselsavgift.json"),
+    "landgroups": (LANDGROUPS_JSON, "landgruppe.json"),
+    "members": (MEMBERS_JSON, "medlemsland.json"),
+    "fta": (FTA_JSON, "ratetradeagreements.json"),
+}
+
+# Bytes written per streamed chunk
+CHUNK_SIZE = 1 << 16
+TIMEOUT = 60
+
+
+class OfflineError(FileNotFoundError):
+    """Raised in offline mode when a resource has no local copy."""
+
+
+def _meta_path(dest: Path) -> Path:
+    return dest.with_name(dest.name + ".meta.json")
+
+
+def read_meta(dest: Path) -> dict[str, Any]:
+    """Validators (url, etag, last_modified) saved by the last download of `dest`."""
+    try:
+        return json.loads(_meta_path(dest).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+def _write_atomic(dest: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp, dest)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _conditional_headers(url: str, dest: Path) -> dict[str, str]:
+    meta = read_meta(dest)
+    if not dest.exists() or meta.get("url") != url:
+        return {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+async def adownload(client: httpx.AsyncClient, url: str, dest: Path) -> bool:
+    """Download `url` to `dest` unless the server says the local copy is current.
+
+    The body is streamed to a temp file next to `dest` and renamed over it once complete,
+    so readers never see a partial file. The response's ETag/Last-Modified are kept in a
+    `<dest>.meta.json` sidecar and sent back as If-None-Match/If-Modified-Since next time.
+    Returns True if `dest` was (re)written, False on 304 Not Modified.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    async with client.stream("GET", url, headers=_conditional_headers(url, dest)) as r:
+        if r.status_code == 304:
+            return False
         r.raise_for_status()
-        dest.write_bytes(r.content)
+        fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                    fp.write(chunk)
+            os.replace(tmp, dest)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        meta = {
+            "url": url,
+            "etag": r.headers.get("etag"),
+            "last_modified": r.headers.get("last-modified"),
+            "fetched_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+    _write_atomic(_meta_path(dest), json.dumps(meta, indent=2).encode("utf-8"))
+    return True
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=TIMEOUT, follow_redirects=True)
+
+
+def download(url: str, dest: Path, offline: Optional[bool] = None) -> Path:
+    """Fetch `url` into `dest` (conditionally, see `adownload`); offline mode only checks `dest`."""
+    if settings.offline if offline is None else offline:
+        if not dest.exists():
+            raise OfflineError(f"Offline mode and no local copy of {dest}")
+        return dest
+
+    async def run() -> None:
+        async with _client() as client:
+            await adownload(client, url, dest)
+
+    asyncio.run(run())
     return dest
 
 
+def fetch_all(
+    resources: Optional[dict[str, tuple[str, Path]]] = None,
+    offline: Optional[bool] = None,
+) -> dict[str, Path]:
+    """Fetch all open data resources concurrently; returns name -> local path.
+
+    `resources` maps a name to (url, dest) and defaults to RESOURCES under RAW_DIR.
+    In offline mode nothing is requested and every resource must exist locally.
+    """
+    if resources is None:
+        resources = {name: (url, RAW_DIR / filename) for name, (url, filename) in RESOURCES.items()}
+    if settings.offline if offline is None else offline:
+        missing = [str(dest) for _, dest in resources.values() if not dest.exists()]
+        if missing:
+            raise OfflineError(f"Offline mode and no local copy of: {', '.join(missing)}")
+        return {name: dest for name, (_, dest) in resources.items()}
+
+    async def run() -> None:
+        async with _client() as client:
+            await asyncio.gather(*(adownload(client, url, dest) for url, dest in resources.values()))
+
+    asyncio.run(run())
+    return {name: dest for name, (_, dest) in resources.items()}
+
+
+def local_or_fetch(name: str, offline: Optional[bool] = None) -> Path:
+    """Resource `name` under RAW_DIR, revalidated against the server.
+
+    Online, the local copy is kept on 304 Not Modified (see `adownload`) and replaced
+    when the resource changed; if the server cannot be reached (or errors), an existing
+    local copy is used as is. Offline, the local copy must exist.
+    """
+    url, filename = RESOURCES[name]
+    path = RAW_DIR / filename
+    if settings.offline if offline is None else offline:
+        return download(url, path, offline=True)
+    try:
+        return download(url, path, offline=False)
+    except httpx.HTTPError:
+        if path.exists():
+            return path
+        raise
+
+
 def fetch_structure_json(out_path: Optional[Path] = None) -> Path:
     path = out_path or RAW_DIR / "customstariffstructure.json"
     return download(CUSTOMS_TARIFF_STRUCTURE_JSON, path)
@@ -0,0 +1,47 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def chapter_batches(elements: Iterable[T], code_of: Callable[[T], str]) -> Iterator[list[T]]:
+    """Group consecutive elements by HS chapter (first two digits of their code).
+
+    The vendor files are ordered by code, so each chapter normally forms one batch;
+    an unordered file just yields more, smaller batches.
+    """
+    batch: list[T] = []
+    current = None
+    for el in elements:
+        chapter = code_of(el)[:2]
+        if batch and chapter != current:
+            yield batch
+            batch = []
+        current = chapter
+        batch.append(el)
+    if batch:
+        yield batch
+
+
+def map_ordered(fn: Callable[[list[T]], R], batches: Iterable[list[T]], workers: int = 1) -> Iterator[R]:
+    """Apply `fn` to each batch, in a process pool when `workers` > 1.
+
+    Results are yielded in submission order, so the single consumer (the DB writer)
+    sees the same sequence whatever the worker count. At most 2 * workers batches are
+    in flight, keeping memory bounded while the input is streamed.
+    """
+    if workers <= 1:
+        for b in batches:
+            yield fn(b)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for b in batches:
+            pending.append(pool.submit(fn, b))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,242 @@
+from __future__ import annotations
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import AbstractContextManager
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import httpx
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from .delta import DeltaTracker, file_digest
+
+# Per-stage input digests of the file-producing stages, from their last successful run
+STATE_PATH = settings.data_dir / "pipeline_state.json"
+
+
+class SkipStage(Exception):
+    """Raised by a stage that has nothing to do (e.g. an optional input is missing)."""
+
+
+class Stage(NamedTuple):
+    name: str
+    # Called with "did any dependency change?"; returns whether this stage changed anything
+    run: Callable[[bool], bool]
+    deps: tuple[str, ...] = ()
+    # Stages using the database run one at a time (SQLite has a single writer, and a
+    # bulk session locks the file exclusively)
+    uses_db: bool = False
+
+
+class StageResult(NamedTuple):
+    name: str
+    status: str  # changed | unchanged | skipped | failed | blocked
+    seconds: float
+    detail: str = ""
+
+
+def run_stages(
+    stages: Iterable[Stage],
+    workers: int = 4,
+    on_result: Optional[Callable[[StageResult], None]] = None,
+) -> list[StageResult]:
+    """Run `stages` as a dependency graph on a thread pool.
+
+    A stage starts once all its dependencies finished; independent branches run
+    concurrently. A failed stage blocks its dependents, other branches carry on.
+    Results are returned in stage definition order.
+    """
+    stages = list(stages)
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"Stage {s.name} depends on unknown stage(s): {', '.join(missing)}")
+
+    results: dict[str, StageResult] = {}
+    db_lock = threading.Lock()
+
+    def execute(stage: Stage, upstream_changed: bool) -> StageResult:
+        t0 = time.perf_counter()
+        try:
+            if stage.uses_db:
+                with db_lock:
+                    changed = stage.run(upstream_changed)
+            else:
+                changed = stage.run(upstream_changed)
+            status, detail = ("changed" if changed else "unchanged"), ""
+        except SkipStage as e:
+            status, detail = "skipped", str(e)
+        except Exception as e:
+            status, detail = "failed", f"{type(e).__name__}: {e}"
+        return StageResult(stage.name, status, time.perf_counter() - t0, detail)
+
+    def finish(result: StageResult) -> None:
+        results[result.name] = result
+        if on_result is not None:
+            on_result(result)
+
+    pending = {s.name: s for s in stages}
+    running: dict[Future, str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                dep_results = [results.get(d) for d in stage.deps]
+                if any(r is not None and r.status in ("failed", "blocked") for r in dep_results):
+                    del pending[name]
+                    failed = [r.name for r in dep_results if r is not None and r.status in ("failed", "blocked")]
+                    finish(StageResult(name, "blocked", 0.0, f"after {', '.join(failed)}"))
+                    continue
+                if all(r is not None for r in dep_results):
+                    del pending[name]
+                    upstream_changed = any(r.status == "changed" for r in dep_results)
+                    running[pool.submit(execute, stage, upstream_changed)] = name
+            if not running:
+                if pending:
+                    raise ValueError(f"Dependency cycle between stages: {', '.join(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                del running[fut]
+                finish(fut.result())
+    return [results[s.name] for s in stages]
+
+
+def _load_state() -> dict[str, dict[str, str]]:
+    try:
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+
+_state_lock = threading.Lock()
+
+
+def _inputs_unchanged(stage: str, inputs: list[Path], output: Path) -> tuple[bool, dict[str, str]]:
+    digests = {str(p): file_digest(p) for p in inputs if p.exists()}
+    with _state_lock:
+        unchanged = output.exists() and _load_state().get(stage) == digests
+    return unchanged, digests
+
+
+def _save_state(stage: str, digests: dict[str, str]) -> None:
+    with _state_lock:
+        state = _load_state()
+        state[stage] = digests
+        STATE_PATH.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+
+def refresh_stages(
+    session: Callable[[], AbstractContextManager[Session]],
+    workers: int = 1,
+) -> list[Stage]:
+    """The fetch -> import -> export graph behind `refresh-all`.
+
+    Downloads are conditional (and no-ops in offline mode); DB imports skip files already
+    imported (DeltaTracker), file-producing stages skip when their inputs' digests match
+    the last successful run. `session` opens the session each DB stage writes through and
+    `workers` is passed on to the importers' parse pools.
+    """
+    from ..data.landgroups import reload_dynamic_groups
+    from .export import export_best_zero
+    from .fta_import import INDEX_PATH, import_fta
+    from .landgroups_import import MAP_PATH, import_landgroups_json
+    from .opendata import RAW_DIR, RESOURCES, OfflineError, download
+    from .rates_import import import_customs_duty_from_toll, import_default_rates_from_fees
+    from .structure_import import import_structure_json
+
+    def raw(name: str) -> Path:
+        return RAW_DIR / RESOURCES[name][1]
+
+    def fetch(name: str) -> Callable[[bool], bool]:
+        def run(_: bool) -> bool:
+            url, _filename = RESOURCES[name]
+            path = raw(name)
+            before = path.stat().st_mtime_ns if path.exists() else None
+            try:
+                download(url, path)
+            except OfflineError as e:
+                raise SkipStage(str(e))
+            except httpx.HTTPError as e:
+                if before is None:
+                    raise
+                # Offline-first: keep going with the local copy
+                raise SkipStage(f"download failed, using local copy ({type(e).__name__})")
+            return path.stat().st_mtime_ns != before
+
+        return run
+
+    def import_structure(_: bool) -> bool:
+        with session() as db:
+            tracker = DeltaTracker(db, "structure", raw("structure"))
+            import_structure_json(db, raw("structure"), tracker=tracker, workers=workers)
+            return not tracker.file_unchanged
+
+    def rates(source: str, path: Path, importer) -> Callable[[bool], bool]:
+        def run(upstream_changed: bool) -> bool:
+            if not path.exists():
+                raise SkipStage(f"{path} not found")
+            with session() as db:
+                # New HTCs from the structure import may make rows skipped last time importable
+                tracker = DeltaTracker(db, source, path, rescan=upstream_changed)
+                importer(db, path, source_url=str(path), tracker=tracker, workers=workers)
+                return tracker.new > 0 or tracker.changed > 0
+
+        return run
+
+    def import_landgroups(_: bool) -> bool:
+        inputs = [raw("landgroups"), raw("members"), raw("fta")]
+        unchanged, digests = _inputs_unchanged("import-landgroups", inputs, MAP_PATH)
+        if unchanged:
+            return False
+        import_landgroups_json(raw("landgroups"))
+        reload_dynamic_groups()
+        _save_state("import-landgroups", digests)
+        return True
+
+    def import_fta_index(_: bool) -> bool:
+        unchanged, digests = _inputs_unchanged("import-fta", [raw("fta")], INDEX_PATH)
+        if unchanged:
+            return False
+        import_fta(raw("fta"))
+        _save_state("import-fta", digests)
+        return True
+
+    best_zero = Path("data/best_zero_countries.json")
+    # Frontend layout, written in the same pass (build_static_data.py no longer splits it)
+    best_zero_chapters = Path("frontend/data/best_zero")
+
+    def export(upstream_changed: bool) -> bool:
+        if not upstream_changed and best_zero.exists() and best_zero_chapters.exists():
+            return False
+        with session() as db:
+            export_best_zero(db, best_zero, best_zero_chapters)
+        return True
+
+    return [
+        Stage("fetch-structure", fetch("structure")),
+        Stage("fetch-import-fees", fetch("import_fees")),
+        Stage("fetch-landgroups", fetch("landgroups")),
+        Stage("fetch-members", fetch("members")),
+        Stage("fetch-fta", fetch("fta")),
+        Stage("import-structure", import_structure, ("fetch-structure",), uses_db=True),
+        Stage("import-landgroups", import_landgroups, ("fetch-landgroups", "fetch-members", "fetch-fta")),
+        Stage("import-fta", import_fta_index, ("fetch-fta",)),
+        Stage(
+            "import-default-rates",
+            rates("default", raw("import_fees"), import_default_rates_from_fees),
+            ("fetch-import-fees", "import-structure"),
+            uses_db=True,
+        ),
+        Stage(
+            "import-duty-rates",
+            # No open data URL for this file; it is imported when present in data/raw
+            rates("duty", RAW_DIR / "tollavgiftssats.json", import_customs_duty_from_toll),
+            ("import-structure",),
+            uses_db=True,
+        ),
+        Stage("export-best-zero", export, ("import-duty-rates", "import-landgroups"), uses_db=True),
+    ]
@@ -1,13 +1,22 @@
 from __future__ import annotations
-import json
 from datetime import date
 from decimal import Decimal
 from pathlib import Path
-from typing import Optional
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Optional
 
+from sqlalchemy import bindparam, select, update
 from sqlalchemy.orm import Session
 
-from ..models import HTC, Rate, RateType
+from ..models import HTC, ORDINARY_GROUPS, Rate, RateType
+from .bulk import bulk_insert, chunked
+from .checkpoint import COMMIT_EVERY, Checkpoint
+from .delta import DeltaTracker, content_digest, file_digest, record_import, source_version
+from .derived import refresh_derived
+from .jsonstream import iter_json_array
+from .parallel import chapter_batches, map_ordered
+from .telemetry import Telemetry, telemetry_or_null
 
 
 def _parse_decimal_comma(s: str | None) -> Optional[Decimal]:
@@ -25,124 +34,369 @@ def _parse_decimal_comma(s: str | None) -> Optional[Decimal]:
 essential_type = "MV"  # Merverdiavgift (VAT) as default percent rate
 
 
-def import_default_rates_from_fees(db: Session, path: Path, source_url: str | None = None) -> int:
+SENTINEL_VALUE = Decimal("999999.99")
+
+
+def _parse_date(d: str | None) -> Optional[date]:
+    if not d:
+        return None
+    try:
+        y, m, dd = d.split("-")
+        return date(int(y), int(m), int(dd))
+    except Exception:
+        return None
+
+
+def _duty_rates(v: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """Normalise the `avtalesatser` of one `varer` element into rate column dicts (without htc_id)."""
+    for a in v.get("avtalesatser", []):
+        landgruppe = (a.get("landgruppe") or "").strip()
+        is_ordinary = landgruppe in ORDINARY_GROUPS
+        for s in a.get("sats", []):
+            val = _parse_decimal_comma(s.get("satsVerdi"))
+            if val is None:
+                continue
+            # skip sentinel/placeholder extremely large values
+            try:
+                if val >= SENTINEL_VALUE:
+                    continue
+            except Exception:
+                pass
+
+            unit_code = (s.get("satsEnhet") or "").strip()
+            if not unit_code:
+                # missing unit; skip
+                continue
+
+            if unit_code == "P":
+                rate_type = RateType.PERCENT
+                unit = None
+                currency = None
+            elif unit_code == "K":
+                rate_type = RateType.PER_KG
+                unit = "kg"
+                currency = "NOK"
+            else:
+                rate_type = RateType.PER_ITEM
+                unit = None
+                currency = "NOK"
+
+            yield {
+                "country_iso": "*",
+                "rate_type": rate_type,
+                "value": val,
+                "currency": currency,
+                "unit": unit,
+                "is_exemption": False,
+                "agreement": None if is_ordinary else landgruppe,
+                "conditions": None,
+                "valid_from": _parse_date(s.get("fomdato") or None),
+                "valid_to": _parse_date(s.get("tomdato") or None),
+                "priority": 0 if is_ordinary else 10,
+                # landgruppe as published, used to normalise legacy 'TALL'/'TAL' rows
+                "_landgruppe": landgruppe,
+            }
+
+
+def _default_rates(v: dict[str, Any]) -> list[tuple[Decimal, Optional[date], Optional[date]]]:
+    """(value, valid_from, valid_to) of the first percent group of each ALLE/MV entry of one `varer` element."""
+    out = []
+    # expect default group 'ALLE'
+    for lg in v.get("avgiftsatser", []):
+        if lg.get("landgruppe") != "ALLE":
+            continue
+        for t in lg.get("avgiftstyper", []):
+            if t.get("avgiftstype") != essential_type:
+                continue
+            # find percent entry
+            for g in t.get("avgiftsgrupper", []):
+                if g.get("enhet") != "P":
+                    continue
+                val = _parse_decimal_comma(g.get("sats"))
+                if val is None:
+                    continue
+                out.append((val, _parse_date(g.get("fomdato") or None), _parse_date(g.get("tomdato") or None)))
+                break  # only first percent group for MV
+    return out
+
+
+def _code(v: dict[str, Any]) -> str:
+    return str(v.get("id") or "").strip()
+
+
+def _parse_batch(
+    normalise: Callable[[dict[str, Any]], Any],
+    batch: tuple[list[dict[str, Any]], Optional[dict[str, str]]],
+    digests: bool = False,
+) -> list[tuple]:
+    """Worker side of the parallel import: (code, content digest, normalised rows) per element.
+
+    `batch` is (varer, known digests of their codes); elements matching their known digest
+    are not normalised (rows=None). Elements without a code are kept (code '') so
+    positions match the raw `varer` stream.
+    """
+    varer, known = batch
+    out = []
+    for v in varer:
+        code = _code(v)
+        if not code:
+            out.append(("", None, []))
+            continue
+        digest = content_digest(v) if digests else None
+        if known and digest is not None and known.get(code) == digest:
+            out.append((code, digest, None))
+            continue
+        out.append((code, digest, list(normalise(v))))
+    return out
+
+
+def _parsed_varer(
+    varer: Iterable[dict[str, Any]], normalise, workers: int, tracker: DeltaTracker | None
+) -> Iterator[tuple]:
+    parse = partial(_parse_batch, normalise, digests=tracker is not None)
+    batches = chapter_batches(varer, _code)
+    if tracker is not None and not tracker.full:
+        with_known = _with_known(batches, tracker.known)
+    else:
+        with_known = ((b, None) for b in batches)
+    for results in map_ordered(parse, with_known, workers):
+        yield from results
+
+
+def _with_known(
+    batches: Iterable[list[dict[str, Any]]], known: dict[str, str]
+) -> Iterator[tuple[list[dict[str, Any]], dict[str, str]]]:
+    """Pair each batch with the known digests the worker may skip on.
+
+    Codes repeated in the file are always normalised: after a changed copy, a copy equal
+    to the stored digest must be written again (DeltaTracker.check_digest accepts it).
+    """
+    seen: set[str] = set()
+    for batch in batches:
+        repeated: set[str] = set()
+        for code in map(_code, batch):
+            if code in seen:
+                repeated.add(code)
+            seen.add(code)
+        yield batch, {c: known[c] for c in map(_code, batch) if c in known and c not in repeated}
+
+
+def _existing_default_rates(db: Session, htc_ids: set[int]) -> dict[int, dict[str, Any]]:
+    """The first (by id) non-exemption '*' percent rate of each of `htc_ids`: the default rate rows."""
+    existing: dict[int, dict[str, Any]] = {}
+    for ids in chunked(sorted(htc_ids), 900):
+        rows = db.execute(
+            select(Rate.id, Rate.htc_id, Rate.value, Rate.valid_from, Rate.valid_to, Rate.source_url, Rate.agreement)
+            .where(
+                Rate.htc_id.in_(ids),
+                Rate.country_iso == "*",
+                Rate.rate_type == RateType.PERCENT,
+                Rate.is_exemption == False,  # noqa: E712
+            )
+            .order_by(Rate.id)
+        )
+        for rid, htc_id, value, vf, vt, url, agreement in rows:
+            existing.setdefault(
+                htc_id,
+                {"rid": rid, "value": value, "valid_from": vf, "valid_to": vt, "source_url": url, "agreement": agreement},
+            )
+    return existing
+
+
+def import_default_rates_from_fees(
+    db: Session,
+    path: Path,
+    source_url: str | None = None,
+    tracker: DeltaTracker | None = None,
+    workers: int = 1,
+    resume: bool = False,
+    commit_every: int = COMMIT_EVERY,
+    telemetry: Telemetry | None = None,
+) -> int:
     """
     Import a default percent rate per HTC from innfoerselsavgift.json.
     Heuristic: use landgruppe == 'ALLE' and avgiftstype == 'MV' (VAT), enhet == 'P' (percent).
 
     Stores as Rate(country_iso='*', rate_type=percent).
+    With a `tracker`, commodities whose content is unchanged since the last import are skipped.
+    Parsing runs per HS chapter on `workers` processes; this session stays the only writer.
+    Commits every `commit_every` commodities together with a checkpoint; `resume=True`
+    continues an interrupted import of the same file from that checkpoint.
+    Phase timings, counters and progress events are reported to `telemetry`.
     """
-    data = json.loads(path.read_text(encoding="utf-8"))
-    varer = data.get("varer", [])
-    total_varer = len(varer)
-    progress_step = max(1, (total_varer // 20) if total_varer else 1)
-    total_varer = len(varer)
-    # Aim for ~20 progress updates across the dataset
-    progress_step = max(1, total_varer // 20) or 1
+    if tracker is not None and tracker.file_unchanged:
+        return 0
+    tel = telemetry_or_null(telemetry, "default")
+    meta: dict[str, Any] = {}
+    with tel.phase("read"):
+        checkpoint = Checkpoint(db, "default", tracker.file_sha256 if tracker is not None else file_digest(path), resume)
+    varer = tel.timed(islice(iter_json_array(path, ("varer",), meta), checkpoint.start, None), "read")
+    with tel.phase("lookup"):
+        htc_ids: dict[str, int] = dict(db.execute(select(HTC.code, HTC.id)).all())
 
     added = 0
-    ordinary_groups = {"TAL", "TALL", "ALLE"}
     updated = 0
-
-    # Index HTC by exact 8-digit code for quick lookup
-    def get_htc(code: str) -> Optional[HTC]:
-        return db.query(HTC).filter(HTC.code == code).first()
-
-    ordinary_groups = {"TAL", "TALL", "ALLE"}
-
-    for v in varer:
-        code = str(v.get("id") or "").strip()
-        if not code:
-            continue
-        # expect default group 'ALLE'
-        for lg in v.get("avgiftsatser", []):
-            if lg.get("landgruppe") != "ALLE":
+    parsed = enumerate(tel.timed(_parsed_varer(varer, _default_rates, workers, tracker), "parse"), checkpoint.start + 1)
+    for chunk in chunked(parsed, commit_every):
+        wanted: list[tuple[int, list[tuple[Decimal, Optional[date], Optional[date]]]]] = []
+        for _, (code, digest, candidates) in chunk:
+            htc_id = htc_ids.get(code) if code else None
+            if htc_id is None:
+                # Unknown code, skip (no digest recorded, so codes added later are not skipped)
                 continue
-            for t in lg.get("avgiftstyper", []):
-                if t.get("avgiftstype") != essential_type:
+            if tracker is not None and not tracker.check_digest(code, digest):
+                continue
+            tel.add(rows=len(candidates))
+            wanted.append((htc_id, candidates))
+        touched = {htc_id for htc_id, candidates in wanted if candidates}
+        with tel.phase("lookup"):
+            existing = _existing_default_rates(db, touched)
+            keys, _ = _existing_rate_keys(db, touched)
+
+        to_insert: list[dict[str, Any]] = []
+        to_update: dict[int, dict[str, Any]] = {}
+        for htc_id, candidates in wanted:
+            for val, pf, pt in candidates:
+                current = existing.get(htc_id)
+                if current is None:
+                    to_insert.append({
+                        "htc_id": htc_id,
+                        "country_iso": "*",
+                        "rate_type": RateType.PERCENT,
+                        "value": val,
+                        "currency": None,
+                        "unit": None,
+                        "is_exemption": False,
+                        "agreement": None,
+                        "conditions": None,
+                        "valid_from": pf,
+                        "valid_to": pt,
+                        "source_url": source_url,
+                        "priority": 0,
+                    })
                     continue
-                # find percent entry
-                for g in t.get("avgiftsgrupper", []):
-                    if g.get("enhet") != "P":
-                        continue
-                    val = _parse_decimal_comma(g.get("sats"))
-                    if val is None:
+                new = dict(current, value=val, valid_from=pf, valid_to=pt)
+                if source_url:
+                    new["source_url"] = source_url
+                if new != current:
+                    key = _rate_key(htc_id, {**new, "rate_type": RateType.PERCENT}, new["agreement"])
+                    old_key = _rate_key(htc_id, {**current, "rate_type": RateType.PERCENT}, current["agreement"])
+                    if key != old_key and key in keys:
+                        # Another row already holds this rate (uq_rate_natural): keep both as they are
                         continue
-                    vf = g.get("fomdato") or None
-                    vt = g.get("tomdato") or None
-                    # Map to/from date
-                    def parse_d(d: str | None) -> Optional[date]:
-                        if not d:
-                            return None
-                        try:
-                            y, m, dd = d.split("-")
-                        except ValueError:
-                            return None
-                        try:
-                            return date(int(y), int(m), int(dd))
-                        except Exception:
-                            return None
-
-                    htc = get_htc(code)
-                    if not htc:
-                        # Unknown code, skip
-                        break
-                    existing = (
-                        db.query(Rate)
-                        .filter(
-                            Rate.htc_id == htc.id,
-                            Rate.country_iso == "*",
-                            Rate.rate_type == RateType.PERCENT,
-                            Rate.is_exemption == False,
-                        )
-                        .first()
+                    keys.discard(old_key)
+                    keys.add(key)
+                    existing[htc_id] = new
+                    to_update[new["rid"]] = new
+                    updated += 1
+
+        with tel.phase("write"):
+            if to_update:
+                stmt = (
+                    update(Rate.__table__)
+                    .where(Rate.__table__.c.id == bindparam("rid"))
+                    .values(
+                        value=bindparam("value"),
+                        valid_from=bindparam("valid_from"),
+                        valid_to=bindparam("valid_to"),
+                        source_url=bindparam("source_url"),
                     )
-                    if existing:
-                        # update if different
-                        changed = False
-                        if existing.value != val:
-                            existing.value = val
-                            changed = True
-                        pf = parse_d(vf)
-                        pt = parse_d(vt)
-                        if existing.valid_from != pf:
-                            existing.valid_from = pf
-                            changed = True
-                        if existing.valid_to != pt:
-                            existing.valid_to = pt
-                            changed = True
-                        if source_url and existing.source_url != source_url:
-                            existing.source_url = source_url
-                            changed = True
-                        if changed:
-                            updated += 1
-                    else:
-                        db.add(
-                            Rate(
-                                htc_id=htc.id,
-                                country_iso="*",
-                                rate_type=RateType.PERCENT,
-                                value=val,
-                                currency=None,
-                                unit=None,
-                                is_exemption=False,
-                                agreement=None,
-                                conditions=None,
-                                valid_from=parse_d(vf),
-                                valid_to=parse_d(vt),
-                                source_url=source_url,
-                                priority=0,
-                            )
-                        )
-                        added += 1
-                    break  # only first percent group for MV
-            # landgruppe loop
-    if added or updated:
+                )
+                for batch in chunked(to_update.values()):
+                    db.execute(stmt, batch)
+            added += bulk_insert(db, Rate.__table__, to_insert)
+        with tel.phase("write"):
+            refresh_derived(db, touched)
+            if tracker is not None:
+                tracker.flush()
+            checkpoint.advance(chunk[-1][0])
+        with tel.phase("commit"):
+            db.commit()
+        tel.add(items=len(chunk))
+        tel.progress()
+    with tel.phase("commit"):
+        if tracker is not None:
+            tracker.save(source_version(meta))
+        else:
+            record_import(db, "default", checkpoint.file_sha256, source_version(meta))
+        checkpoint.clear()
         db.commit()
     return added
 
 
-def import_customs_duty_from_toll(db: Session, path: Path, source_url: str | None = None) -> int:
+def _rate_key(htc_id: int, row: dict[str, Any], agreement: str | None) -> tuple:
+    # Mirrors the uq_rate_natural index (country_iso is always '*' for duty rates)
+    return (htc_id, row["rate_type"], row["value"], row["valid_from"], row["valid_to"], agreement)
+
+
+def _existing_rate_keys(db: Session, htc_ids: set[int]) -> tuple[set[tuple], dict[tuple, int]]:
+    """Natural keys of stored '*' rates for `htc_ids`.
+
+    Ordinary rows previously stored under their landgruppe (e.g. 'TALL') are also
+    returned by id so they can be normalised to agreement=None.
+    """
+    existing: set[tuple] = set()
+    grouped_ordinary: dict[tuple, int] = {}
+    for ids in chunked(sorted(htc_ids), 900):
+        rows = db.execute(
+            select(Rate.id, Rate.htc_id, Rate.rate_type, Rate.value, Rate.valid_from, Rate.valid_to, Rate.agreement)
+            .where(Rate.country_iso == "*", Rate.htc_id.in_(ids))
+        )
+        for rid, htc_id, rate_type, value, vf, vt, agreement in rows:
+            key = (htc_id, rate_type, value, vf, vt, agreement)
+            existing.add(key)
+            if agreement in ORDINARY_GROUPS:
+                grouped_ordinary[key] = rid
+    return existing, grouped_ordinary
+
+
+def _write_duty_rows(db: Session, rows: list[dict[str, Any]], telemetry: Telemetry | None = None) -> int:
+    """Dedupe normalised duty rows against the stored natural keys and bulk-insert the new ones."""
+    tel = telemetry_or_null(telemetry, "duty")
+    # Lookup: natural keys of the rates already stored for the touched HTCs only
+    with tel.phase("lookup"):
+        existing, grouped_ordinary = _existing_rate_keys(db, {r["htc_id"] for r in rows})
+
+    to_insert: list[dict[str, Any]] = []
+    to_normalise: list[dict[str, Any]] = []
+    for row in rows:
+        landgruppe = row.pop("_landgruppe")
+        htc_id = row["htc_id"]
+        key = _rate_key(htc_id, row, row["agreement"])
+        if key in existing:
+            continue
+        # If this is ordinary but previously stored under landgruppe (e.g., 'TALL'), normalize to agreement=None
+        if row["agreement"] is None:
+            rid = grouped_ordinary.pop(_rate_key(htc_id, row, landgruppe), None)
+            if rid is not None:
+                to_normalise.append({"rid": rid})
+                existing.add(key)
+                continue
+        existing.add(key)
+        to_insert.append(row)
+
+    with tel.phase("write"):
+        if to_normalise:
+            stmt = (
+                update(Rate.__table__)
+                .where(Rate.__table__.c.id == bindparam("rid"))
+                .values(agreement=None, priority=0)
+            )
+            for batch in chunked(to_normalise):
+                db.execute(stmt, batch)
+        return bulk_insert(db, Rate.__table__, to_insert)
+
+
+def import_customs_duty_from_toll(
+    db: Session,
+    path: Path,
+    source_url: str | None = None,
+    tracker: DeltaTracker | None = None,
+    workers: int = 1,
+    resume: bool = False,
+    commit_every: int = COMMIT_EVERY,
+    telemetry: Telemetry | None = None,
+) -> int:
     """
     Import ordinary customs duty (MFN) and preferential agreement rates from tollavgiftssats.json.
 
@@ -170,139 +424,61 @@ def import_customs_duty_from_toll(db: Session, path: Path, source_url: str | Non
           satsEnhet == 'K' -> RateType.PER_KG (unit='kg')
           otherwise -> RateType.PER_ITEM
       - Skip sentinel/invalid values (>= 999999.99) and blank unit codes.
-    """
-    data = json.loads(path.read_text(encoding="utf-8"))
-    varer = data.get("varer", [])
 
-    def parse_d(d: str | None) -> Optional[date]:
-        if not d:
-            return None
-        try:
-            y, m, dd = d.split("-")
-            return date(int(y), int(m), int(dd))
-        except Exception:
-            return None
+    Set-based: the code -> htc.id map is loaded once and, per chunk, the natural keys of
+    existing rates for the touched HTCs; duplicates are removed in memory and new rows
+    are written with batched INSERT ... ON CONFLICT DO NOTHING against `uq_rate_natural`.
+    With a `tracker`, commodities whose content is unchanged since the last import are skipped.
+    Parsing runs per HS chapter on `workers` processes; this session stays the only writer.
+    Commits every `commit_every` commodities together with a checkpoint; `resume=True`
+    continues an interrupted import of the same file from that checkpoint.
+    Phase timings, counters and progress events are reported to `telemetry`.
+    """
+    if tracker is not None and tracker.file_unchanged:
+        return 0
+    tel = telemetry_or_null(telemetry, "duty")
+    meta: dict[str, Any] = {}
+    with tel.phase("read"):
+        checkpoint = Checkpoint(db, "duty", tracker.file_sha256 if tracker is not None else file_digest(path), resume)
+    varer = tel.timed(islice(iter_json_array(path, ("varer",), meta), checkpoint.start, None), "read")
 
-    def get_htc(code: str) -> Optional[HTC]:
-        return db.query(HTC).filter(HTC.code == code).first()
+    with tel.phase("lookup"):
+        htc_ids: dict[str, int] = dict(db.execute(select(HTC.code, HTC.id)).all())
 
     added = 0
-    ordinary_groups = {"TAL", "TALL", "ALLE"}
-
-    for idx, v in enumerate(varer, 1):
-        code = str(v.get("id") or "").strip()
-        if not code:
-            continue
-        htc = get_htc(code)
-        if not htc:
-            # Unknown HTC; skip
-            continue
-
-        avtalesatser = v.get("avtalesatser", [])
-        for a in avtalesatser:
-            landgruppe = (a.get("landgruppe") or "").strip()
-            is_ordinary = landgruppe in ordinary_groups
-            sats_list = a.get("sats", [])
-            for s in sats_list:
-                val = _parse_decimal_comma(s.get("satsVerdi"))
-                if val is None:
-                    continue
-                # skip sentinel/placeholder extremely large values
-                try:
-                    if val >= Decimal("999999.99"):
-                        continue
-                except Exception:
-                    pass
-
-                unit_code = (s.get("satsEnhet") or "").strip()
-                if not unit_code:
-                    # missing unit; skip
-                    continue
-
-                if unit_code == "P":
-                    rate_type = RateType.PERCENT
-                    unit = None
-                    currency = None
-                elif unit_code == "K":
-                    rate_type = RateType.PER_KG
-                    unit = "kg"
-                    currency = "NOK"
-                else:
-                    rate_type = RateType.PER_ITEM
-                    unit = None
-                    currency = "NOK"
-
-                pf = parse_d(s.get("fomdato") or None)
-                pt = parse_d(s.get("tomdato") or None)
-
-                # Prevent duplicates on re-import: match on key fields
-                # Try to find existing ordinary entry (agreement=None)
-                existing_ordinary = (
-                    db.query(Rate)
-                    .filter(
-                        Rate.htc_id == htc.id,
-                        Rate.country_iso == "*",
-                        Rate.rate_type == rate_type,
-                        Rate.value == val,
-                        Rate.valid_from == pf,
-                        Rate.valid_to == pt,
-                        Rate.agreement == None,
-                    )
-                    .first()
-                )
-                if existing_ordinary:
-                    continue
-
-                # If this is ordinary but previously stored under landgruppe (e.g., 'TALL'), normalize to agreement=None
-                if is_ordinary:
-                    existing_grouped = (
-                        db.query(Rate)
-                        .filter(
-                            Rate.htc_id == htc.id,
-                            Rate.country_iso == "*",
-                            Rate.rate_type == rate_type,
-                            Rate.value == val,
-                            Rate.valid_from == pf,
-                            Rate.valid_to == pt,
-                            Rate.agreement == landgruppe,
-                        )
-                        .first()
-                    )
-                    if existing_grouped:
-                        existing_grouped.agreement = None
-                        existing_grouped.priority = 0
-                        continue
+    parsed = enumerate(tel.timed(_parsed_varer(varer, _duty_rates, workers, tracker), "parse"), checkpoint.start + 1)
+    for chunk in chunked(parsed, commit_every):
+        # Parse: normalised rows of every commodity in the chunk that needs processing
+        rows: list[dict[str, Any]] = []
+        for _, (code, digest, commodity_rows) in chunk:
+            htc_id = htc_ids.get(code)
+            if htc_id is None:
+                # Unknown HTC; skip
+                continue
+            if tracker is not None and not tracker.check_digest(code, digest):
+                continue
+            for row in commodity_rows:
+                row["htc_id"] = htc_id
+                row["source_url"] = source_url
+                rows.append(row)
 
-                # Otherwise add new entry (ordinary or preferential)
-                db.add(
-                    Rate(
-                        htc_id=htc.id,
-                        country_iso="*",
-                        rate_type=rate_type,
-                        value=val,
-                        currency=currency,
-                        unit=unit,
-                        is_exemption=False,
-                        agreement=None if is_ordinary else landgruppe,
-                        conditions=None,
-                        valid_from=pf,
-                        valid_to=pt,
-                        source_url=source_url,
-                        priority=0 if is_ordinary else 10,
-                    )
-                )
-                added += 1
-
-        # Periodic progress logging (useful on hosted platforms like Render)
-        try:
-            if idx % progress_step == 0 or idx == total_varer:
-                print(
-                    f"[import-duty] {idx}/{total_varer} HTCs processed, added {added} rates so far.",
-                    flush=True,
-                )
-        except Exception:
-            pass
+        tel.add(items=len(chunk), rows=len(rows))
+        added += _write_duty_rows(db, rows, telemetry=tel)
+        with tel.phase("write"):
+            refresh_derived(db, {r["htc_id"] for r in rows})
+            if tracker is not None:
+                tracker.flush()
+            checkpoint.advance(chunk[-1][0])
+        with tel.phase("commit"):
+            db.commit()
+        # Periodic progress events (useful on hosted platforms like Render)
+        tel.progress()
 
-    if added:
+    with tel.phase("commit"):
+        if tracker is not None:
+            tracker.save(source_version(meta))
+        else:
+            record_import(db, "duty", checkpoint.file_sha256, source_version(meta))
+        checkpoint.clear()
         db.commit()
     return added
@@ -0,0 +1,285 @@
+from __future__ import annotations
+import math
+import re
+import unicodedata
+from typing import Any, Iterable, Iterator, Optional
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from ..models import HTC, HTC_SEARCH_TABLE, HTCTrigram, TrigramFrequency
+from .bulk import bulk_insert, chunked
+
+# Weights of code, name and description in the BM25 rank
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+# Codes per IN (...) list, below SQLite's default bound-parameter limit
+_CODES_PER_QUERY = 900
+
+_T = HTC_SEARCH_TABLE
+_FULL_DELETE = text(f"DELETE FROM {_T}")
+_FULL_INSERT = text(f"INSERT INTO {_T} (rowid, code, name, description) SELECT id, code, name, description FROM htc")
+_DELETE_CODES = text(
+    f"DELETE FROM {_T} WHERE rowid IN (SELECT id FROM htc WHERE code IN :codes)"
+).bindparams(bindparam("codes", expanding=True))
+_INSERT_CODES = text(
+    f"INSERT INTO {_T} (rowid, code, name, description) "
+    "SELECT id, code, name, description FROM htc WHERE code IN :codes"
+).bindparams(bindparam("codes", expanding=True))
+_OPTIMIZE = text(f"INSERT INTO {_T} ({_T}) VALUES ('optimize')")
+_PROBE = text(f"SELECT rowid FROM {_T} LIMIT 1")
+
+# Letters NFKD does not decompose; å (a + ring) and accented letters lose their marks there
+_FOLD = str.maketrans({"æ": "ae", "ø": "o", "ß": "ss", "đ": "d", "ł": "l", "œ": "oe", "þ": "th"})
+_WORD = re.compile(r"\w+")
+
+# Share of the trigrams of the query a name must contain to be a fuzzy match
+FUZZY_MIN_SCORE = 0.5
+# Postings read per fuzzy query to find candidates, at most (beyond the first n - k + 1)
+FUZZY_MAX_POSTINGS = 5000
+# Fuzzy candidates scored per query; further batches only while they can still rank
+FUZZY_BATCH = 200
+# Fuzzy query text beyond this many characters is ignored (bounds the trigrams per query)
+_FUZZY_MAX_QUERY = 64
+
+# Databases (by URL) on which htc_search / trigram_frequency were seen populated
+_search_seen: set[str] = set()
+_fuzzy_seen: set[str] = set()
+_FUZZY_PROBE = select(TrigramFrequency.gram).limit(1)
+
+
+def _has_table(db: Session) -> bool:
+    if db.get_bind().dialect.name != "sqlite":
+        return False
+    return db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": _T}
+    ).first() is not None
+
+
+def search_available(db: Session) -> bool:
+    """True when htc_search exists and has been filled (SQLite with FTS5 only)."""
+    url = str(db.get_bind().url)
+    if url in _search_seen:
+        return True
+    if not _has_table(db) or db.execute(_PROBE).first() is None:
+        return False
+    _search_seen.add(url)
+    return True
+
+
+def fuzzy_available(db: Session) -> bool:
+    """True when the trigram index has been filled (e.g. not on a database built before it)."""
+    url = str(db.get_bind().url)
+    if url in _fuzzy_seen:
+        return True
+    if db.execute(_FUZZY_PROBE).first() is None:
+        return False
+    _fuzzy_seen.add(url)
+    return True
+
+
+def forget_search() -> None:
+    """Drop the cached search_available()/fuzzy_available() results (e.g. after swapping the database file)."""
+    _search_seen.clear()
+    _fuzzy_seen.clear()
+
+
+def normalize(text: str) -> str:
+    """Search form of `text`: case-folded, without diacritics, æ/ø folded (kjøtt -> kjott)."""
+    text = unicodedata.normalize("NFKD", text.casefold().translate(_FOLD))
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def words(text: str) -> list[str]:
+    """The normalised words of `text` (punctuation and runs of whitespace separate words)."""
+    return _WORD.findall(normalize(text))
+
+
+def trigrams(text: str) -> set[str]:
+    """Trigrams of the normalised words of `text`, each word padded as "  word " (like pg_trgm)."""
+    grams: set[str] = set()
+    for w in words(text):
+        w = f"  {w} "
+        grams.update(w[i:i + 3] for i in range(len(w) - 2))
+    return grams
+
+
+def _insert_trigrams(db: Session, rows: Iterable[tuple[int, Optional[str]]], touched: set[str]) -> int:
+    """Insert the trigrams of (htc_id, name) `rows`, adding them to `touched`; returns len(rows)."""
+    n = 0
+
+    def gram_rows() -> Iterator[dict[str, Any]]:
+        nonlocal n
+        for htc_id, name in rows:
+            n += 1
+            grams = trigrams(name or "")
+            touched.update(grams)
+            for g in grams:
+                yield {"gram": g, "htc_id": htc_id}
+
+    bulk_insert(db, HTCTrigram.__table__, gram_rows())
+    return n
+
+
+def _count_grams(grams: Optional[list[str]] = None):
+    counted = select(HTCTrigram.gram, func.count()).group_by(HTCTrigram.gram)
+    if grams is not None:
+        counted = counted.where(HTCTrigram.gram.in_(grams))
+    return insert(TrigramFrequency).from_select(["gram", "htc_count"], counted)
+
+
+def refresh_trigrams(db: Session, codes: Optional[Iterable[str]] = None) -> int:
+    """Re-index the names of the HTCs `codes` in htc_trigram/trigram_frequency (all if None
+    or the index is empty). The caller owns the transaction. Returns the number of HTCs indexed.
+    """
+    if codes is None or db.execute(select(HTCTrigram.gram).limit(1)).first() is None:
+        db.execute(delete(HTCTrigram))
+        db.execute(delete(TrigramFrequency))
+        n = _insert_trigrams(db, db.execute(select(HTC.id, HTC.name)).all(), set())
+        db.execute(_count_grams())
+        return n
+    n = 0
+    for batch in chunked(sorted(set(codes)), _CODES_PER_QUERY):
+        rows = db.execute(select(HTC.id, HTC.name).where(HTC.code.in_(batch))).all()
+        ids = [htc_id for htc_id, _ in rows]
+        # Frequencies of the trigrams the HTCs had and now have are recounted
+        touched = set(db.scalars(select(HTCTrigram.gram).where(HTCTrigram.htc_id.in_(ids)).distinct()))
+        db.execute(delete(HTCTrigram).where(HTCTrigram.htc_id.in_(ids)))
+        n += _insert_trigrams(db, rows, touched)
+        for grams in chunked(sorted(touched), _CODES_PER_QUERY):
+            db.execute(delete(TrigramFrequency).where(TrigramFrequency.gram.in_(grams)))
+            db.execute(_count_grams(grams))
+    return n
+
+
+def refresh_search(db: Session, codes: Optional[Iterable[str]] = None) -> int:
+    """Re-index the HTCs `codes` in htc_search and htc_trigram (all of them if None or the
+    index is empty).
+
+    htc_search is skipped where it does not exist (non-SQLite, SQLite without FTS5).
+    The caller owns the transaction. Returns the number of HTCs (re-)indexed.
+    """
+    if codes is not None:
+        codes = list(codes)
+    n = refresh_trigrams(db, codes)
+    if not _has_table(db):
+        return n
+    if codes is None or db.execute(_PROBE).first() is None:
+        db.execute(_FULL_DELETE)
+        n = db.execute(_FULL_INSERT).rowcount
+        db.execute(_OPTIMIZE)
+        return n
+    n = 0
+    for batch in chunked(sorted(set(codes)), _CODES_PER_QUERY):
+        db.execute(_DELETE_CODES, {"codes": batch})
+        n += db.execute(_INSERT_CODES, {"codes": batch}).rowcount
+    return n
+
+
+def match_expression(q: str) -> Optional[str]:
+    """FTS5 query for the search box text `q`: every word as a prefix, all required.
+
+    Input made only of digits, dots and spaces is taken as one code, matched both as
+    digits only and as typed, so dotted codes match too ("0101.21" -> "010121"* OR
+    "0101.21"*; the tokenizer reads the second as the phrase 0101 21*).
+    None when `q` has no searchable characters.
+    """
+    if re.fullmatch(r"[\d.\s]+", q):
+        digits = "".join(ch for ch in q if ch.isdigit())
+        if not digits:
+            return None
+        typed = " ".join(q.split())
+        return f'"{digits}"*' if typed == digits else f'"{digits}"* OR "{typed}"*'
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_htc(
+    db: Session, q: str, limit: int, ranked: bool = False, after: Optional[str] = None
+) -> list[tuple[str, Optional[str], Optional[str]]]:
+    """(code, name, description) of the HTCs matching `q` (see match_expression).
+
+    By code (keyset: codes after `after`), or with `ranked` by BM25 relevance (best first).
+    """
+    expr = match_expression(q)
+    if expr is None:
+        return []
+    params = {"expr": expr, "limit": limit}
+    sql = (
+        f"SELECT h.code, h.name, h.description FROM {_T} s JOIN htc h ON h.id = s.rowid "
+        f"WHERE {_T} MATCH :expr"
+    )
+    if ranked:
+        w = ", ".join(str(x) for x in BM25_WEIGHTS)
+        sql += f" ORDER BY bm25({_T}, {w}), h.code"
+    else:
+        if after:
+            sql += " AND h.code > :after"
+            params["after"] = after
+        sql += " ORDER BY h.code"
+    return [tuple(r) for r in db.execute(text(sql + " LIMIT :limit"), params)]
+
+
+def fuzzy_search(
+    db: Session, q: str, limit: int, min_score: float = FUZZY_MIN_SCORE
+) -> list[tuple[str, Optional[str], Optional[str], float]]:
+    """(code, name, description, score) of the HTCs whose name best matches `q`, misspelt or not.
+
+    `score` is the share of the trigrams of `q` found in the name; names below `min_score`
+    are left out. Best first; ties go to the name with fewer other trigrams, then the code.
+
+    Only the postings of the rarest trigrams of `q` are read: a name holding at least
+    k = ceil(min_score * n) of the n query trigrams contains one of the n - k + 1 rarest
+    (prefix filtering), and j of the n - k + j rarest; j grows while the postings stay
+    within FUZZY_MAX_POSTINGS, so frequent trigrams ("  o", "of ") are rarely scanned.
+    Candidates are scored FUZZY_BATCH at a time, those holding the most of these first,
+    until the rest cannot reach the score of the `limit`-th match.
+    """
+    query = trigrams(q[:_FUZZY_MAX_QUERY])
+    if not query:
+        return []
+    freq = dict(db.execute(
+        select(TrigramFrequency.gram, TrigramFrequency.htc_count).where(TrigramFrequency.gram.in_(query))
+    ).all())
+    n = len(query)
+    k = max(1, math.ceil(min_score * n - 1e-9))
+    rarest = sorted(query, key=lambda g: (freq.get(g, 0), g))
+    # A match holds at least j of the n - k + j rarest trigrams: probe as many as the
+    # postings budget allows, the larger j the fewer candidates
+    j = 1
+    while j < k and sum(freq.get(g, 0) for g in rarest[: n - k + j + 1]) <= FUZZY_MAX_POSTINGS:
+        j += 1
+    probe = [g for g in rarest[: n - k + j] if g in freq]
+    if not probe:
+        return []
+    # Candidates hold at least j of the probed trigrams; one holding c of them shares at
+    # most c + (present - len(probe)) with q, so scoring in decreasing c can stop once
+    # that bound is below the limit-th best score
+    candidates = db.execute(
+        select(HTCTrigram.htc_id, func.count())
+        .where(HTCTrigram.gram.in_(probe))
+        .group_by(HTCTrigram.htc_id)
+        .having(func.count() >= j)
+        .order_by(func.count().desc(), HTCTrigram.htc_id)
+    ).all()
+    unprobed = len(freq) - len(probe)
+    # Shared and total trigrams of each candidate, from its rows in htc_trigram
+    shared = func.sum(case((HTCTrigram.gram.in_(sorted(query)), 1), else_=0))
+    scored = []
+    for start in range(0, len(candidates), FUZZY_BATCH):
+        if len(scored) >= limit:
+            scored.sort()
+            if (candidates[start][1] + unprobed) / n < -scored[limit - 1][0]:
+                break
+        batch = [htc_id for htc_id, _ in candidates[start : start + FUZZY_BATCH]]
+        for code, name, description, n_shared, n_grams in db.execute(
+            select(HTC.code, HTC.name, HTC.description, shared, func.count())
+            .join(HTC, HTC.id == HTCTrigram.htc_id)
+            .where(HTCTrigram.htc_id.in_(batch))
+            .group_by(HTC.id)
+            .having(shared >= k)
+        ):
+            scored.append((-n_shared / n, -n_shared / (n + n_grams - n_shared), code, name, description))
+    scored.sort()
+    return [(code, name, description, -score) for score, _, code, name, description in scored[:limit]]
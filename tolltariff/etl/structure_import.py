@@ -1,55 +1,133 @@
 from __future__ import annotations
-import json
 from pathlib import Path
-from typing import Iterable, Tuple, Dict, Any
+from typing import Iterable, Iterator, Tuple, Dict, Any
 
+from sqlalchemy import bindparam, delete, select, text, update
 from sqlalchemy.orm import Session
 
-from ..models import HTC
+from ..models import HTC, HSNode
+from .bulk import UpsertCounts, bulk_insert, chunked
+from .delta import DeltaTracker, file_digest, record_import, source_version
+from .hs_tree import Chapter, HsNode, iter_chapters, walk_chapters
+from .jsonstream import iter_json_array
+from .parallel import chapter_batches, map_ordered
+from .search import refresh_search
+from .telemetry import Telemetry, telemetry_or_null
 
 
-def _walk_nodes(nodes: Iterable[Dict[str, Any]]):
-    for n in nodes:
-        yield n
-        for child_list_name in ("sections", "chapters", "divisions", "headings", "subchapters"):
-            if isinstance(n, dict) and child_list_name in n and isinstance(n[child_list_name], list):
-                for c in _walk_nodes(n[child_list_name]):
-                    yield c
+def upsert_commodities(
+    db: Session, items: Iterable[Tuple[str, str]], telemetry: Telemetry | None = None
+) -> UpsertCounts:
+    """Insert new HTCs and rename changed ones with batched Core statements.
 
-
-def _iter_commodities(doc: Dict[str, Any]) -> Iterable[Tuple[str, str]]:
-    for n in _walk_nodes(doc.get("sections", [])):
-        if not isinstance(n, dict):
-            continue
-        if n.get("type") == "commodity":
-            code = str(n.get("id") or n.get("hsNumber") or "").strip()
-            item = (n.get("item") or "").strip()
-            if code:
-                yield code, item
-
-
-def import_structure_json(db: Session, path: Path) -> int:
-    data = json.loads(path.read_text(encoding="utf-8"))
-    count = 0
+    The existing code -> name map is loaded in one query; the caller owns the transaction.
+    """
+    tel = telemetry_or_null(telemetry, "structure")
+    with tel.phase("lookup"):
+        existing: dict[str, str | None] = dict(db.execute(select(HTC.code, HTC.name)).all())
+    inserts: list[dict[str, Any]] = []
+    renames: list[dict[str, Any]] = []
+    unchanged = 0
     seen = set()
-    for code, item in _iter_commodities(data):
+    for code, item in items:
         # Deduplicate within this run
         if code in seen:
             continue
         seen.add(code)
-
-        h = db.query(HTC).filter(HTC.code == code).first()
-        if h:
+        if code not in existing:
+            inserts.append({"code": code, "name": item})
+        elif item and existing[code] != item:
             # Update name if missing/different
-            if item and (not h.name or h.name != item):
-                h.name = item
+            renames.append({"b_code": code, "b_name": item})
         else:
-            h = HTC(code=code, name=item)
-            db.add(h)
-            count += 1
+            unchanged += 1
+    tel.add(items=len(seen), rows=len(inserts) + len(renames))
+
+    table = HTC.__table__
+    with tel.phase("write"):
+        bulk_insert(db, table, inserts)
+        if renames:
+            stmt = update(table).where(table.c.code == bindparam("b_code")).values(name=bindparam("b_name"))
+            for batch in chunked(renames):
+                db.execute(stmt, batch)
+    return UpsertCounts(len(inserts), len(renames), unchanged)
+
+
+def _walk_batch(chapters: list[Chapter]) -> list[HsNode]:
+    return list(walk_chapters(chapters))
 
-        if count and count % 500 == 0:
-            db.flush()
 
-    db.commit()
-    return count
+def _commodities(batches: Iterable[list[HsNode]], nodes: list[dict[str, Any]]) -> Iterator[Tuple[str, str]]:
+    """(code, name) of the commodities in `batches` (as hs_tree.iter_commodities); every node is appended to `nodes`."""
+    for batch in batches:
+        for node in batch:
+            nodes.append({**node._asdict(), "position": len(nodes)})
+            if node.kind == "commodity" and node.code:
+                yield node.code, node.description
+
+
+def _recording(items: Iterable[Tuple[str, str]], codes: list[str]) -> Iterator[Tuple[str, str]]:
+    for item in items:
+        codes.append(item[0])
+        yield item
+
+
+def replace_hierarchy(db: Session, nodes: list[dict[str, Any]]) -> int:
+    """Replace the hs_node table with `nodes` (rows of HSNode)."""
+    table = HSNode.__table__
+    db.execute(delete(table))
+    n = bulk_insert(db, table, nodes)
+    if db.get_bind().dialect.name == "sqlite":
+        # Fresh statistics, else the planner may drive the subtree joins from htc
+        db.execute(text("ANALYZE hs_node"))
+    return n
+
+
+def import_structure_json(
+    db: Session,
+    path: Path,
+    tracker: DeltaTracker | None = None,
+    workers: int = 1,
+    telemetry: Telemetry | None = None,
+) -> UpsertCounts:
+    """Upsert all commodities of customstariffstructure.json, rebuild hs_node and re-index the search tables.
+
+    With a `tracker`, commodities whose code/name are unchanged since the last import are
+    skipped before they reach the upsert; the hierarchy is always rewritten as a whole
+    (it is small). HTCs and hierarchy come from one walk (etl.hs_tree), the same
+    commodity definition etl.structure and the static build use. Chapters are walked on
+    `workers` processes. Phase timings and counters are reported to `telemetry`.
+    """
+    if tracker is not None and tracker.file_unchanged:
+        # ... unless the hierarchy was never built (database from before hs_node)
+        if db.execute(select(HSNode.path).limit(1)).first() is not None:
+            return UpsertCounts(0, 0, 0)
+    tel = telemetry_or_null(telemetry, "structure")
+    meta: dict[str, Any] = {}
+    chapters = iter_chapters(tel.timed(iter_json_array(path, ("sections",), meta), "read"))
+    batches = chapter_batches(chapters, lambda ch: str(ch.node.get("id") or "") if isinstance(ch.node, dict) else "")
+    nodes: list[dict[str, Any]] = []
+    items: Iterable[Tuple[str, str]] = _commodities(
+        tel.timed(map_ordered(_walk_batch, batches, workers), "parse"), nodes
+    )
+    if tracker is not None and tracker.file_unchanged:
+        # Commodities are known: the walk only feeds the hierarchy
+        items = (it for it in items if False)
+    elif tracker is not None:
+        items = (it for it in items if tracker.check(it[0], it[1]))
+    # Codes reaching the upsert: with a tracker only new/changed ones, so the search index
+    # is updated for those; a full import re-indexes everything
+    upserted: list[str] = []
+    counts = upsert_commodities(db, _recording(items, upserted), telemetry=tel)
+    with tel.phase("write"):
+        replace_hierarchy(db, nodes)
+        refresh_search(db, upserted if tracker is not None else None)
+    with tel.phase("commit"):
+        if tracker is not None and not tracker.file_unchanged:
+            tracker.save(source_version(meta))
+        else:
+            record_import(
+                db, "structure", tracker.file_sha256 if tracker is not None else file_digest(path), source_version(meta)
+            )
+        db.commit()
+    return counts
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import json
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, Optional, TextIO, TypeVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+
+# Phases reported by every importer, in display order; others are appended as used
+PHASES = ("read", "parse", "lookup", "write", "commit")
+
+# Minimum seconds between two progress events
+PROGRESS_INTERVAL = 5.0
+
+Sink = Callable[[dict[str, Any]], None]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB (None where unsupported)."""
+    if resource is None:
+        return None
+    try:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except Exception:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def text_sink(stream: TextIO | None = None) -> Sink:
+    def emit(event: dict[str, Any]) -> None:
+        out = stream or sys.stderr
+        name = event["import"]
+        if event["event"] == "progress":
+            print(
+                f"[import-{name}] {event['items']} items, {event['rows']} rows, "
+                f"{event['elapsed_s']:.1f}s ({event['rows_per_s']:.0f} rows/s)",
+                file=out,
+                flush=True,
+            )
+            return
+        phases = ", ".join(f"{k} {v:.2f}s" for k, v in event["phases"].items())
+        peak = f", peak RSS {event['peak_rss_mb']} MiB" if event["peak_rss_mb"] is not None else ""
+        print(
+            f"[import-{name}] done: {event['items']} items, {event['rows']} rows in {event['elapsed_s']:.2f}s "
+            f"({event['rows_per_s']:.0f} rows/s{peak}); {phases}",
+            file=out,
+            flush=True,
+        )
+
+    return emit
+
+
+def jsonl_sink(stream: TextIO | None = None) -> Sink:
+    def emit(event: dict[str, Any]) -> None:
+        print(json.dumps(event, separators=(",", ":")), file=stream or sys.stderr, flush=True)
+
+    return emit
+
+
+SINKS: dict[str, Callable[[Optional[TextIO]], Sink]] = {"text": text_sink, "json": jsonl_sink}
+
+
+class Telemetry:
+    """Per-import counters, exclusive phase timings and throttled progress events.
+
+    Phases nest: time spent in an inner phase (e.g. `read` while pulling the next element
+    from inside `parse`) is charged to the inner phase only, so the phase timings add up
+    to the wall time spent in instrumented code. Events are dicts passed to `sink`;
+    without a sink nothing is emitted and the overhead is a few `clock()` calls.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        sink: Optional[Sink] = None,
+        interval: float = PROGRESS_INTERVAL,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.name = name
+        self.sink = sink
+        self.interval = interval
+        self.items = 0
+        self.rows = 0
+        self.phases: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self._stack: list[str] = []
+        self._clock = clock
+        self._mark = self._started = self._last = clock()
+
+    def _charge(self, now: float) -> None:
+        if self._stack:
+            self.phases[self._stack[-1]] = self.phases.get(self._stack[-1], 0.0) + now - self._mark
+        self._mark = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self._charge(self._clock())
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._charge(self._clock())
+            self._stack.pop()
+
+    def timed(self, items: Iterable[T], name: str) -> Iterator[T]:
+        """Iterate `items`, charging the time spent producing each element to phase `name`."""
+        it = iter(items)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def add(self, items: int = 0, rows: int = 0) -> None:
+        self.items += items
+        self.rows += rows
+
+    def _event(self, kind: str) -> dict[str, Any]:
+        elapsed = self._clock() - self._started
+        return {
+            "event": kind,
+            "import": self.name,
+            "items": self.items,
+            "rows": self.rows,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(self.rows / elapsed, 1) if elapsed else 0.0,
+        }
+
+    def progress(self, force: bool = False) -> None:
+        """Emit a progress event if `interval` seconds passed since the last one."""
+        if self.sink is None:
+            return
+        now = self._clock()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        self.sink(self._event("progress"))
+
+    def summary(self) -> dict[str, Any]:
+        event = self._event("summary")
+        event["phases"] = {k: round(v, 3) for k, v in self.phases.items()}
+        event["peak_rss_mb"] = peak_rss_mb()
+        return event
+
+    def finish(self) -> dict[str, Any]:
+        event = self.summary()
+        if self.sink is not None:
+            self.sink(event)
+        return event
+
+
+def telemetry_or_null(telemetry: Optional[Telemetry], name: str) -> Telemetry:
+    """The caller's Telemetry, or a silent one so importers can instrument unconditionally."""
+    return telemetry if telemetry is not None else Telemetry(name)
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
 from enum import Enum
 from typing import Optional
@@ -11,10 +11,14 @@ from sqlalchemy import (
     Text,
     ForeignKey,
     Date,
+    DateTime,
     Boolean,
     Numeric,
+    SmallInteger,
     Enum as SAEnum,
     Index,
+    func,
+    literal_column,
 )
 from sqlalchemy.orm import relationship
 
@@ -35,6 +39,41 @@ class HTC(Base):
 
     rates = relationship("Rate", back_populates="htc", cascade="all, delete-orphan")
 
+
+# Full-text index over htc (SQLite FTS5; rowid = htc.id), kept in sync by the structure
+# importer (etl.search.refresh_search). Not in the metadata: created by init_db on SQLite.
+# Prefix indexes make the 2- and 4-character prefix queries of the search box cheap.
+HTC_SEARCH_TABLE = "htc_search"
+HTC_SEARCH_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {HTC_SEARCH_TABLE} USING fts5("
+    "code, name, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 4')"
+)
+
+
+class HTCTrigram(Base):
+    """Trigrams of the normalised HTC names, for the typo-tolerant search (etl.search.fuzzy_search).
+
+    Clustered (WITHOUT ROWID on SQLite) on gram, so the postings of one trigram are one
+    range of the primary key. Kept in sync by the structure importer with htc_search.
+    """
+    __tablename__ = "htc_trigram"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    gram = Column(String(3), primary_key=True)
+    htc_id = Column(Integer, primary_key=True)
+
+
+# Re-indexing an HTC deletes its rows by htc_id
+Index("ix_htc_trigram_htc", HTCTrigram.htc_id)
+
+
+class TrigramFrequency(Base):
+    """Number of HTCs whose name contains each trigram (the length of its postings)."""
+    __tablename__ = "trigram_frequency"
+
+    gram = Column(String(3), primary_key=True)
+    htc_count = Column(Integer, nullable=False)
+
 class Rate(Base):
     __tablename__ = "rate"
 
@@ -61,3 +100,155 @@ class Rate(Base):
     htc = relationship("HTC", back_populates="rates")
 
 Index("ix_rate_htc_country", Rate.htc_id, Rate.country_iso)
+Index("ix_rate_agreement", Rate.agreement)
+# Validity intervals per HTC: "rates in force on D" is a seek on htc_id and a range on valid_from
+Index("ix_rate_htc_validity", Rate.htc_id, Rate.valid_from, Rate.valid_to)
+# Natural key used by the bulk importers for INSERT ... ON CONFLICT DO NOTHING.
+# Nullable columns are coalesced so that NULL agreements/dates still collide.
+Index(
+    "uq_rate_natural",
+    Rate.htc_id,
+    Rate.country_iso,
+    Rate.rate_type,
+    func.coalesce(Rate.agreement, ""),
+    Rate.value,
+    func.coalesce(Rate.valid_from, literal_column("'0001-01-01'")),
+    func.coalesce(Rate.valid_to, literal_column("'0001-01-01'")),
+    unique=True,
+)
+
+
+# Integer codes of RateType in the compact tables
+RATE_TYPE_CODES: dict[RateType, int] = {RateType.PERCENT: 0, RateType.PER_KG: 1, RateType.PER_ITEM: 2}
+RATE_TYPES_BY_CODE: dict[int, RateType] = {v: k for k, v in RATE_TYPE_CODES.items()}
+# Rate values are stored in the compact tables as integer millionths (Numeric(18, 6) scale)
+VALUE_SCALE = 1_000_000
+# Landgruppe codes of the ordinary (MFN) baseline; stored as agreement=None by the importers
+ORDINARY_GROUPS = {"TAL", "TALL", "ALLE"}
+
+
+class Agreement(Base):
+    """Dimension table: one small integer id per agreement (landgruppe) code."""
+    __tablename__ = "agreement"
+
+    id = Column(Integer, primary_key=True)
+    code = Column(String(128), unique=True, nullable=False)
+
+
+class RateCompact(Base):
+    """Read-optimised copy of `rate`, maintained by etl.derived.refresh_derived.
+
+    Clustered (WITHOUT ROWID on SQLite) on htc_id, agreement_id, rate_type so all rates of
+    one HTC sit on adjacent pages. Values are fixed-point integers (VALUE_SCALE), dates are
+    yyyymmdd integers (0 = open), rate_type uses RATE_TYPE_CODES and agreement_id 0 means
+    no agreement. `rate` stays the source of truth; `rate_id` keeps its row order so
+    readers see rates in the same order as `HTC.rates`.
+
+    This is a copy, so the database file grows: on 134k rates, `rate` takes 9.7 MiB plus
+    15.6 MiB of indexes, and rate_compact adds 4.7 MiB (rate_best another 2.4 MiB). What
+    shrinks is the working set of the per-HTC endpoints (agreements, zero-duty,
+    best-origin), which read these tables instead of `rate` and its indexes.
+    """
+    __tablename__ = "rate_compact"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    htc_id = Column(Integer, primary_key=True)
+    agreement_id = Column(Integer, primary_key=True)
+    rate_type = Column(SmallInteger, primary_key=True)
+    country_iso = Column(String(2), primary_key=True)
+    valid_from = Column(Integer, primary_key=True)
+    valid_to = Column(Integer, primary_key=True)
+    value = Column(Integer, primary_key=True)
+    is_exemption = Column(Boolean, nullable=False, default=False)
+    currency = Column(String(3), nullable=True)
+    unit = Column(String(16), nullable=True)
+    rate_id = Column(Integer, nullable=False)
+
+
+class RateBest(Base):
+    """Materialised minimum per (htc, agreement, rate_type), derived from rate_compact.
+
+    `min_rate_id` is the first rate (by id) holding the minimum, `first_rate_id` the first
+    rate of the group and `zero_rate_id` the first zero rate (NULL if none), so readers can
+    reproduce the row order of HTC.rates. `is_ordinary` marks the baseline (no agreement or
+    one of ORDINARY_GROUPS).
+    """
+    __tablename__ = "rate_best"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    htc_id = Column(Integer, primary_key=True)
+    agreement_id = Column(Integer, primary_key=True)
+    rate_type = Column(SmallInteger, primary_key=True)
+    min_value = Column(Integer, nullable=False)
+    is_zero = Column(Boolean, nullable=False)
+    is_ordinary = Column(Boolean, nullable=False)
+    unit = Column(String(16), nullable=True)
+    currency = Column(String(3), nullable=True)
+    min_rate_id = Column(Integer, nullable=False)
+    first_rate_id = Column(Integer, nullable=False)
+    zero_rate_id = Column(Integer, nullable=True)
+
+
+class AgreementCount(Base):
+    """Number of `rate` rows per agreement and HS chapter (first two digits of the HTC code).
+
+    Recounted from `rate` by etl.derived.refresh_derived for the chapters an import
+    touched, so the catalog never scans `rate` at request time.
+    """
+    __tablename__ = "agreement_count"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    agreement_id = Column(Integer, primary_key=True)
+    chapter = Column(String(2), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+
+class HSNode(Base):
+    """Every node of customstariffstructure.json (sections down to commodities).
+
+    `path` is the materialised path of node codes (etl.hs_tree); WITHOUT ROWID on SQLite,
+    so a subtree is one contiguous range of the primary key. `position` is the document
+    (pre-)order. Rebuilt by the structure import.
+    """
+    __tablename__ = "hs_node"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    path = Column(String(255), primary_key=True)
+    position = Column(Integer, nullable=False)
+    depth = Column(SmallInteger, nullable=False)
+    kind = Column(String(16), nullable=False)
+    code = Column(String(20), nullable=False, index=True)
+    description = Column(Text, nullable=True)
+
+
+class DatasetVersion(Base):
+    """One row per committed import (structure, duty, default) or refresh (derived, demo).
+
+    The highest id is the data version the API caches are keyed on.
+    """
+    __tablename__ = "dataset_version"
+
+    id = Column(Integer, primary_key=True)
+    source = Column(String(32), nullable=False, index=True)
+    file_sha256 = Column(String(64), nullable=False)
+    version = Column(String(32), nullable=True)  # 'versjon'/'version' field of the file
+    imported_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ContentHash(Base):
+    """Digest of the last imported content of one commodity, per source."""
+    __tablename__ = "content_hash"
+
+    source = Column(String(32), primary_key=True)
+    code = Column(String(20), primary_key=True)
+    digest = Column(String(40), nullable=False)
+
+
+class ImportCheckpoint(Base):
+    """Progress of an interrupted import: commodities of `file_sha256` committed so far."""
+    __tablename__ = "import_checkpoint"
+
+    source = Column(String(32), primary_key=True)
+    file_sha256 = Column(String(64), nullable=False)
+    position = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)